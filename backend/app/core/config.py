@@ -0,0 +1,244 @@
+# app/core/config.py
+"""
+アプリ設定を1か所にまとめる（pydantic-settings）。
+
+- 環境変数名はこれまでと同じ（フィールド名の大文字。例: google_maps_api_key → GOOGLE_MAPS_API_KEY）
+- backend/.env は load_env() で1回だけ読む（Azure には通常 .env は無い）
+- settings はプロセスで1つ。各モジュールは import して参照する
+
+実行時リロード:
+    キャッシュ TTL / 同時実行数 / レート制限などの「つまみ」（RELOADABLE_FIELDS）だけは
+    再起動なしで変えられる。RUNTIME_SETTINGS_PATH の JSON（{"places_details_ttl_sec": 600, ...}）を
+    書き換えると、各ワーカーが get_settings() の呼び出し時に mtime を見て取り込む
+    （確認は RUNTIME_RELOAD_CHECK_SEC 秒に1回）。POST /admin/settings/reload で即時反映もできる。
+    つまみを使う側は、import 時に値をコピーせず get_settings().xxx を都度参照すること。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import pathlib
+import time
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = pathlib.Path(__file__).resolve().parents[2]  # backend/
+ENV_PATH = BASE_DIR / ".env"
+
+_loaded = False
+
+
+def load_env() -> None:
+    """backend/.env を読み込む（ローカル開発用。Azure には通常 .env は無い）。"""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    if ENV_PATH.is_file():
+        load_dotenv(dotenv_path=ENV_PATH)
+    else:
+        load_dotenv()  # 従来どおりカレントディレクトリから探す
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(case_sensitive=False, extra="ignore")
+
+    # ---- DB ----
+    db_user: Optional[str] = None
+    db_password: Optional[str] = None
+    db_host: Optional[str] = None
+    db_port: int = 3306
+    db_name: Optional[str] = None
+    ssl_ca_path: Optional[str] = None
+    database_url: str = ""                 # あれば DB_* より優先（sqlite:///./local.db など）
+    db_pool_size: int = Field(5, ge=1)
+    db_max_overflow: int = Field(10, ge=0)
+    db_pool_timeout: int = Field(30, ge=1)
+    db_pool_recycle: int = 1800
+    migration_mode: str = "check"          # check / upgrade / create_all / off
+    migration_strict: bool = True          # false なら check の不一致は警告だけ（ローカル向け）
+
+    # ---- Google / GCP ----
+    gcp_sa_key_json: str = ""
+    google_maps_api_key: str = ""
+    google_places_api_key: str = ""        # 未設定なら google_maps_api_key を使う
+    google_places_language: str = "ja"
+    google_places_region: str = "jp"
+    use_google_places: bool = False
+
+    # ---- Yahoo! (YOLP) ----
+    yolp_app_id: Optional[str] = None
+
+    # ---- 上流の接続先（ベンチマークではスタブサーバに向ける: bench/stub_server.py） ----
+    google_maps_base_url: str = "https://maps.googleapis.com"
+    yolp_base_url: str = "https://map.yahooapis.jp"
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"
+    openai_base_url: Optional[str] = None               # None は SDK の既定（api.openai.com）
+
+    # ---- 音声ガイド（TTS） ----
+    tts_enabled: bool = True                             # false なら GCP TTS を呼ばず txt を保存
+
+    # ---- プロファイラ（app/core/profiling.py。サンプリング率は下の RELOADABLE_FIELDS） ----
+    profile_interval_ms: float = Field(5.0, gt=0)     # サンプリング間隔
+    profile_output_dir: str = str(BASE_DIR / "profiles")  # 空なら collapsed をファイルに書かない
+    profile_keep: int = Field(50, ge=1)               # GET /admin/profiles で見られる件数
+
+    # ---- Gemini / OpenAI ----
+    gemini_api_key: Optional[str] = None
+    gemini_model: str = "gemini-1.5-flash"
+    openai_api_key: Optional[str] = None
+    openai_text_model: str = "gpt-4o-mini"
+
+    # ---- その他 ----
+    media_root: str = "./media"
+    admin_api_key: str = ""
+    jwt_secret_key: str = ""                # 必須（未設定なら起動しない）
+    jwt_allow_random_key: bool = False      # true なら未設定時にプロセスごとの乱数鍵（1プロセスの開発用）
+    jwt_algorithm: str = "HS256"
+    jwt_expire_minutes: int = Field(60 * 24, ge=1)
+    isochrone_graph_path: str = ""
+    name_patterns_path: str = ""
+    poi_import_path: str = ""
+    poi_store_max_cells: int = 20000
+    password_hash_workers: int = Field(2, ge=1)      # bcrypt 用プロセス数
+    password_hash_max_pending: int = Field(32, ge=1)  # 同時にプールへ投げる上限
+    log_level: str = "INFO"
+    log_format: str = "text"                          # text / json
+    otel_exporter_otlp_endpoint: str = ""             # 例: http://localhost:4318/v1/traces
+    otel_service_name: str = "fukutabi-backend"
+    history_write_mode: str = "buffer"               # buffer / sync（sync はリクエスト内で commit）
+    history_buffer_max_rows: int = Field(10000, ge=1)  # DB 障害時にメモリに持つ上限
+
+    # ---- 実行時に変えられるつまみ（RELOADABLE_FIELDS） ----
+    search_deadline_sec: float = Field(6.0, gt=0)
+    places_predictions_ttl_sec: int = Field(600, ge=0)
+    places_details_ttl_sec: int = Field(86400, ge=0)
+    places_details_negative_ttl_sec: int = Field(3600, ge=0)
+    recent_destinations_ttl_sec: int = Field(300, ge=0)
+    poi_store_ttl_sec: int = Field(21600, ge=0)
+    poi_store_min_results: int = Field(3, ge=0)
+    bulk_details_concurrency: int = Field(8, ge=1)
+    bcrypt_rounds: int = Field(12, ge=4, le=31)      # 変えるとログイン時に再ハッシュされる
+    resilience_cooldown_sec: float = Field(30.0, ge=0)
+    history_flush_interval_ms: int = Field(500, ge=10)
+    history_flush_max_rows: int = Field(200, ge=1)
+    profile_sample_rate: float = Field(0.0, ge=0, le=1)  # @profiled の関数をこの割合でプロファイル
+    # レート制限: None はコード側の既定値（rate_limit._DEFAULTS）。daily=0 は無制限
+    rate_limit_google_qps: Optional[float] = None
+    rate_limit_google_burst: Optional[float] = None
+    rate_limit_google_daily: Optional[int] = None
+    rate_limit_yolp_qps: Optional[float] = None
+    rate_limit_yolp_burst: Optional[float] = None
+    rate_limit_yolp_daily: Optional[int] = None
+    rate_limit_gemini_qps: Optional[float] = None
+    rate_limit_gemini_burst: Optional[float] = None
+    rate_limit_gemini_daily: Optional[int] = None
+    rate_limit_openai_qps: Optional[float] = None
+    rate_limit_openai_burst: Optional[float] = None
+    rate_limit_openai_daily: Optional[int] = None
+
+    runtime_settings_path: str = str(BASE_DIR / "runtime_settings.json")
+    runtime_reload_check_sec: float = 10.0
+
+    @property
+    def places_api_key(self) -> str:
+        return self.google_places_api_key or self.google_maps_api_key
+
+    def gcp_sa_info(self) -> dict:
+        if not self.gcp_sa_key_json:
+            raise RuntimeError("GCP_SA_KEY_JSON が未設定です")
+        info = json.loads(self.gcp_sa_key_json)
+        if "private_key" in info and "\\n" in info["private_key"]:
+            info["private_key"] = info["private_key"].replace("\\n", "\n")
+        return info
+
+    def reloadable(self) -> Dict[str, object]:
+        return {k: getattr(self, k) for k in sorted(RELOADABLE_FIELDS)}
+
+
+RELOADABLE_FIELDS = frozenset(
+    [
+        "search_deadline_sec",
+        "places_predictions_ttl_sec",
+        "places_details_ttl_sec",
+        "places_details_negative_ttl_sec",
+        "recent_destinations_ttl_sec",
+        "poi_store_ttl_sec",
+        "poi_store_min_results",
+        "bulk_details_concurrency",
+        "bcrypt_rounds",
+        "resilience_cooldown_sec",
+        "history_flush_interval_ms",
+        "history_flush_max_rows",
+        "profile_sample_rate",
+    ]
+    + [f"rate_limit_{p}_{k}" for p in ("google", "yolp", "gemini", "openai") for k in ("qps", "burst", "daily")]
+)
+
+load_env()
+settings = Settings()
+
+_reload_hooks: List[Callable[[Settings], None]] = []
+_runtime_mtime: Optional[float] = None
+_next_check = 0.0
+
+
+def on_reload(fn: Callable[[Settings], None]) -> Callable[[Settings], None]:
+    """つまみが変わったときに呼ぶ関数を登録する（既存のバケット等を作り直す用）。"""
+    _reload_hooks.append(fn)
+    return fn
+
+
+def reload_settings(overrides: Optional[dict] = None) -> Dict[str, object]:
+    """
+    環境変数 + RUNTIME_SETTINGS_PATH（+ overrides）からつまみを読み直し、settings を書き換える。
+    検証エラーなら ValueError（settings は変えない）。戻り値は変わった項目。
+    """
+    global _runtime_mtime
+    runtime: dict = {}
+    path = pathlib.Path(settings.runtime_settings_path)
+    if path.is_file():
+        runtime = json.loads(path.read_text(encoding="utf-8"))
+        _runtime_mtime = path.stat().st_mtime
+    runtime.update(overrides or {})
+    unknown = set(runtime) - RELOADABLE_FIELDS
+    if unknown:
+        raise ValueError(f"not reloadable: {sorted(unknown)}")
+
+    fresh = Settings(**runtime)  # 環境変数 < runtime の優先順で検証
+    changed = {}
+    for k in RELOADABLE_FIELDS:
+        v = getattr(fresh, k)
+        if getattr(settings, k) != v:
+            changed[k] = v
+            setattr(settings, k, v)
+    if changed:
+        logger.info("settings reloaded", extra={"changed": changed})
+        for fn in _reload_hooks:
+            fn(settings)
+    return changed
+
+
+def get_settings() -> Settings:
+    """settings を返す。RUNTIME_SETTINGS_PATH が更新されていれば取り込む（数秒に1回だけ確認）。"""
+    global _next_check, _runtime_mtime
+    now = time.monotonic()
+    if now >= _next_check:
+        _next_check = now + settings.runtime_reload_check_sec
+        try:
+            mtime = os.stat(settings.runtime_settings_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != _runtime_mtime:
+            try:
+                reload_settings()
+            except Exception as ex:
+                _runtime_mtime = mtime  # 壊れたファイルで毎回ログが出ないように
+                logger.warning("runtime settings ignored", extra={"ex": repr(ex)})
+    return settings
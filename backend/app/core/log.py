@@ -0,0 +1,71 @@
+# app/core/log.py
+"""
+ログ設定（print の置き換え）。
+
+- 各モジュールは logger = logging.getLogger(__name__) で出す
+- レベルは LOG_LEVEL（既定 INFO）。プロンプト全文などは DEBUG に落としてある
+- LOG_FORMAT=json なら1行1 JSON（Azure のログ検索向け）、text なら人が読む形
+- 付加情報は extra で渡すと、text では key=value、json ではキーとして出る
+
+    logger.info("yolp query", extra={"q": q, "hits": len(feats)})
+"""
+from __future__ import annotations
+
+import datetime as dt
+import json
+import logging
+import sys
+
+from app.core.config import settings
+
+# LogRecord が元から持っている属性（これ以外を extra とみなす）
+_STD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_configured = False
+
+
+def _extras(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _STD_ATTRS}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-5s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = _extras(record)
+        if extra:
+            line += " " + " ".join(f"{k}={v!r}" if isinstance(v, str) and " " in v else f"{k}={v}"
+                                   for k, v in extra.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": dt.datetime.fromtimestamp(record.created, dt.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """ルートロガーにハンドラを1つ付ける（uvicorn のロガーはそのまま）。何度呼んでも1回だけ。"""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(settings.log_level.upper())
+    # 外部ライブラリの DEBUG は多すぎるので、アプリだけ LOG_LEVEL に従わせる
+    for noisy in ("httpx", "httpcore", "urllib3", "google", "openai"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
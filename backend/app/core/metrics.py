@@ -0,0 +1,233 @@
+# app/core/metrics.py
+"""
+レイテンシ計測（Prometheus 形式の /metrics と、任意で OpenTelemetry）。
+
+- MetricsMiddleware: ルート（/detour/search など、パスパラメータ展開前の形）× メソッド × ステータスの
+  レイテンシヒストグラム
+- span(kind, name): 任意の区間を計測する。外部呼び出し（outbound: google_nearby / yolp / gemini /
+  openai / tts）、検索パイプラインのステージ（pipeline / source）に使っている
+- install_db_hooks(engine): SQL 1本ごとの時間を「操作 × テーブル」で集計
+- OTEL_EXPORTER_OTLP_ENDPOINT を設定し opentelemetry-sdk が入っていれば、span() は OTel の span も作る
+
+値はワーカープロセスごと（gunicorn で複数ワーカーなら、スクレイプのたびに別のワーカーの値になる）。
+
+    with metrics.span("outbound", "yolp"):
+        r = await client.get(...)
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """ラベルごとの累積ヒストグラム（Prometheus の histogram と同じ形で出力する）。"""
+
+    def __init__(self, name: str, help_: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # counts..., +Inf, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            s[i] += 1
+            s[-1] += value
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for key, s in sorted(series):
+            base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labels, key))
+            sep = "," if base else ""
+            acc = 0.0
+            for le, c in zip(self.buckets, s):
+                acc += c
+                out.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {acc:g}')
+            acc += s[len(self.buckets)]
+            out.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {acc:g}')
+            out.append(f"{self.name}_sum{{{base}}} {s[-1]:.6f}")
+            out.append(f"{self.name}_count{{{base}}} {acc:g}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help_
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            base = ",".join(f'{n}="{_escape(lv)}"' for n, lv in zip(self.labels, key))
+            out.append(f"{self.name}{{{base}}} {v:g}")
+        return out
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+SPAN_LATENCY = Histogram("app_span_duration_seconds", "Outbound calls and pipeline stages", ("kind", "name", "outcome"))
+DB_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency", ("op", "table"))
+DB_ERRORS = Counter("db_query_errors_total", "SQL statements that raised", ("op", "table"))
+_REGISTRY = [HTTP_LATENCY, SPAN_LATENCY, DB_LATENCY, DB_ERRORS]
+
+_tracer = None  # OTel の Tracer（setup_otel() 後）
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- span ----------------------------------------------------------------
+@contextmanager
+def span(kind: str, name: str) -> Iterator[None]:
+    """with の中の時間を kind/name で記録する（async 関数の中で await をまたいでもよい）。"""
+    otel_cm = _tracer.start_as_current_span(f"{kind}:{name}") if _tracer is not None else None
+    if otel_cm is not None:
+        otel_cm.__enter__()
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - t0, kind, name, outcome)
+        if otel_cm is not None:
+            otel_cm.__exit__(None, None, None)
+
+
+def observe_span(kind: str, name: str, seconds: float, outcome: str = "ok") -> None:
+    SPAN_LATENCY.observe(seconds, kind, name, outcome)
+
+
+# ---- DB --------------------------------------------------------------------
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+[`\"]?(\w+)", re.IGNORECASE)
+
+
+def _statement_labels(statement: str) -> Tuple[str, str]:
+    head = statement.lstrip().split(None, 1)
+    op = head[0].upper() if head else "OTHER"
+    m = _TABLE_RE.search(statement)
+    return op, (m.group(1) if m else "-")
+
+
+def install_db_hooks(engine) -> None:
+    """engine の全 SQL の時間を db_query_duration_seconds に記録する。"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("metrics_t0")
+        if stack:
+            DB_LATENCY.observe(time.perf_counter() - stack.pop(), *_statement_labels(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("metrics_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+        if ctx.statement:
+            DB_ERRORS.inc(*_statement_labels(ctx.statement))
+
+
+# ---- HTTP ------------------------------------------------------------------
+class MetricsMiddleware:
+    """ASGI ミドルウェア。ラベルはルートのパス（/places/details/{place_id} の形）。"""
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"  # 404 / StaticFiles など（パスをそのまま使うと系列が増え続ける）
+        path = self._paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for r in getattr(app, "routes", ()):
+                if getattr(r, "endpoint", None) is endpoint:
+                    path = r.path
+                    break
+            self._paths[endpoint] = path = path or getattr(endpoint, "__name__", "unknown")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # ルーティング後は scope に endpoint が入っている
+            HTTP_LATENCY.observe(time.perf_counter() - t0, scope["method"], self._route(scope), str(status["code"]))
+
+
+# ---- OpenTelemetry（任意） --------------------------------------------------
+def setup_otel() -> Optional[object]:
+    """OTEL_EXPORTER_OTLP_ENDPOINT があるときだけ OTLP へ span を送る。SDK が無ければ何もしない。"""
+    global _tracer
+    endpoint = settings.otel_exporter_otlp_endpoint
+    if not endpoint or _tracer is not None:
+        return _tracer
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning("opentelemetry-sdk is not installed; OTLP export disabled")
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("app")
+    logger.info("OTLP tracing enabled", extra={"endpoint": endpoint})
+    return _tracer
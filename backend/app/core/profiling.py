@@ -0,0 +1,231 @@
+# app/core/profiling.py
+"""
+ホットなエンドポイント向けのサンプリングプロファイラ（オプトイン）。
+
+@profiled("search_detours_core") を付けた async 関数だけが対象:
+- リクエストに X-Profile: 1 が付いていて、管理キー（X-API-Key = ADMIN_API_KEY）が通るとき
+- もしくは PROFILE_SAMPLE_RATE（0〜1、実行時に変更可）の割合でランダムに
+
+計測中は別スレッドが PROFILE_INTERVAL_MS ごとにイベントループのスレッドのスタックを覗き、
+対象関数のフレームが載っているサンプルだけを数える（他のリクエストの処理は混ざらない）。
+await で待っている時間はスタックに載らないので、見えるのは「ループを止めて CPU を使った場所」。
+
+結果は flamegraph.pl / speedscope でそのまま読める collapsed 形式（"a;b;c 件数"）で、
+PROFILE_OUTPUT_DIR にファイルを書き、直近分は GET /admin/profiles から取れる。
+X-Profile で取ったときはレスポンスヘッダ X-Profile-Id に ID が入る。
+"""
+from __future__ import annotations
+
+import contextvars
+import datetime as dt
+import functools
+import logging
+import pathlib
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional
+
+from app.core.config import get_settings, settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+MAX_STACK_DEPTH = 128
+
+# リクエストごとの状態（ProfileTriggerMiddleware がセット）
+_request: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("profile_request", default=None)
+
+
+class Session:
+    def __init__(self, name: str, code, thread_id: int, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.code = code
+        self.thread_id = thread_id
+        self.trigger = trigger
+        self.started_at = dt.datetime.utcnow()
+        self.t0 = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.samples: Counter = Counter()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "samples": sum(self.samples.values()),
+        }
+
+
+_lock = threading.Lock()
+_active: List[Session] = []
+_recent: "OrderedDict[str, Session]" = OrderedDict()
+_sampler: Optional[threading.Thread] = None
+
+
+def _frame_label(code) -> str:
+    mod = pathlib.Path(code.co_filename)
+    parts = mod.with_suffix("").parts
+    # app/ 配下はパッケージ名、それ以外はファイル名だけ（site-packages の長いパスを避ける）
+    name = ".".join(parts[parts.index("app"):]) if "app" in parts else mod.stem
+    return f"{name}:{getattr(code, 'co_qualname', code.co_name)}".replace(";", ":").replace(" ", "_")
+
+
+def _take_samples() -> None:
+    frames = sys._current_frames()
+    with _lock:
+        sessions = list(_active)
+    for s in sessions:
+        f = frames.get(s.thread_id)
+        stack = []
+        hit = False
+        while f is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(f.f_code)
+            hit = hit or f.f_code is s.code
+            f = f.f_back
+        if hit:
+            s.samples[";".join(_frame_label(c) for c in reversed(stack))] += 1
+
+
+def _run_sampler() -> None:
+    global _sampler
+    while True:
+        with _lock:
+            if not _active:
+                _sampler = None
+                return
+        _take_samples()
+        time.sleep(settings.profile_interval_ms / 1000)
+
+
+def _start(name: str, code, trigger: str) -> Session:
+    global _sampler
+    s = Session(name, code, threading.get_ident(), trigger)
+    with _lock:
+        _active.append(s)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run_sampler, name="profiler", daemon=True)
+            _sampler.start()
+    return s
+
+
+def _finish(s: Session) -> None:
+    s.duration_ms = round((time.perf_counter() - s.t0) * 1000, 1)
+    with _lock:
+        _active.remove(s)
+        _recent[s.id] = s
+        while len(_recent) > settings.profile_keep:
+            _recent.popitem(last=False)
+    out_dir = settings.profile_output_dir
+    if out_dir:
+        try:
+            path = pathlib.Path(out_dir)
+            path.mkdir(parents=True, exist_ok=True)
+            (path / f"{s.name}-{s.started_at:%Y%m%dT%H%M%S}-{s.id}.collapsed").write_text(s.collapsed())
+        except OSError as ex:
+            logger.warning("profile write failed", extra={"dir": out_dir, "ex": repr(ex)})
+    # name は LogRecord の予約属性なので extra では profile_name にする
+    info = s.summary()
+    info["profile_name"] = info.pop("name")
+    logger.info("profile captured", extra=info)
+
+
+def _trigger() -> Optional[str]:
+    req = _request.get()
+    if req is not None and req["forced"]:
+        return "header"
+    rate = get_settings().profile_sample_rate
+    if rate > 0 and random.random() < rate:
+        return "sampled"
+    return None
+
+
+def profiled(name: str):
+    """async 関数に付ける。条件を満たしたリクエストだけスタックをサンプリングする。"""
+
+    def deco(fn):
+        code = fn.__code__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            trigger = _trigger()
+            if trigger is None:
+                return await fn(*args, **kwargs)
+            s = _start(name, code, trigger)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _finish(s)
+                req = _request.get()
+                if req is not None:
+                    req["ids"].append(s.id)
+
+        return wrapper
+
+    return deco
+
+
+# ---- 取り出し（admin API 用） --------------------------------------------
+def recent() -> List[dict]:
+    with _lock:
+        return [s.summary() for s in reversed(_recent.values())]
+
+
+def get(profile_id: str) -> Optional[Session]:
+    with _lock:
+        return _recent.get(profile_id)
+
+
+def merged(name: Optional[str] = None) -> str:
+    """直近のプロファイルを足し合わせた collapsed（name で絞り込み）。"""
+    total: Counter = Counter()
+    with _lock:
+        for s in _recent.values():
+            if name is None or s.name == name:
+                total.update(s.samples)
+    return "".join(f"{stack} {n}\n" for stack, n in total.most_common())
+
+
+# ---- ASGI ミドルウェア -------------------------------------------------------
+class ProfileTriggerMiddleware:
+    """X-Profile ヘッダを見てリクエスト単位の状態をセットし、取れた ID をレスポンスヘッダで返す。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _allowed(headers: Dict[bytes, bytes]) -> bool:
+        if headers.get(PROFILE_HEADER, b"").strip() not in (b"1", b"true", b"on"):
+            return False
+        key = settings.admin_api_key.strip()
+        # maybe_require_admin と同じ判定（キー未設定なら誰でも可 = ローカル開発）
+        return not key or headers.get(b"x-api-key", b"").decode() == key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        state = {"forced": self._allowed(dict(scope["headers"])), "ids": []}
+        token = _request.set(state)
+
+        async def _send(message):
+            if message["type"] == "http.response.start" and state["ids"]:
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (PROFILE_ID_HEADER, ",".join(state["ids"]).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _request.reset(token)
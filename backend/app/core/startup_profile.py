@@ -0,0 +1,91 @@
+# app/core/startup_profile.py
+"""
+起動時の import 時間をモジュールごとに計測する（STARTUP_PROFILE=1 のときだけ有効）。
+
+main.py の一番最初で install() し、起動完了時に report() でログに出す。
+cumulative はそのモジュールが import した子モジュールも含む時間、self は子を除いた時間。
+python -X importtime と同じ考え方だが、ワーカー起動のたびにアプリのログで見られるようにしている。
+"""
+from __future__ import annotations
+
+import importlib.abc
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+_times: Dict[str, Tuple[float, float]] = {}  # name -> (cumulative_sec, self_sec)
+_stack: List[List[float]] = []               # [開始時刻, 子の合計]
+_installed = False
+_t0: Optional[float] = None
+
+
+class _TimingLoader(importlib.abc.Loader):
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        frame = [time.perf_counter(), 0.0]
+        _stack.append(frame)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            _stack.pop()
+            total = time.perf_counter() - frame[0]
+            _times[module.__name__] = (total, total - frame[1])
+            if _stack:
+                _stack[-1][1] += total
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader)
+            return spec
+        return None
+
+
+def install() -> None:
+    global _installed, _t0
+    if _installed:
+        return
+    _installed = True
+    _t0 = time.perf_counter()
+    sys.meta_path.insert(0, _TimingFinder())
+
+
+def uninstall() -> None:
+    global _installed
+    sys.meta_path[:] = [f for f in sys.meta_path if not isinstance(f, _TimingFinder)]
+    _installed = False
+
+
+def elapsed_ms() -> Optional[float]:
+    return None if _t0 is None else (time.perf_counter() - _t0) * 1000
+
+
+def report(top: int = 25) -> List[dict]:
+    """self 時間の大きい順に top 件を返し、ログにも出す。"""
+    rows = sorted(_times.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+    out = [
+        {"module": name, "cumulative_ms": round(cum * 1000, 1), "self_ms": round(self_ * 1000, 1)}
+        for name, (cum, self_) in rows
+    ]
+    total = elapsed_ms()
+    if total is not None:
+        logger.info("startup profile", extra={"elapsed_ms": round(total), "modules": len(_times)})
+    for r in out:
+        logger.info("import time", extra={"mod": r["module"], "self_ms": r["self_ms"], "cumulative_ms": r["cumulative_ms"]})
+    return out
@@ -0,0 +1,275 @@
+import base64
+import datetime as dt
+import uuid
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.db import models
+from app.models.detour_history import DetourHistory, DetourHistoryMonthly
+
+
+def destination_values(data: dict) -> Optional[dict]:
+    """Places Details の result を destinations の1行分に変換（座標が無ければ None）。"""
+    loc = ((data or {}).get("geometry") or {}).get("location") or {}
+    if not data.get("place_id") or loc.get("lat") is None or loc.get("lng") is None:
+        return None
+    return {
+        "place_id": data["place_id"],
+        "name": data.get("name", ""),
+        "address": data.get("formatted_address", ""),
+        "lat": loc["lat"],
+        "lng": loc["lng"],
+        "types": ",".join(data["types"]) if data.get("types") is not None else None,
+    }
+
+
+def _upsert_stmt(db: Session, rows: List[dict]):
+    """方言ごとの INSERT ... ON DUPLICATE KEY / ON CONFLICT（place_id が衝突したら内容を更新）。"""
+    table = models.Destination.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table).values(rows)
+        return stmt.on_duplicate_key_update(
+            name=stmt.inserted.name,
+            address=stmt.inserted.address,
+            lat=stmt.inserted.lat,
+            lng=stmt.inserted.lng,
+            types=func.coalesce(stmt.inserted.types, table.c.types),
+        )
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(rows)
+        return stmt.on_conflict_do_update(
+            index_elements=["place_id"],
+            set_={
+                "name": stmt.excluded.name,
+                "address": stmt.excluded.address,
+                "lat": stmt.excluded.lat,
+                "lng": stmt.excluded.lng,
+                "types": func.coalesce(stmt.excluded.types, table.c.types),
+            },
+        )
+    raise NotImplementedError(f"upsert is not supported for dialect={dialect}")
+
+
+def get_destinations_by_place_ids(db: Session, place_ids: Iterable[str]) -> List[models.Destination]:
+    ids = list(dict.fromkeys(place_ids))
+    if not ids:
+        return []
+    return list(db.scalars(select(models.Destination).where(models.Destination.place_id.in_(ids))))
+
+
+def upsert_destinations(db: Session, rows: List[dict]) -> List[models.Destination]:
+    """
+    destinations をまとめて upsert し、place_id の入力順で行を返す。
+    IntegrityError → rollback → 再検索 の往復をせず、1 INSERT + 1 SELECT で済ませる。
+    （MySQL は RETURNING が無いので SELECT で取り直す）
+    """
+    by_pid = {r["place_id"]: r for r in rows}  # 同じ place_id は後勝ち
+    if not by_pid:
+        return []
+    values = [{"id": str(uuid.uuid4()), **r} for r in by_pid.values()]
+    db.execute(_upsert_stmt(db, values))
+    db.commit()
+    found = {d.place_id: d for d in get_destinations_by_place_ids(db, by_pid)}
+    return [found[pid] for pid in by_pid if pid in found]
+
+
+# ---- 一覧（キーセットページング） --------------------------------------
+# 並び順は (created_at DESC, id DESC)。ix_dest_created_id を使って OFFSET なしで次ページへ進む。
+# カーソルは最後の行の "created_at|id" を base64url にしたもの。
+_DEST_COLUMNS = (
+    models.Destination.id,
+    models.Destination.place_id,
+    models.Destination.name,
+    models.Destination.address,
+    models.Destination.lat,
+    models.Destination.lng,
+    models.Destination.created_at,
+)
+
+
+def encode_cursor(created_at: dt.datetime, id_: str) -> str:
+    raw = f"{created_at.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[dt.datetime, str]:
+    """不正なカーソルは ValueError。"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, id_ = raw.split("|", 1)
+        return dt.datetime.fromisoformat(ts), id_
+    except Exception as ex:
+        raise ValueError(f"invalid cursor: {cursor!r}") from ex
+
+
+def list_destination_rows(db: Session, limit: int, cursor: Optional[str] = None,
+                          skip: int = 0) -> Tuple[List[Row], Optional[str]]:
+    """
+    ORM オブジェクトを作らず列だけ取る（identity map を通さない）。
+    戻り値: (行, 次ページのカーソル or None)
+    skip は旧クライアント互換（cursor があれば無視）。
+    """
+    D = models.Destination
+    stmt = select(*_DEST_COLUMNS).order_by(D.created_at.desc(), D.id.desc())
+    if cursor:
+        ts, id_ = decode_cursor(cursor)
+        if db.get_bind().dialect.name == "sqlite":
+            # SQLite の server_default(CURRENT_TIMESTAMP) は "YYYY-MM-DD HH:MM:SS" 文字列で入るので、
+            # datetime のまま渡す（マイクロ秒付きで比較される）とページが進まない
+            ts = ts.isoformat(sep=" ")
+        stmt = stmt.where(or_(D.created_at < ts, and_(D.created_at == ts, D.id < id_)))
+    elif skip:
+        stmt = stmt.offset(skip)
+    # 1件多く取って次ページの有無を判定する
+    rows = list(db.execute(stmt.limit(limit + 1)))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+
+def iter_destination_rows(db: Session, batch_size: int = 1000) -> Iterator[Row]:
+    """全件をキーセットで batch_size ずつ流す（エクスポート用）。"""
+    cursor = None
+    while True:
+        rows, cursor = list_destination_rows(db, batch_size, cursor)
+        yield from rows
+        if cursor is None:
+            return
+
+
+# ---- 最近の訪問先 ------------------------------------------------------
+RECENT_SCAN_BATCH = 50
+
+
+def recent_destinations(db: Session, user_id: str, limit: int) -> List[Tuple[str, str]]:
+    """
+    ユーザーの訪問を新しい順に ix_visit_user_created_dest で読み、
+    destination_id が limit 件そろった時点で打ち切る（全訪問の GROUP BY をしない）。
+    戻り値: [(place_id, name)]（新しい順）
+    """
+    V = models.VisitHistory
+    stmt = (
+        select(V.destination_id)
+        .where(V.user_id == user_id)
+        .order_by(V.created_at.desc())
+    )
+    batch = max(RECENT_SCAN_BATCH, limit * 4)
+    dest_ids: List[str] = []
+    seen = set()
+    offset = 0
+    while len(dest_ids) < limit:
+        chunk = list(db.scalars(stmt.offset(offset).limit(batch)))
+        for did in chunk:
+            if did not in seen:
+                seen.add(did)
+                dest_ids.append(did)
+                if len(dest_ids) >= limit:
+                    break
+        if len(chunk) < batch:
+            break
+        offset += batch
+
+    if not dest_ids:
+        return []
+    D = models.Destination
+    found = {
+        r.id: (r.place_id, r.name)
+        for r in db.execute(select(D.id, D.place_id, D.name).where(D.id.in_(dest_ids)))
+    }
+    return [found[d] for d in dest_ids if d in found]
+
+
+# ---- 寄り道履歴（/guide-history） ---------------------------------------
+# 月次サマリは detour_history_monthly に choose_detour の同じトランザクションで加算する。
+# 日別は ix_detour_history_user_chosen で「ユーザー × 月」の範囲だけ GROUP BY する。
+def month_key(ts: dt.datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+
+def bump_detour_monthly(db: Session, user_id: int, month: str, detours: int = 1, minutes: int = 0) -> None:
+    """detour_history_monthly を加算する（commit は呼び出し側）。"""
+    table = DetourHistoryMonthly.__table__
+    now = dt.datetime.utcnow()
+    row = {"user_id": user_id, "month": month, "detours": detours, "minutes": minutes, "updated_at": now}
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table).values(row)
+        stmt = stmt.on_duplicate_key_update(
+            detours=table.c.detours + detours,
+            minutes=table.c.minutes + minutes,
+            updated_at=now,
+        )
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(table).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "month"],
+            set_={
+                "detours": table.c.detours + detours,
+                "minutes": table.c.minutes + minutes,
+                "updated_at": now,
+            },
+        )
+    else:
+        raise NotImplementedError(f"upsert is not supported for dialect={dialect}")
+    db.execute(stmt)
+
+
+def detour_month_summary(db: Session, user_id: int, start: dt.datetime, end: dt.datetime) -> Tuple[int, int]:
+    """(件数, 分)。集計テーブルに行が無ければ（移行前の履歴など）COUNT で数える。"""
+    row = db.get(DetourHistoryMonthly, (user_id, month_key(start)))
+    if row is not None:
+        return row.detours, row.minutes
+    H = DetourHistory
+    n = db.scalar(
+        select(func.count()).select_from(H)
+        .where(H.user_id == user_id, H.chosen_at >= start, H.chosen_at < end)
+    )
+    return int(n or 0), 0
+
+
+def detour_day_counts(db: Session, user_id: int, start: dt.datetime, end: dt.datetime,
+                      limit: int, before: Optional[dt.date] = None) -> List[Tuple[str, int]]:
+    """[(YYYY-MM-DD, 件数)] を新しい日から limit 件。before があればその日より前だけ。"""
+    H = DetourHistory
+    day = func.date(H.chosen_at)
+    stmt = (
+        select(day.label("day"), func.count().label("n"))
+        .where(H.user_id == user_id, H.chosen_at >= start, H.chosen_at < end)
+        .group_by(day)
+        .order_by(day.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(H.chosen_at < dt.datetime.combine(before, dt.time()))
+    # MySQL は date、SQLite は文字列で返るので str() でそろえる
+    return [(str(r.day), int(r.n)) for r in db.execute(stmt)]
+
+
+def detour_rows_between(db: Session, user_id: int, start: dt.datetime, end: dt.datetime) -> List[Row]:
+    H = DetourHistory
+    stmt = (
+        select(H.id, H.name, H.note, H.chosen_at)
+        .where(H.user_id == user_id, H.chosen_at >= start, H.chosen_at < end)
+        .order_by(H.chosen_at.desc(), H.id.desc())
+    )
+    return list(db.execute(stmt))
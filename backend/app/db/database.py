@@ -1,21 +1,25 @@
-import os
+import logging
 from pathlib import Path
-from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.engine import URL
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
-load_dotenv()
+from app.core.config import settings
 
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT", "3306")
-DB_NAME = os.getenv("DB_NAME")
-SSL_CA_PATH = os.getenv("SSL_CA_PATH")  # .envで設定
+logger = logging.getLogger(__name__)
+
+DB_USER = settings.db_user
+DB_PASSWORD = settings.db_password
+DB_HOST = settings.db_host
+DB_PORT = settings.db_port
+DB_NAME = settings.db_name
+SSL_CA_PATH = settings.ssl_ca_path  # .envで設定
+
+# DATABASE_URL があればそれを優先（ローカル検証用: sqlite:///./local.db など）
+DATABASE_URL = settings.database_url.strip()
 
 # DB URL を安全に構築
-database_url = URL.create(
+database_url = DATABASE_URL or URL.create(
     drivername="mysql+pymysql",
     username=DB_USER,
     password=DB_PASSWORD,
@@ -24,22 +28,31 @@ database_url = URL.create(
     database=DB_NAME,
     query={"charset": "utf8mb4"},
 )
+IS_SQLITE = str(database_url).startswith("sqlite")
 
 # SSL 証明書の絶対パス解決
 connect_args = {}
-if SSL_CA_PATH:
+if IS_SQLITE:
+    connect_args = {"check_same_thread": False}  # threadpool から同じ接続を使うため
+elif SSL_CA_PATH:
     ca_abs = str(Path(SSL_CA_PATH).resolve())  # ← ここで絶対パスに変換！
-    print(f"★ mysql ssl ca (resolved) => {ca_abs}  exists={Path(ca_abs).is_file()}")
+    logger.info("mysql ssl ca resolved", extra={"path": ca_abs, "exists": Path(ca_abs).is_file()})
     if not Path(ca_abs).is_file():
         raise FileNotFoundError(f"SSL_CA_PATH not found: {ca_abs}")
     connect_args = {"ssl": {"ca": ca_abs}}
 
+engine_kwargs = {} if IS_SQLITE else {
+    "pool_pre_ping": True,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+}
 engine = create_engine(
     database_url,
-    pool_pre_ping=True,
-    pool_recycle=1800,
     echo=False,
     connect_args=connect_args,
+    **engine_kwargs,
 )
 
 Base = declarative_base()
@@ -0,0 +1,165 @@
+# app/db/migrate.py
+"""
+スキーマのマイグレーション（Alembic）。
+
+起動時の挙動は MIGRATION_MODE で切り替える:
+    check      … alembic_version を1行読んで head と比べるだけ（既定。テーブルの reflect はしない）
+    upgrade    … alembic upgrade head を実行（ローカル / SQLite 向け）
+    create_all … 旧来の Base.metadata.create_all
+    off        … 何もしない
+check でバージョンが head と違うときは起動を止める（MIGRATION_STRICT=false で警告だけにできる）。
+本番はデプロイ前に CI が `python -m app.db.migrate upgrade` を実行する（.github/workflows）。
+
+CLI（backend/ で実行）:
+    python -m app.db.migrate check      # 現在のバージョンと head を表示
+    python -m app.db.migrate upgrade    # head まで上げる
+    python -m app.db.migrate selftest   # 一時 SQLite に upgrade → モデルと差分確認 → downgrade → upgrade
+"""
+from __future__ import annotations
+
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+ALEMBIC_INI = BACKEND_DIR / "alembic.ini"
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_MODE = settings.migration_mode.strip().lower()
+MIGRATION_STRICT = settings.migration_strict
+
+
+class SchemaVersionError(RuntimeError):
+    """DB のスキーマバージョンがコードの head と一致しない。"""
+
+
+def _config(connection: Optional[Connection] = None):
+    from alembic.config import Config
+
+    cfg = Config(str(ALEMBIC_INI))
+    cfg.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    cfg.attributes["configure_logger"] = False
+    if connection is not None:
+        cfg.attributes["connection"] = connection
+    return cfg
+
+
+def head_revision() -> Optional[str]:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(_config()).get_current_head()
+
+
+def current_revision(conn: Connection) -> Optional[str]:
+    """alembic_version が無ければ None（未管理の DB）。"""
+    try:
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        conn.rollback()
+        return None
+
+
+def check(engine=None) -> bool:
+    from app.db.database import engine as default_engine
+
+    engine = engine or default_engine
+    with engine.connect() as conn:
+        current = current_revision(conn)
+    head = head_revision()
+    if current == head:
+        logger.info("schema up to date", extra={"rev": current})
+        return True
+    msg = f"schema rev={current} head={head}: run `alembic upgrade head` (backend/)"
+    if MIGRATION_STRICT:
+        raise SchemaVersionError(msg)
+    logger.warning(msg)
+    return False
+
+
+def upgrade(revision: str = "head", connection: Optional[Connection] = None) -> None:
+    from alembic import command
+
+    command.upgrade(_config(connection), revision)
+
+
+def downgrade(revision: str, connection: Optional[Connection] = None) -> None:
+    from alembic import command
+
+    command.downgrade(_config(connection), revision)
+
+
+def on_startup() -> None:
+    mode = MIGRATION_MODE
+    if mode == "off":
+        return
+    if mode == "upgrade":
+        upgrade()
+    elif mode == "create_all":
+        from app.db.database import init_db
+
+        init_db()
+    else:
+        check()
+
+
+def _diff(conn: Connection) -> List[tuple]:
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    from app.db import models  # noqa: F401
+    from app.db.database import Base
+
+    ctx = MigrationContext.configure(conn, opts={"compare_type": True})
+    return compare_metadata(ctx, Base.metadata)
+
+
+def selftest() -> int:
+    """一時 SQLite でマイグレーションを往復させ、モデル定義との差分が無いことを確かめる。"""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'selftest.db'}")
+        with engine.begin() as conn:
+            upgrade("head", conn)
+            diff = _diff(conn)
+        with engine.begin() as conn:
+            downgrade("base", conn)
+            left = [t for t in conn.dialect.get_table_names(conn) if t != "alembic_version"]
+        with engine.begin() as conn:
+            upgrade("head", conn)
+            rev = current_revision(conn)
+        engine.dispose()
+
+    ok = not diff and not left and rev == head_revision()
+    for d in diff:
+        print(f"[MIGRATE] diff {d}")
+    if left:
+        print(f"[MIGRATE] tables left after downgrade: {left}")
+    print(f"[MIGRATE] selftest {'OK' if ok else 'NG'} head={rev}")
+    return 0 if ok else 1
+
+
+def main(argv: List[str]) -> int:
+    from app.core.log import setup_logging
+
+    setup_logging()
+    cmd = argv[0] if argv else "check"
+    if cmd == "check":
+        return 0 if check() else 1
+    if cmd == "upgrade":
+        upgrade()
+        return 0
+    if cmd == "selftest":
+        return selftest()
+    print(__doc__)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
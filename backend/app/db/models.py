@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Float, DateTime, func, UniqueConstraint, ForeignKey, Text, Integer
+from sqlalchemy import String, Float, DateTime, func, UniqueConstraint, ForeignKey, Text, Integer, Index
 import uuid, datetime as dt
 from sqlalchemy import Column, Integer, String #からちゃん追加
 #from sqlalchemy.ext.declarative import declarative_base #からちゃん追加
@@ -11,7 +11,10 @@ from app.models.detour_suggestion import DetourSuggestion, SpotSummary
 
 class Destination(Base):
     __tablename__ = "destinations"
-    __table_args__ = (UniqueConstraint("place_id", name="uq_dest_place_id"),)
+    __table_args__ = (
+        UniqueConstraint("place_id", name="uq_dest_place_id"),
+        Index("ix_dest_created_id", "created_at", "id"),  # 一覧のキーセットページング用
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     place_id: Mapped[str] = mapped_column(String(128), index=True)
@@ -19,6 +22,7 @@ class Destination(Base):
     address: Mapped[str] = mapped_column(String(512))
     lat: Mapped[float] = mapped_column(Float)
     lng: Mapped[float] = mapped_column(Float)
+    types: Mapped[str | None] = mapped_column(String(512), nullable=True)  # Places の types（カンマ区切り。NULL は未取得）
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     # Guides へのリレーション（1:N）
@@ -28,6 +32,10 @@ class Destination(Base):
 
 class VisitHistory(Base):
     __tablename__ = "visit_histories"
+    __table_args__ = (
+        # 最近の訪問先（/visits/recent）: user_id で絞って created_at 降順に読み、destination_id まで索引だけで取る
+        Index("ix_visit_user_created_dest", "user_id", "created_at", "destination_id"),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     # ユーザー未ログインでも使えるよう nullable True
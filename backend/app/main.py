@@ -1,26 +1,40 @@
 # app/main.py
 
+# --- 0) 起動プロファイル（STARTUP_PROFILE=1 のときだけ import 時間を計測） ---
+import logging
+import os
+if os.getenv("STARTUP_PROFILE", "").strip().lower() in ("1", "true", "yes", "on"):
+    from app.core import startup_profile
+    startup_profile.install()
+else:
+    startup_profile = None
+
 # --- 1) GCP ADC を最優先でセット（ルータ import より前に必ず実行） ---
 from app.services.google_adc_bootstrap import ensure_adc
 ensure_adc()  # GCP_SA_JSON / *_B64 から鍵を書き出し、GOOGLE_APPLICATION_CREDENTIALS を設定
 
 # --- 2) 以降は通常の起動処理 ---
-import os
-import pathlib
-from dotenv import load_dotenv
+import time
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, PlainTextResponse
 from sqlalchemy import text, inspect
 
-from app.db.database import engine, init_db
+# ----- ローカル開発用: backend/.env を読み込む（Azure には通常 .env は無い）。読むのはここで1回だけ -----
+from app.core.config import BASE_DIR, load_env
+load_env()
 
-# ----- ローカル開発用: backend/.env を読み込む（Azure には通常 .env は無い） -----
-BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
-ENV_PATH = BASE_DIR / ".env"
-load_dotenv(dotenv_path=ENV_PATH)
+from app.core import metrics, profiling
+from app.core.auth import maybe_require_admin
+from app.core.log import setup_logging
+setup_logging()
+logger = logging.getLogger("app.main")
+
+from app.db.database import engine
+from app.db import migrate
+from app.services import history_buffer, passwords, security
 
 # .env に GOOGLE_APPLICATION_CREDENTIALS がある場合のみ、相対→絶対へ解決（ensure_adc の値は上書きしない）
 gac = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
@@ -28,11 +42,10 @@ if gac:
     if not os.path.isabs(gac):
         gac_abs = (BASE_DIR / gac).resolve()
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(gac_abs)
-        print(f"★ cred_path (raw) >> {gac}")
-        print(f"★ cred_path (absolute) >> {gac_abs}")
-        print(f"★ os.path.exists(cred_path) >> {os.path.exists(gac_abs)}")
+        logger.info("resolved GOOGLE_APPLICATION_CREDENTIALS",
+                    extra={"raw": gac, "path": str(gac_abs), "exists": os.path.exists(gac_abs)})
 else:
-    print("⚠️ GOOGLE_APPLICATION_CREDENTIALS は未設定（Azure では ensure_adc() が設定する想定）")
+    logger.warning("GOOGLE_APPLICATION_CREDENTIALS は未設定（Azure では ensure_adc() が設定する想定）")
 
 # ----- ここからルータを import（ADC 初期化後！） -----
 from app.routes.google_places_api import router as places_router
@@ -42,12 +55,15 @@ from app.routes.detours import router as detours_router
 
 from app.routers import detour_adapter
 from app.routers import detour_guide
+from app.routers import guide_history
 
 from app.routes import user_register_api
 from app.routes import user_login_api
+from app.routes import admin_api
 
 # ----- アプリ本体 -----
-app = FastAPI(title="SerendiGo API")
+# 既定のレスポンスは orjson でエンコード（標準 json より速く、datetime もそのまま出せる）
+app = FastAPI(title="SerendiGo API", default_response_class=ORJSONResponse)
 
 # CORS 設定（必要に応じて本番ドメインを追加）
 app.add_middleware(
@@ -64,6 +80,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ルート別レイテンシ（/metrics）。CORS より外側に置いてプリフライトも含めて測る
+app.add_middleware(metrics.MetricsMiddleware)
+# X-Profile: 1（+ 管理キー）や PROFILE_SAMPLE_RATE で @profiled の関数をサンプリング
+app.add_middleware(profiling.ProfileTriggerMiddleware)
+metrics.install_db_hooks(engine)
+metrics.setup_otel()
+
 # メディア配信（TTS mp3 など）
 MEDIA_DIR = BASE_DIR / "media"
 app.mount("/media", StaticFiles(directory=MEDIA_DIR), name="media")
@@ -75,14 +98,35 @@ app.include_router(visits_router)
 app.include_router(detours_router)
 app.include_router(detour_adapter.router)     # → /detour/...
 app.include_router(detour_guide.router)       # → /detour-guide/...
+app.include_router(guide_history.router)      # → /guide-history/
 app.include_router(user_login_api.router)
 app.include_router(user_register_api.router)
+app.include_router(admin_api.router)
 
-# ヘルスチェック（簡易）
+# ヘルスチェック（簡易）: liveness。プロセスが応答できれば ok（DB 等は見ない）
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+# readiness: 起動フック完了 + DB に接続できるときだけ 200（それ以外は 503 でトラフィックを回さない）
+_startup = {"done": False, "ms": None}
+
+@app.get("/ready")
+def ready():
+    if not _startup["done"]:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "db_unavailable", "detail": repr(e)})
+    return {"status": "ready", "startup_ms": _startup["ms"]}
+
+# Prometheus 形式のメトリクス（ADMIN_API_KEY があれば X-API-Key が必要）
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(maybe_require_admin)])
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # ADC/鍵ファイルの可視化ヘルス（起動検証用）
 @app.get("/healthz")
 def healthz():
@@ -120,5 +164,20 @@ async def test_audio():
 # 起動時フック
 @app.on_event("startup")
 def on_startup():
-    # SQLite 等のローカル開発用テーブル作成
-    init_db()
+    t0 = time.perf_counter()
+    # 既定は alembic_version を読むだけ（MIGRATION_MODE=upgrade / create_all でローカル開発用に作成）
+    migrate.on_startup()
+    security.init()
+    passwords.start()
+    _startup["done"] = True
+    if startup_profile is not None:
+        _startup["ms"] = round(startup_profile.elapsed_ms(), 1)
+        startup_profile.report()
+        startup_profile.uninstall()
+    else:
+        _startup["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    history_buffer.shutdown()  # 未書き込みの履歴を書き切る
+    passwords.shutdown()
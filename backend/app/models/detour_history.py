@@ -1,14 +1,32 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import Integer, String, Float, DateTime
+from sqlalchemy import Integer, String, Float, DateTime, Index, PrimaryKeyConstraint
 from datetime import datetime
 from app.db.database import Base  # あなたの構成に合わせてmodels側のBaseを使用
 
 class DetourHistory(Base):
     __tablename__ = "detour_history"
+    __table_args__ = (
+        # ガイド履歴（/guide-history）: ユーザーごとに月の範囲で chosen_at を引く
+        Index("ix_detour_history_user_chosen", "user_id", "chosen_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # 未ログインでも選べるよう nullable（users.id は int）
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     detour_type: Mapped[str] = mapped_column(String(20), index=True)
     name: Mapped[str] = mapped_column(String(200))
     lat: Mapped[float] = mapped_column(Float)
     lng: Mapped[float] = mapped_column(Float)
     chosen_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     note: Mapped[str | None] = mapped_column(String(300), nullable=True)
+
+
+class DetourHistoryMonthly(Base):
+    """ユーザー × 月（YYYY-MM, UTC）の寄り道件数。choose_detour で加算していく集計テーブル。"""
+    __tablename__ = "detour_history_monthly"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "month", name="pk_detour_history_monthly"),)
+
+    user_id: Mapped[int] = mapped_column(Integer)
+    month: Mapped[str] = mapped_column(String(7))
+    detours: Mapped[int] = mapped_column(Integer, default=0)
+    minutes: Mapped[int] = mapped_column(Integer, default=0)  # 所要時間を持つようになったら加算する
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -7,8 +7,8 @@ class DetourSuggestion(Base):
     __tablename__ = "detour_suggestions"
 
     id = Column(Integer, primary_key=True, index=True)
-    detour_type = Column(String, nullable=False)  # food / event / souvenir
-    name = Column(String, nullable=False)
+    detour_type = Column(String(20), nullable=False)  # food / event / souvenir
+    name = Column(String(256), nullable=False)
     description = Column(Text, nullable=True)
     lat = Column(Float, nullable=False)
     lng = Column(Float, nullable=False)
@@ -17,10 +17,10 @@ class DetourSuggestion(Base):
     rating = Column(Float, nullable=True)
     open_now = Column(Boolean, nullable=True)
     opening_hours = Column(Text, nullable=True)
-    parking = Column(String, nullable=True)  # "あり" / "なし" / "不明"
-    source = Column(String, nullable=False)  # google / hotpepper / connpass
-    url = Column(String, nullable=True)
-    photo_url = Column(String, nullable=True)
+    parking = Column(String(64), nullable=True)  # "あり" / "なし" / "不明"
+    source = Column(String(32), nullable=False)  # google / hotpepper / connpass
+    url = Column(String(512), nullable=True)
+    photo_url = Column(String(512), nullable=True)
     chosen_at = Column(DateTime(timezone=True), server_default=func.now())
     note = Column(Text, nullable=True)
 
@@ -1,17 +1,23 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from app.db.database import get_db
 #from app.services.detour_places import search_places
 # 代わりに、実在する検索関数を使う
 from app.routes.detours import search_detours as core_search
 from app.schemas.detour import DetourSuggestion, TravelMode
-from app.models.detour_history import DetourHistory
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from app.services import history_buffer
 from app.services.security import get_current_user
-from datetime import datetime
 
 router = APIRouter(prefix="/detour-guide", tags=["Detour Guide"])
 
+
+def _write_sync(db: Session, rows) -> None:
+    history_buffer.write(db, rows)
+    db.commit()
+
+
 @router.get("/search", response_model=List[DetourSuggestion])
 async def search_detour_guide(
     lat: float = Query(...),
@@ -19,7 +25,7 @@ async def search_detour_guide(
     mode: TravelMode = Query("walk"),
     minutes: int = Query(15, ge=1, le=120),
     keyword: Optional[str] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     # 互換のコア検索を呼ぶ（引数はあるものだけ渡す）
@@ -33,17 +39,21 @@ async def search_detour_guide(
         categories=None
     )
 
-    # DetourHistory 登録（元のまま）
-    for r in items:
-        history = DetourHistory(
-            user_id=current_user.id,
-            name=r.name,
-            lat=r.lat,
-            lng=r.lng,
-            chosen_at=datetime.utcnow(),
-            note=getattr(r, "description", None)
+    # DetourHistory 登録（返した候補をまとめて write-behind で書く）
+    rows = [
+        history_buffer.event(
+            current_user.id,
+            r.detour_type,
+            r.name,
+            r.lat,
+            r.lng,
+            getattr(r, "description", None),
         )
-        db.add(history)
-    await db.commit()
+        for r in items
+    ]
+    if history_buffer.buffered():
+        history_buffer.add(rows)
+    else:
+        await run_in_threadpool(_write_sync, db, rows)
 
     return items
\ No newline at end of file
@@ -1,12 +1,11 @@
 # app/routers/guide_history.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import select, func
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from app.db.database import get_db
 from app.services.security import get_current_user
-from app.models.detour_history import DetourHistory  # 既存
+from app.db import crud
 
 from pydantic import BaseModel, Field
 
@@ -22,6 +21,7 @@ class Item(BaseModel):
 
 class DayGroup(BaseModel):
     date: str
+    count: int = 0
     items: List[Item]
 
 class Summary(BaseModel):
@@ -32,41 +32,48 @@ class Summary(BaseModel):
 class HistoryResponse(BaseModel):
     summary: Summary
     days: List[DayGroup]
+    next_before: Optional[str] = None  # 続きの日があるとき、次に ?before= に渡す日付
 
 router = APIRouter(prefix="/guide-history", tags=["Guide History"])
 
 @router.get("/", response_model=HistoryResponse)
 def get_history(
     month: Optional[str] = Query(None, description="YYYY-MM"),
+    day_limit: int = Query(7, ge=1, le=31, description="1回で返す日数"),
+    before: Optional[date] = Query(None, description="この日より前の日を返す（ページ送り）"),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     # 月範囲
     if month:
-        y, m = [int(x) for x in month.split("-")]
-        start = datetime(y, m, 1)
+        try:
+            y, m = [int(x) for x in month.split("-")]
+            start = datetime(y, m, 1)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="month must be YYYY-MM")
     else:
         now = datetime.utcnow()
         start = datetime(now.year, now.month, 1)
     next_start = datetime(start.year + (start.month // 12), ((start.month % 12) + 1), 1)
 
-    # 既存DetourHistoryベースで集計
-    q = (
-        select(DetourHistory)
-        .where(DetourHistory.chosen_at >= start, DetourHistory.chosen_at < next_start)
-        .order_by(DetourHistory.chosen_at.desc())
-    )
-    rows = db.execute(q).scalars().all()
+    # サマリは月次集計テーブルから（今は寄り道のみ）
+    detours, minutes = crud.detour_month_summary(db, current_user.id, start, next_start)
 
-    # サマリ（今は寄り道のみ）
-    detours = len(rows)
-    hours = 0  # DetourHistoryにdurationが無い想定のため0。拡張時に合算OK。
+    # 日別件数は SQL で GROUP BY DATE(chosen_at)。1件多く取って続きの有無を見る
+    days = crud.detour_day_counts(db, current_user.id, start, next_start, day_limit + 1, before)
+    next_before = None
+    if len(days) > day_limit:
+        days = days[:day_limit]
+        next_before = days[-1][0]
+    if not days:
+        return HistoryResponse(summary=Summary(travel_guides=0, detours=detours, hours=minutes // 60), days=[])
 
-    # 日別グループ
+    # 明細はこのページの日付範囲だけ読む
+    lo = datetime.fromisoformat(days[-1][0])
+    hi = datetime.fromisoformat(days[0][0]) + timedelta(days=1)
     groups = {}
-    for r in rows:
-        date_key = r.chosen_at.strftime("%Y-%m-%d")
-        groups.setdefault(date_key, []).append(
+    for r in crud.detour_rows_between(db, current_user.id, max(lo, start), min(hi, next_start)):
+        groups.setdefault(r.chosen_at.strftime("%Y-%m-%d"), []).append(
             Item(
                 id=r.id,
                 guide_type="detour",
@@ -79,5 +86,9 @@ def get_history(
             )
         )
 
-    day_list = [DayGroup(date=k, items=v) for k, v in sorted(groups.items(), reverse=True)]
-    return HistoryResponse(summary=Summary(travel_guides=0, detours=detours, hours=hours), days=day_list)
+    day_list = [DayGroup(date=d, count=n, items=groups.get(d, [])) for d, n in days]
+    return HistoryResponse(
+        summary=Summary(travel_guides=0, detours=detours, hours=minutes // 60),
+        days=day_list,
+        next_before=next_before,
+    )
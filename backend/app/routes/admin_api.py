@@ -0,0 +1,63 @@
+# app/routes/admin_api.py
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.core.auth import maybe_require_admin
+from app.core import profiling
+from app.core.config import get_settings, reload_settings
+from app.services import history_buffer, rate_limit, resilience
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(maybe_require_admin)])
+
+
+@router.get("/settings")
+def read_settings():
+    """実行時に変えられるつまみの現在値（このワーカーのもの）。秘密情報は含めない。"""
+    return get_settings().reloadable()
+
+
+@router.post("/settings/reload")
+def reload():
+    """
+    RUNTIME_SETTINGS_PATH を今すぐ読み直す（このワーカーのみ）。
+    他のワーカーも RUNTIME_RELOAD_CHECK_SEC 以内にファイルの更新を検知して取り込む。
+    """
+    try:
+        changed = reload_settings()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"changed": changed, "settings": get_settings().reloadable()}
+
+
+@router.get("/upstreams")
+def upstreams():
+    """外部APIごとのサーキット状態とレート制限の集計。"""
+    return {"health": resilience.snapshot(), "rate_limit": rate_limit.stats()}
+
+
+@router.get("/history-buffer")
+def history_buffer_stats():
+    """寄り道履歴の write-behind バッファの状態（未書き込み件数・失敗回数など）。"""
+    return history_buffer.stats()
+
+
+@router.get("/profiles")
+def list_profiles():
+    """直近のプロファイル（X-Profile / PROFILE_SAMPLE_RATE で取ったもの）の一覧。"""
+    return profiling.recent()
+
+
+@router.get("/profiles/merged", response_class=PlainTextResponse)
+def merged_profile(name: Optional[str] = None):
+    """直近分を足し合わせた collapsed スタック（flamegraph.pl / speedscope に渡す）。"""
+    return profiling.merged(name)
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str):
+    s = profiling.get(profile_id)
+    if s is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return s.collapsed()
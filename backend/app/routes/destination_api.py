@@ -1,24 +1,45 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, Header
+from fastapi import APIRouter, Depends, Query, HTTPException, Header, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
-import os
-from app.db.database import get_db
-from app.db import models
-from app.schemas.destination_schema import DestinationCreate, DestinationRead
+from typing import List, Optional
+import asyncio
+import json
+import logging
+from app.core.config import get_settings, settings
+from app.db.database import SessionLocal, get_db
+from app.db import crud, models
+from app.schemas.destination_schema import (
+    DestinationBulkRegister,
+    DestinationBulkResult,
+    DestinationCreate,
+    DestinationRead,
+)
 from app.services import google_places as svc
 from fastapi.concurrency import run_in_threadpool #(byきたな)
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/destinations", tags=["destinations"])
 
 # --- 簡易APIキー保護（.env に ADMIN_API_KEY がある時だけ有効化）---
-ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "").strip()
+ADMIN_API_KEY = settings.admin_api_key.strip()
 
 def maybe_require_admin(x_api_key: str = Header(default="")):
     """ADMIN_API_KEY が設定されている場合のみ、X-API-Key ヘッダをチェック"""
     if ADMIN_API_KEY and x_api_key != ADMIN_API_KEY:
         raise HTTPException(status_code=401, detail="Invalid API key")
 
+def _to_read(obj: models.Destination) -> DestinationRead:
+    return DestinationRead(
+        id=obj.id,
+        placeId=obj.place_id,
+        name=obj.name,
+        address=obj.address,
+        lat=obj.lat,
+        lng=obj.lng,
+    )
+
 # ---------------------------------------------------------------------
 # A) 完全同期: CRUD（DBのみ触る）byきたな
 # ---------------------------------------------------------------------
@@ -51,11 +72,22 @@ def create_destination(payload: DestinationCreate, db: Session = Depends(get_db)
 
 @router.get("/", response_model=List[DestinationRead])
 def list_destinations(
+    response: Response,
     db: Session = Depends(get_db),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="前ページのレスポンスヘッダ X-Next-Cursor の値"),
+    skip: int = Query(0, ge=0, description="旧方式（OFFSET）。cursor 指定時は無視"),
     limit: int = Query(20, ge=1, le=100),
 ):
-    rows = db.query(models.Destination).offset(skip).limit(limit).all()
+    """
+    新しい順（created_at, id の降順）に返す。
+    次ページがあればレスポンスヘッダ X-Next-Cursor にカーソルを入れる（本文の形は従来どおり）。
+    """
+    try:
+        rows, next_cursor = crud.list_destination_rows(db, limit, cursor=cursor, skip=skip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         DestinationRead(
             id=r.id,
@@ -67,6 +99,32 @@ def list_destinations(
         )
         for r in rows
     ]
+
+# ------------------ 管理用: 全件 NDJSON エクスポート -------------------
+@router.get("/export", dependencies=[Depends(maybe_require_admin)])
+def export_destinations():
+    """
+    1 行 1 件の NDJSON をストリーミングで返す（キーセットで 1000 件ずつ読む）。
+    レスポンス送信中も読み続けるので、get_db ではなく専用のセッションを使う。
+    """
+    def _lines():
+        db = SessionLocal()
+        try:
+            for r in crud.iter_destination_rows(db):
+                yield json.dumps({
+                    "id": r.id,
+                    "placeId": r.place_id,
+                    "name": r.name,
+                    "address": r.address,
+                    "lat": r.lat,
+                    "lng": r.lng,
+                    "createdAt": r.created_at.isoformat() if r.created_at else None,
+                }, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
 # ---------------------------------------------------------------------
 # B) 混在: 外部API(await) + DBはthreadpoolに退避byきたな
 # ---------------------------------------------------------------------
@@ -81,50 +139,64 @@ async def register_from_place_id(
     place_id だけ受け取り、サーバー側で Places Details を取得して保存する。
     フロントは details 結果を組み立てる必要なし。
     """
-    # 1) 外部APIは非同期で取得（byきたな）
-    data = await svc.details(place_id)
-    if not data or "geometry" not in data or "location" not in data["geometry"]:
+    # 1) details はメモリ → destinations テーブル → Google の順に引く（登録済みなら Google に行かない。
+    #    その場合の upsert は同じ内容の書き直しになるだけ）
+    try:
+        data = await svc.details(place_id, fields=svc.REGISTER_FIELDS, db=db)
+    except svc.PlaceNotFoundError:
         raise HTTPException(status_code=404, detail="Place details not found")
+    row = crud.destination_values(data)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Place details not found")
+
     # 2) DB処理は threadpool へ（イベントループを塞がないbyきたな）
-    def _insert():
-        obj = models.Destination(
-            place_id=data["place_id"],
-            name=data.get("name", ""),
-            address=data.get("formatted_address", ""),
-            lat=data["geometry"]["location"]["lat"],
-            lng=data["geometry"]["location"]["lng"],
-        )
-        db.add(obj)
-        try:
-            db.commit()
-            db.refresh(obj)
-        except IntegrityError:
-            db.rollback()
-    #         raise #きたな追加
-    #     db.refresh(obj) #きたな追加
-    #     return obj #きたな追加
-
-    # try:
-    #     obj = await run_in_threadpool(_insert) #きたな追加
-    # except IntegrityError:
-    #     # 既に登録済み
-    #     raise HTTPException(status_code=409, detail="Destination already exists (place_id)") #きたな変更
-# 以下コードに変更（IntegrityErrorをキャッチして既存データを返すように）
-            # ★ 既存のデータを探して返す
-            obj = db.query(models.Destination).filter_by(place_id=place_id).first()
-            if obj is None:
-                raise HTTPException(status_code=500, detail="Failed to insert and retrieve destination")
-        return obj
-
-    obj = await run_in_threadpool(_insert)
+    #    同時登録で衝突しても upsert なので IntegrityError → 再検索 の往復は起きない
+    rows = await run_in_threadpool(crud.upsert_destinations, db, [row])
+    if not rows:
+        raise HTTPException(status_code=500, detail="Failed to insert and retrieve destination")
+    return _to_read(rows[0])
 
-    return DestinationRead(
-        id=obj.id,
-        placeId=obj.place_id,
-        name=obj.name,
-        address=obj.address,
-        lat=obj.lat,
-        lng=obj.lng,
-    )
 
+# --------------- まとめて登録（place_id の配列） -------------------
+@router.post("/register/bulk", response_model=DestinationBulkResult, status_code=201)
+async def register_bulk(
+    payload: DestinationBulkRegister,
+    db: Session = Depends(get_db),
+):
+    """
+    未登録の place_id だけ Places Details を並行取得し、1回の upsert でまとめて保存する。
+    取得できなかった place_id は failed に入れて返す（全体は失敗させない）。
+    """
+    place_ids = list(dict.fromkeys(p for p in payload.placeIds if p))
+    existing = await run_in_threadpool(crud.get_destinations_by_place_ids, db, place_ids)
+    # upsert の commit で ORM オブジェクトは expire されるので、先に DTO にしておく
+    # （後から属性を読むとイベントループ上で1件ずつ SELECT が走る）
+    by_pid = {d.place_id: _to_read(d) for d in existing}
+    have = set(by_pid)
+    missing = [p for p in place_ids if p not in have]
+
+    sem = asyncio.Semaphore(get_settings().bulk_details_concurrency)
+
+    async def _fetch(pid: str):
+        async with sem:
+            return await svc.details(pid, fields=svc.REGISTER_FIELDS)
 
+    fetched = await asyncio.gather(*(_fetch(p) for p in missing), return_exceptions=True)
+    rows, failed = [], []
+    for pid, data in zip(missing, fetched):
+        row = None if isinstance(data, BaseException) else crud.destination_values(data)
+        if row is None:
+            if isinstance(data, BaseException):
+                logger.warning("bulk details failed", extra={"place_id": pid, "ex": repr(data)})
+            else:
+                logger.warning("bulk details without geometry", extra={"place_id": pid})
+            failed.append(pid)
+        else:
+            rows.append(row)
+
+    inserted = await run_in_threadpool(crud.upsert_destinations, db, rows) if rows else []
+    by_pid.update((d.place_id, _to_read(d)) for d in inserted)
+    return DestinationBulkResult(
+        items=[by_pid[p] for p in place_ids if p in by_pid],
+        failed=failed,
+    )
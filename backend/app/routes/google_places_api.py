@@ -1,19 +1,34 @@
-from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.db.database import get_db
 from app.services import google_places as svc
 
 router = APIRouter(prefix="/places", tags=["places"])
 
 @router.get("/predictions")
-async def predictions(input: str = Query(..., min_length=1), limit: int = 3):
+async def predictions(
+    input: str = Query(..., min_length=1),
+    limit: int = 3,
+    session_token: Optional[str] = Query(None, description="Autocomplete セッショントークン（details と共通）"),
+):
     try:
-        items = await svc.predictions(input, limit)
+        items = await svc.predictions(input, limit, session_token=session_token)
         return {"items": items}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/details")
-async def details(place_id: str):
+async def details(
+    place_id: str,
+    session_token: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="カンマ区切りのフィールドマスク（既定: place_id,name,formatted_address,geometry,types）"),
+    db: Session = Depends(get_db),
+):
+    mask = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
     try:
-        return await svc.details(place_id)
+        return await svc.details(place_id, session_token=session_token, fields=mask, db=db)
+    except svc.PlaceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -4,17 +4,21 @@ from app.db.database import get_db
 from app.db import models
 from app.schemas.guide_content import GuideCreate, GuideRead
 from app.services import gpt, tts
+from app.services.security import get_optional_user
 
 router = APIRouter(prefix="/guides", tags=["guides"])
 
 @router.post("/", response_model=GuideRead, status_code=201)
-async def create_guide(payload: GuideCreate, db: Session = Depends(get_db)):
+async def create_guide(payload: GuideCreate, db: Session = Depends(get_db),
+                       current_user=Depends(get_optional_user)):
     dest = db.get(models.Destination, payload.destinationId)
     if not dest:
         raise HTTPException(404, "Destination not found")
 
     user_profile = None
-    if payload.userId:
+    if current_user is not None:
+        user_profile = current_user.profile()  # トークンの claims から（DB 不要）
+    elif payload.userId:
         user = db.get(models.User, payload.userId)  # ← あなたのUserモデルに合わせて
         if user:
             user_profile = {
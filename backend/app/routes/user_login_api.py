@@ -1,17 +1,45 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from app.db.database import get_db
 from app.db import models
 from app.schemas.user_login import UserLogin
+from app.services import passwords
+from app.services.security import create_access_token
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: Session = Depends(get_db)):
+    # DB は threadpool、bcrypt はプロセスプール（イベントループも共有スレッドプールも塞がない）
+    def _find():
+        return db.query(models.User).filter(models.User.email == user.email).first()
+
+    db_user = await run_in_threadpool(_find)
+    if not db_user or not await passwords.verify_password(user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="メールアドレスまたはパスワードが間違っています")
-    
-    return {"message": "ログイン成功", "user_id": db_user.id}
+
+    # コスト（BCRYPT_ROUNDS）が変わっていれば、平文が手元にあるこのタイミングで作り直す
+    if passwords.needs_rehash(db_user.hashed_password):
+        new_hash = await passwords.hash_password(user.password)
+
+        def _save():
+            db_user.hashed_password = new_hash
+            db.commit()
+
+        try:
+            await run_in_threadpool(_save)
+        except Exception as e:
+            db.rollback()
+            logger.warning("password rehash failed", extra={"ex": repr(e)})  # ログイン自体は成功させる
+
+    # プロフィール（gender / age_group 等）入りのトークン。以降の API は Authorization: Bearer で送る
+    return {
+        "message": "ログイン成功",
+        "user_id": db_user.id,
+        "access_token": create_access_token(db_user),
+        "token_type": "bearer",
+    }
@@ -2,15 +2,21 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import Optional, Union
-import traceback
-from typing import List
-from sqlalchemy import func
+import logging
+import time
+from collections import OrderedDict
+from typing import List, Tuple
 from app.schemas.destination_schema import DestinationBrief
+from app.core.config import get_settings
+from app.core.profiling import profiled
 from app.db.database import get_db
-from app.db import models
+from app.db import crud, models
 from app.schemas.visit_record import VisitCreate, VisitRead
 from app.schemas.guide_content import GuideRead
 from app.services import gpt, tts
+from app.services.security import CurrentUser, get_optional_user
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/visits", tags=["visits"])
 
@@ -20,8 +26,14 @@ def _get_destination_by_any(db: Session, destination_id: Union[int, str]) -> Opt
     return db.query(models.Destination).filter(models.Destination.place_id == destination_id).first()
 
 @router.post("/", response_model=dict, status_code=201)
-async def create_visit(payload: VisitCreate, db: Session = Depends(get_db)):
-    print("DEBUG /visits payload.userId =", payload.userId)  # デバッグ用
+@profiled("create_visit")
+async def create_visit(
+    payload: VisitCreate,
+    db: Session = Depends(get_db),
+    current_user: Optional[CurrentUser] = Depends(get_optional_user),
+):
+    # ログイン済み（Bearer トークンあり）ならトークンの本人を使う。旧クライアントは payload.userId
+    user_id = current_user.id if current_user else payload.userId
     # 1) 目的地取得
     dest = _get_destination_by_any(db, payload.destinationId)
     if not dest:
@@ -29,28 +41,29 @@ async def create_visit(payload: VisitCreate, db: Session = Depends(get_db)):
 
     # 2) Visit 作成（userId は int|None）
     try:
-        visit = models.VisitHistory(destination_id=dest.id, user_id=str(payload.userId) if payload.userId is not None else None)
+        visit = models.VisitHistory(destination_id=dest.id, user_id=str(user_id) if user_id is not None else None)
         db.add(visit)
         db.commit()
         db.refresh(visit)
+        invalidate_recent(visit.user_id)
     except IntegrityError as e:
         db.rollback()
-        print("Visit commit IntegrityError:", repr(e))
-        traceback.print_exc()
+        logger.exception("visit commit IntegrityError")
         raise HTTPException(status_code=400, detail="Invalid visit values (FK/NOT NULL/unique)")  # 具体化
     except Exception as e:
         db.rollback()
-        print("Visit commit error:", repr(e))
-        traceback.print_exc()
+        logger.exception("visit commit error")
         raise
 
-    # 3) 任意: ユーザープロファイル
+    # 3) 任意: ユーザープロファイル（トークンの claims にあるので DB は引かない）
     user_profile: Optional[dict] = None
-    if payload.userId and hasattr(models, "User"):
+    if current_user is not None:
+        user_profile = current_user.profile()
+    elif payload.userId and hasattr(models, "User"):
         u = db.get(models.User, payload.userId)
         if u:
             user_profile = {
-                "age": getattr(u, "age", None),
+                "age_group": getattr(u, "age_group", None),
                 "gender": getattr(u, "gender", None),
             }
 
@@ -61,13 +74,13 @@ async def create_visit(payload: VisitCreate, db: Session = Depends(get_db)):
             style="friendly", user=user_profile
         )
     except Exception as e:
-        print("GPT guide error (fallback to plain text):", repr(e))
+        logger.warning("guide generation failed, falling back to plain text", extra={"ex": repr(e)})
         text = f"{dest.name}（{dest.address}）のご案内です。見どころ、歴史、アクセスをやさしく紹介します。"
 
     try:
         _, audio_url = await tts.synthesize_to_mp3(text, voice=None)
     except Exception as e:
-        print("TTS error (fallback to placeholder):", repr(e))
+        logger.warning("tts failed, falling back to placeholder", extra={"ex": repr(e)})
         audio_url = "/media/guides/README.txt"
 
     # 5) ガイド保存（voice が NOT NULL だと None で落ちるので空文字にする）
@@ -85,57 +98,71 @@ async def create_visit(payload: VisitCreate, db: Session = Depends(get_db)):
         db.refresh(guide)
     except IntegrityError as e:
         db.rollback()
-        print("Guide commit IntegrityError:", repr(e))
-        traceback.print_exc()
+        logger.exception("guide commit IntegrityError")
         raise HTTPException(status_code=400, detail="Invalid guide values (FK/NOT NULL/length)")
     except Exception as e:
         db.rollback()
-        print("Guide commit error:", repr(e))
-        traceback.print_exc()
+        logger.exception("guide commit error")
         raise
 
     # 6) レスポンス作成（validate 失敗の中身を出す）
     try:
         visit_out = VisitRead.model_validate(visit)
     except Exception as e:
-        print("VisitRead validate error:", repr(e))
-        traceback.print_exc()
+        logger.exception("VisitRead validate error")
         raise HTTPException(status_code=500, detail="Visit serialization failed")
 
     try:
         guide_out = GuideRead.model_validate(guide)
     except Exception as e:
-        print("GuideRead validate error:", repr(e))
-        traceback.print_exc()
+        logger.exception("GuideRead validate error")
         raise HTTPException(status_code=500, detail="Guide serialization failed")
 
     return {"visit": visit_out, "guide": guide_out}
 
 # 7) 最近の訪問先一覧（placeId と name のみ）取得
+# ユーザーごとに短時間キャッシュ（create_visit で破棄）。複数ワーカー間の古さは TTL で抑える
+RECENT_CACHE_MAX_USERS = 10000
+_recent_cache: "OrderedDict[str, Tuple[float, int, List[Tuple[str, str]]]]" = OrderedDict()
+
+
+def _recent_get(user_id: str, limit: int) -> Optional[List[Tuple[str, str]]]:
+    hit = _recent_cache.get(user_id)
+    if hit is None:
+        return None
+    expires, fetched_limit, rows = hit
+    if expires < time.monotonic():
+        _recent_cache.pop(user_id, None)
+        return None
+    # 多めの limit で取った結果、または件数が limit 未満（全件）なら流用できる
+    if limit <= fetched_limit or len(rows) < fetched_limit:
+        _recent_cache.move_to_end(user_id)
+        return rows[:limit]
+    return None
+
+
+def _recent_put(user_id: str, limit: int, rows: List[Tuple[str, str]]) -> None:
+    ttl = get_settings().recent_destinations_ttl_sec
+    _recent_cache[user_id] = (time.monotonic() + ttl, limit, rows)
+    _recent_cache.move_to_end(user_id)
+    while len(_recent_cache) > RECENT_CACHE_MAX_USERS:
+        _recent_cache.popitem(last=False)
+
+
+def invalidate_recent(user_id: Optional[str]) -> None:
+    if user_id is not None:
+        _recent_cache.pop(str(user_id), None)
+
+
 @router.get("/recent", response_model=List[DestinationBrief])
 def get_recent_destinations(user_id: str, limit: int = 5, db: Session = Depends(get_db)):
     """
     ユーザーの最近の訪問先を、目的地ごとに重複排除して新しい順で返す。
-    MySQL でも動くように subquery + join で DISTINCT 相当を実現。
+    (user_id, created_at, destination_id) の複合インデックスを新しい順に読み、limit 件そろったら打ち切る。
     """
-    # 各 destination_id の最新 visit を求める
-    sub = (
-        db.query(
-            models.VisitHistory.destination_id.label("dest_id"),
-            func.max(models.VisitHistory.created_at).label("latest")
-        )
-        .filter(models.VisitHistory.user_id == str(user_id))
-        .group_by(models.VisitHistory.destination_id)
-        .subquery()
-    )
-
-    # 最新 visit と Destination を結合して新しい順に
-    rows = (
-        db.query(models.Destination.place_id, models.Destination.name)
-        .join(sub, sub.c.dest_id == models.Destination.id)
-        .order_by(sub.c.latest.desc())
-        .limit(limit)
-        .all()
-    )
-
-    return [DestinationBrief(placeId=pl_id, name=name) for pl_id, name in rows]
\ No newline at end of file
+    uid = str(user_id)
+    rows = _recent_get(uid, limit)
+    if rows is None:
+        rows = crud.recent_destinations(db, uid, limit)
+        _recent_put(uid, limit, rows)
+    return [DestinationBrief(placeId=pl_id, name=name) for pl_id, name in rows]
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, Field
 
 class DestinationBase(BaseModel):
@@ -15,4 +16,11 @@ class DestinationRead(DestinationBase):
 
 class DestinationBrief(BaseModel):
     placeId: str
-    name: str
\ No newline at end of file
+    name: str
+
+class DestinationBulkRegister(BaseModel):
+    placeIds: List[str] = Field(..., min_length=1, max_length=100, description="Google Place ID の配列")
+
+class DestinationBulkResult(BaseModel):
+    items: List[DestinationRead]
+    failed: List[str] = []
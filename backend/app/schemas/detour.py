@@ -88,7 +88,7 @@ class DetourSuggestion(BaseModel):
 
 # 🕓 履歴アイテム
 class DetourHistoryItem(BaseModel):
-    id: int
+    id: Optional[int] = None  # write-behind（HISTORY_WRITE_MODE=buffer）では未採番
     detour_type: DetourType
     name: str
     lat: float
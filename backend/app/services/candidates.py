@@ -0,0 +1,96 @@
+# app/services/candidates.py
+"""
+寄り道候補の内部表現。
+
+google_nearby / yolp_places / connpass_events / 履歴 / ローカル POI ストアはすべて Candidate を返し、
+パイプライン（detour_pipeline）は normalize → dedupe → filter → rank まで Candidate のまま扱う。
+DetourSuggestion（pydantic）を作るのは rank 後の top-k だけ。
+
+dict より小さく属性アクセスも速い（__slots__）。検索地点に依存する distance_km / duration_min と
+enrich で付く summary は後から埋まる。
+"""
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Union
+
+# dedupe で欠けている項目を補うときの対象（先勝ち・後着は空欄だけ埋める）
+MERGE_FIELDS = (
+    "id", "description", "address", "url", "rating", "reviews_count", "open_now",
+    "opening_hours", "parking", "photo_url", "created_at", "category", "categories",
+)
+_EMPTY = (None, "", [], ())
+# 検索地点・リクエストに依存する項目（ストアに入れるときは落とす）
+ORIGIN_FIELDS = ("distance_km", "duration_min", "summary")
+
+
+@dataclass(slots=True)
+class Candidate:
+    name: str
+    lat: float
+    lng: float
+    source: str = "google"
+    id: Optional[str] = None              # 外部 ID（place_id / YOLP Id）
+    description: Optional[str] = None
+    address: Optional[str] = None
+    url: Optional[str] = None
+    rating: Optional[float] = None
+    reviews_count: Optional[int] = None
+    open_now: Optional[bool] = None
+    opening_hours: Optional[str] = None
+    parking: Optional[str] = None
+    photo_url: Optional[str] = None
+    created_at: Optional[str] = None
+    category: Optional[str] = None        # Gemini 要約のヒント（インポート POI のみ）
+    categories: Sequence[str] = ()        # 空のときに候補ごとの list を作らない
+    # 検索ごとに埋まる
+    distance_km: Optional[float] = None
+    duration_min: Optional[int] = None
+    summary: Optional[str] = None
+
+    def source_id(self) -> str:
+        """要約キャッシュ・ストアのキー（外部 ID、無ければ座標）。"""
+        if self.id:
+            return str(self.id)
+        return f"{self.lat:.6f},{self.lng:.6f}"
+
+    def merge(self, other: "Candidate") -> None:
+        for k in MERGE_FIELDS:
+            v = getattr(other, k)
+            if v not in _EMPTY and getattr(self, k) in _EMPTY:
+                setattr(self, k, v)
+
+    def detached(self) -> "Candidate":
+        """検索地点に依存する項目を落としたコピー（ストア格納用）。"""
+        return dataclasses.replace(self, distance_km=None, duration_min=None, summary=None)
+
+
+_FIELDS = frozenset(f.name for f in dataclasses.fields(Candidate))
+
+
+def from_dict(x: dict) -> Candidate:
+    """dict 形式（一括インポート JSONL・外部の register_source）から作る。知らないキーは捨てる。"""
+    kw = {k: v for k, v in x.items() if k in _FIELDS and k not in ORIGIN_FIELDS}
+    kw["lat"], kw["lng"] = float(x["lat"]), float(x["lng"])
+    sid = x.get("place_id") or x.get("id")
+    kw["id"] = str(sid) if sid else None
+    kw["address"] = x.get("address") or x.get("vicinity")
+    kw["categories"] = tuple(x.get("categories") or ())
+    return Candidate(**kw)
+
+
+def as_candidates(items: Iterable[Union[Candidate, dict]]) -> List[Candidate]:
+    """Candidate はそのまま、dict は from_dict で変換（名称・座標が無いものは捨てる）。"""
+    out: List[Candidate] = []
+    for x in items:
+        if isinstance(x, Candidate):
+            out.append(x)
+            continue
+        if x.get("lat") is None or x.get("lng") is None or not x.get("name"):
+            continue
+        try:
+            out.append(from_dict(x))
+        except (TypeError, ValueError):
+            continue
+    return out
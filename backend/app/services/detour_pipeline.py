@@ -0,0 +1,402 @@
+# app/services/detour_pipeline.py
+"""
+寄り道検索パイプライン。
+
+    sources → normalize → dedupe → filter → rank → enrich → serialize
+
+- sources: detour_type ごとに登録された候補ソースを共通の締め切り（settings.search_deadline_sec）
+  付きで並行実行し、間に合った分だけをマージする（ローカル POI ストア優先）
+- dedupe: プロバイダをまたいで「正規化名 + 近接（DEDUPE_RADIUS_M 以内）」で統合
+- 候補は Candidate（app/services/candidates.py、__slots__）のまま流し、
+  DetourSuggestion（pydantic）は serialize で top-k 分だけ作る
+- enrich: 説明文の取得/生成は rank 後の top-k だけに行う
+- 各ステージの所要時間は ctx.timings（ms）に記録し、/metrics（app_span_duration_seconds）にも出す
+
+新しいプロバイダは CandidateSource を作って register_source() するだけで足せる
+（fetch は Candidate を返す。dict を返した場合は as_candidates で変換する）。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.models.detour_history import DetourHistory
+from app.schemas.detour import DetourSearchQuery, DetourSuggestion
+from app.services.candidates import Candidate, as_candidates
+from app.services.events import connpass_events, yolp_places
+from app.services.geo import haversine_km, minutes_to_radius_km
+from app.services.isochrone import ReachabilityFilter, reachability_filter
+from app.services.name_filter import clean_shop_name, is_chain
+from app.services.places_nearby import google_nearby
+from app.services.poi_store import facet_key, get_poi_store
+from app.services.spot_summaries import (
+    gemini_summarize_place,
+    summary_get,
+    summary_upsert,
+)
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 3
+HISTORY_SCAN_LIMIT = 100
+DEDUPE_RADIUS_M = 60.0
+
+
+def _eta_text(mode: str, minutes: int, meters: int) -> str:
+    return f"徒歩約{minutes}分・{meters}m" if mode == "walk" else f"車で約{minutes}分・{meters}m"
+
+
+def _enum_str(v) -> str:
+    return v.value if hasattr(v, "value") else str(v)
+
+
+# =========================
+# 検索コンテキスト
+# =========================
+@dataclass
+class SearchContext:
+    query: DetourSearchQuery
+    db: Session
+    mode: str
+    detour_type: str
+    radius_km: float
+    radius_km_from_minutes: float
+    reach: ReachabilityFilter
+    top_k: int = TOP_K
+    deadline: float = 0.0  # loop.time() 基準の締め切り
+    candidates: List[Candidate] = field(default_factory=list)
+    results: List[DetourSuggestion] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def radius_m(self) -> int:
+        return int(self.radius_km * 1000)
+
+    @classmethod
+    def build(cls, query: DetourSearchQuery, db: Session) -> "SearchContext":
+        mode = _enum_str(query.mode)
+        detour_type = _enum_str(query.detour_type)
+
+        # 半径の決定（優先: query.radius_m、なければ minutes→km から算出）
+        radius_km_from_param = int(query.radius_m) / 1000.0 if query.radius_m is not None else None
+        radius_km_from_minutes = minutes_to_radius_km(query.minutes, mode)
+
+        # イベントは minutes ベースを優先（= 広い方を採用）
+        if detour_type == "event":
+            radius_km = max(radius_km_from_minutes, radius_km_from_param or 0)
+        else:
+            radius_km = radius_km_from_param if radius_km_from_param is not None else radius_km_from_minutes
+
+        # 到達圏フィルタ（道路グラフがあればアイソクローン、無ければ半径×1.5）
+        reach = reachability_filter(query.lat, query.lng, mode, query.minutes, radius_km * 1.5)
+        return cls(
+            query=query, db=db, mode=mode, detour_type=detour_type,
+            radius_km=radius_km, radius_km_from_minutes=radius_km_from_minutes, reach=reach,
+            deadline=asyncio.get_running_loop().time() + get_settings().search_deadline_sec,
+        )
+
+
+# =========================
+# 候補ソース
+# =========================
+@dataclass
+class CandidateSource:
+    name: str
+    detour_types: Sequence[str]
+    fetch: Callable[[SearchContext], Awaitable[List[Candidate]]]
+    # 実際に検索した半径（ローカルストアの検索済み範囲として記録する）
+    coverage_km: Callable[[SearchContext], float] = lambda ctx: ctx.radius_km
+
+
+async def _fetch_google(ctx: SearchContext) -> List[Candidate]:
+    return await google_nearby(
+        ctx.query.lat, ctx.query.lng, ctx.radius_m,
+        detour_type=ctx.detour_type,
+        categories=ctx.query.categories,
+    )
+
+
+async def _fetch_yolp_events(ctx: SearchContext) -> List[Candidate]:
+    q = ctx.query
+    return await connpass_events(
+        lat=q.lat,
+        lng=q.lng,
+        minutes=q.minutes,
+        keyword=q.keyword,
+        categories=q.categories,
+        local_only=q.local_only,
+        mode=ctx.mode,
+    )
+
+
+async def _fetch_yolp_places(ctx: SearchContext) -> List[Candidate]:
+    return await yolp_places(
+        ctx.query.lat, ctx.query.lng, ctx.radius_km,
+        detour_type=ctx.detour_type,
+        categories=ctx.query.categories,
+    )
+
+
+async def _fetch_history(ctx: SearchContext) -> List[Candidate]:
+    rows = (
+        ctx.db.execute(
+            select(DetourHistory).order_by(desc(DetourHistory.id)).limit(HISTORY_SCAN_LIMIT)
+        ).scalars().all()
+    )
+    return [
+        Candidate(
+            name=r.name,
+            description=r.note,
+            lat=r.lat,
+            lng=r.lng,
+            source="local",  # DB由来は "local"
+            created_at=(r.chosen_at or datetime.utcnow()).isoformat(),
+        )
+        for r in rows
+    ]
+
+
+_SOURCES: List[CandidateSource] = [
+    CandidateSource("google", ("spot", "food", "souvenir", "event"), _fetch_google),
+    CandidateSource("yolp", ("spot", "food", "souvenir"), _fetch_yolp_places),
+    # connpass_events は minutes 由来の半径で検索している
+    CandidateSource("yolp_events", ("event",), _fetch_yolp_events, lambda ctx: ctx.radius_km_from_minutes),
+]
+HISTORY_SOURCE = CandidateSource("history", (), _fetch_history)
+
+
+def register_source(source: CandidateSource) -> None:
+    _SOURCES.append(source)
+
+
+def sources_for(detour_type: str) -> List[CandidateSource]:
+    return [s for s in _SOURCES if detour_type in s.detour_types]
+
+
+# =========================
+# ステージ
+# =========================
+async def stage_sources(ctx: SearchContext) -> None:
+    q = ctx.query
+    if q.history_only:
+        ctx.candidates = await _timed_source(ctx, HISTORY_SOURCE)
+        return
+
+    # ローカル POI ストアを先に引き、新しくて件数も足りればネットワークを使わない
+    store = get_poi_store()
+    facet = facet_key(ctx.detour_type, q.categories, q.keyword)
+    local = store.query(facet, q.lat, q.lng, ctx.radius_km)
+    if local.fresh and len(local.items) >= get_settings().poi_store_min_results:
+        ctx.candidates = local.items
+        return
+
+    # ネットワークソースは締め切りまでに返ってきた分だけ使う（遅いプロバイダは打ち切り）
+    sources = sources_for(ctx.detour_type)
+    tasks = {asyncio.ensure_future(_timed_source(ctx, s)): s for s in sources}
+    if not tasks:
+        ctx.candidates = local.items
+        return
+    timeout = max(0.0, ctx.deadline - asyncio.get_running_loop().time())
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    complete = not pending
+    for t in pending:
+        t.cancel()
+        logger.warning("source timeout", extra={"source": tasks[t].name})
+    for t in done:
+        src = tasks[t]
+        if t.exception() is not None:
+            complete = False
+            logger.warning("source error", extra={"source": src.name, "ex": repr(t.exception())})
+            continue
+        batch = t.result()
+        store.add(facet, batch)
+        ctx.candidates.extend(batch)
+    # 検索済みにするのは全ソースが返ってきたときだけ（一部欠けた結果で TTL の間ローカル応答しない）。
+    # 半径はソースごとに違うので、全ソースが覆っている一番小さい円を記録する
+    if complete:
+        store.mark_covered(facet, q.lat, q.lng, min(s.coverage_km(ctx) for s in sources))
+    # 手元の（古い/少ない）ローカル候補は後ろに足す。重複は dedupe で新しい方が残る
+    ctx.candidates.extend(local.items)
+
+
+async def _timed_source(ctx: SearchContext, source: CandidateSource) -> List[Candidate]:
+    t0 = time.perf_counter()
+    try:
+        with metrics.span("source", source.name):
+            return as_candidates(await source.fetch(ctx))
+    finally:
+        ctx.timings[f"source:{source.name}"] = (time.perf_counter() - t0) * 1000
+
+
+def stage_normalize(ctx: SearchContext) -> None:
+    """名称の無いものを落とし、距離/所要分を検索地点から計算する（座標は Candidate 作成時に float）。"""
+    q = ctx.query
+    out = []
+    for x in ctx.candidates:
+        if not x.name:
+            continue
+        d = haversine_km(q.lat, q.lng, x.lat, x.lng)
+        x.distance_km = d
+        x.duration_min = math.ceil((d / ctx.radius_km) * q.minutes) if ctx.radius_km > 0 else q.minutes
+        out.append(x)
+    ctx.candidates = out
+
+
+def _dedupe_name(name: str) -> str:
+    return "".join(clean_shop_name(name).split()).lower()
+
+
+def stage_dedupe(ctx: SearchContext) -> None:
+    """プロバイダをまたいだ重複を「正規化名 + 近接」で統合する。"""
+    cell = DEDUPE_RADIUS_M / 111_320.0  # 緯度方向の度数。経度方向は近似で十分
+    grid: Dict[tuple, List[Candidate]] = {}
+    out = []
+    for x in ctx.candidates:
+        key = _dedupe_name(x.name)
+        ci, cj = int(x.lat // cell), int(x.lng // cell)
+        dup = None
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for y in grid.get((key, ci + di, cj + dj), ()):
+                    if haversine_km(x.lat, x.lng, y.lat, y.lng) * 1000 <= DEDUPE_RADIUS_M:
+                        dup = y
+                        break
+                if dup:
+                    break
+            if dup:
+                break
+        if dup is not None:
+            # 先勝ちで、欠けている項目だけ後着から補う（評価・写真は Google 側にしかないことが多い）
+            dup.merge(x)
+            continue
+        grid.setdefault((key, ci, cj), []).append(x)
+        out.append(x)
+    ctx.candidates = out
+
+
+def stage_filter(ctx: SearchContext) -> None:
+    reach = ctx.reach
+    # 到達圏外（川・線路の向こう側など）を除外
+    out = [x for x in ctx.candidates if reach.contains(x.lat, x.lng)]
+    # local_only=True のときはチェーンを除外（＝ローカル店舗優先）。履歴モードは従来通り対象外
+    if ctx.query.local_only and not ctx.query.history_only:
+        out = [x for x in out if not is_chain(x.name)]
+    ctx.candidates = out
+
+
+def stage_rank(ctx: SearchContext) -> None:
+    ctx.candidates.sort(key=lambda x: (x.distance_km, -(x.rating or 0)))
+    del ctx.candidates[ctx.top_k:]
+
+
+async def stage_enrich(ctx: SearchContext) -> None:
+    """top-k に説明文を付ける（キャッシュ → 無ければ Gemini を並行呼び出し）。"""
+    if ctx.query.history_only:
+        return  # 履歴はメモ（note）をそのまま使う
+
+    db = ctx.db
+    misses = []
+    for x in ctx.candidates:
+        src = x.source or "google"
+        sid = x.source_id()
+        row = summary_get(db, src, sid)
+        if row and row.short_text_ja:
+            x.summary = row.short_text_ja
+        else:
+            misses.append((x, src, sid))
+
+    if misses:
+        # address / category が無ければ None でOK
+        generated = await asyncio.gather(*(
+            gemini_summarize_place(
+                name=x.name,
+                address=x.address,
+                category=x.category,
+            )
+            for x, _, _ in misses
+        ))
+        for (x, src, sid), g in zip(misses, generated):
+            if g.get("error"):
+                continue
+            desc_short = (g.get("short") or "").strip()
+            if not desc_short:
+                continue
+            x.summary = desc_short
+            summary_upsert(
+                db,
+                source=src, source_id=sid,
+                name=x.name,
+                lat=x.lat, lng=x.lng,
+                short_text=g.get("short"), long_text=g.get("long"),
+                provider="gemini-1.5-flash", lang="ja", tokens=g.get("tokens"),
+            )
+
+    # 生成・取得ともに無ければ簡易フォールバック
+    for x in ctx.candidates:
+        if not x.summary:
+            x.summary = x.description or f"{x.name or 'このスポット'}は周辺で立ち寄りやすい場所です。"
+
+
+def stage_serialize(ctx: SearchContext) -> None:
+    """rank 済みの top-k だけを DetourSuggestion にする（pydantic の検証はここでだけ走る）。"""
+    now_iso = datetime.utcnow().isoformat()
+    q = ctx.query
+    for x in ctx.candidates:
+        meters = int(x.distance_km * 1000)
+        ctx.results.append(
+            DetourSuggestion(
+                id=str(uuid.uuid4()),
+                name=clean_shop_name(x.name),  # 表示名も正規化
+                description=x.summary if x.summary is not None else x.description,
+                lat=x.lat,
+                lng=x.lng,
+                distance_km=x.distance_km,
+                duration_min=x.duration_min,
+                rating=x.rating,
+                open_now=x.open_now,
+                opening_hours=x.opening_hours,
+                parking=x.parking,
+                source=x.source or "google",
+                url=x.url,
+                photo_url=x.photo_url,
+                created_at=x.created_at or now_iso,
+                eta_text=_eta_text(ctx.mode, x.duration_min, meters),
+                detour_type=q.detour_type,
+            )
+        )
+
+
+Stage = Callable[[SearchContext], Optional[Awaitable[None]]]
+
+STAGES: List[tuple] = [
+    ("sources", stage_sources),
+    ("normalize", stage_normalize),
+    ("dedupe", stage_dedupe),
+    ("filter", stage_filter),
+    ("rank", stage_rank),
+    ("enrich", stage_enrich),
+    ("serialize", stage_serialize),
+]
+
+
+async def run_pipeline(query: DetourSearchQuery, db: Session, stages: Optional[List[tuple]] = None) -> SearchContext:
+    ctx = SearchContext.build(query, db)
+    for name, stage in stages or STAGES:
+        t0 = time.perf_counter()
+        with metrics.span("pipeline", name):
+            ret = stage(ctx)
+            if asyncio.iscoroutine(ret):
+                await ret
+        ctx.timings[name] = (time.perf_counter() - t0) * 1000
+    return ctx
@@ -1,12 +1,15 @@
 # app/services/detour_places.py
 
-import os
 import httpx
 from typing import List, Optional
 from app.schemas.detour import DetourSuggestion, TravelMode, DetourType
 from app.services.geo import haversine_km   # ← 実距離計算に使用
+from app.core.config import settings
+from app.services import rate_limit
+from app.services.candidates import Candidate
+from app.services.payloads import parse_nearby
 
-GOOGLE_PLACES_API_KEY = os.getenv("GOOGLE_PLACES_API_KEY") or os.getenv("GOOGLE_MAPS_API_KEY")  # ← 念のため両対応
+GOOGLE_PLACES_API_KEY = settings.places_api_key  # ← GOOGLE_PLACES_API_KEY / GOOGLE_MAPS_API_KEY 両対応
 BASE_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
 
 def _speed_kmh(mode: TravelMode) -> float:
@@ -39,8 +42,10 @@ async def search_detour_places(
     mode: TravelMode,
     minutes: int,
     detour_type: DetourType,
-    categories: Optional[List[str]] = None
+    categories: Optional[List[str]] = None,
+    top_k: Optional[int] = None,
 ) -> List[DetourSuggestion]:
+    """top_k を渡すと近い順に top_k 件だけ DetourSuggestion にする（None なら API の順で全件）。"""
     radius_km = minutes_to_distance_km(minutes, mode)
     radius_m = int(radius_km * 1000)
 
@@ -64,48 +69,53 @@ async def search_detour_places(
         "keyword": keyword
     }
 
+    await rate_limit.acquire("google", GOOGLE_PLACES_API_KEY or "")
     async with httpx.AsyncClient(timeout=15) as client:
         r = await client.get(BASE_URL, params=params)
         r.raise_for_status()
-        data = r.json()
+        _, places = parse_nearby(r.content)  # 座標の無いものは落ちている
 
-    suggestions: List[DetourSuggestion] = []
-    for place in data.get("results", []):
-        plat = place.get("geometry", {}).get("location", {}).get("lat")
-        plng = place.get("geometry", {}).get("location", {}).get("lng")
-        if plat is None or plng is None:
-            continue
+    cands: List[Candidate] = []
+    for place in places:
+        cands.append(Candidate(
+            name=place.name or "",
+            lat=place.lat,
+            lng=place.lng,
+            source="google",
+            description=place.vicinity,
+            url=f"https://www.google.com/maps/place/?q=place_id:{place.place_id}",
+            address=place.address,
+            rating=place.rating,
+            reviews_count=place.reviews_count,
+            open_now=place.open_now,
+            photo_url=_photo_url(place.photo_ref),  # ← 写真1枚（無ければ None）
+            distance_km=haversine_km(lat, lng, place.lat, place.lng),  # ← 実距離で上書き
+        ))
+    if top_k is not None:
+        cands.sort(key=lambda c: c.distance_km)
+        del cands[top_k:]
 
-        # 実距離で上書き
-        dist_km = haversine_km(lat, lng, plat, plng)
-        eta = _eta_text(mode, dist_km)
-
-        photo_ref = None
-        photos = place.get("photos") or []
-        if photos and isinstance(photos, list):
-            photo_ref = (photos[0] or {}).get("photo_reference")
-
-        suggestions.append(
-            DetourSuggestion(
-                id=None,  # ここは外部IDを使わないなら None（DB保存時にUUID付与）
-                name=place.get("name", ""),
-                description=place.get("vicinity"),
-                lat=plat,
-                lng=plng,
-                distance_km=dist_km,            # ← 実距離
-                duration_min=minutes,           # 検索条件そのまま
-                eta_text=eta,                   # ← 必須フィールドを追加
-                source="google",
-                detour_type=detour_type,        # ← 必須フィールドを追加（呼び出し引数のまま）
-                url=f"https://www.google.com/maps/place/?q=place_id:{place.get('place_id')}",
-                address=place.get("formatted_address"),
-                rating=place.get("rating"),
-                reviews_count=place.get("user_ratings_total"),
-                open_now=(place.get("opening_hours") or {}).get("open_now") if place.get("opening_hours") else None,
-                opening_hours=None,             # 必要なら整形して入れる
-                parking=None,
-                photo_url=_photo_url(photo_ref) # ← 写真1枚（無ければ None）
-            )
+    # pydantic モデルは返す分だけ作る
+    return [
+        DetourSuggestion(
+            id=None,  # ここは外部IDを使わないなら None（DB保存時にUUID付与）
+            name=c.name,
+            description=c.description,
+            lat=c.lat,
+            lng=c.lng,
+            distance_km=c.distance_km,      # ← 実距離
+            duration_min=minutes,           # 検索条件そのまま
+            eta_text=_eta_text(mode, c.distance_km),
+            source=c.source,
+            detour_type=detour_type,        # ← 呼び出し引数のまま
+            url=c.url,
+            address=c.address,
+            rating=c.rating,
+            reviews_count=c.reviews_count,
+            open_now=c.open_now,
+            opening_hours=None,             # 必要なら整形して入れる
+            parking=None,
+            photo_url=c.photo_url,
         )
-
-    return suggestions
+        for c in cands
+    ]
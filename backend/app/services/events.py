@@ -1,35 +1,23 @@
 # backend/app/services/events.py
-from dotenv import load_dotenv
-load_dotenv()
-
-print(f"[WIRE] events.py loaded: {__file__}")  # ★どのファイルが実際に使われているか表示
-
-import os
+import asyncio
 import httpx
 import datetime as dt
+import logging
 import re
-import unicodedata  # ★ 追加
-from typing import List, Dict, Optional, Union
+from typing import List, Optional, Union
+from app.core.config import settings
+from . import rate_limit, resilience
+from .candidates import Candidate
 from .geo import haversine_km, minutes_to_radius_km
+from .name_filter import classify, is_chain, is_corporate, normalize_name
+from .payloads import YolpFeature, parse_yolp
+
+logger = logging.getLogger(__name__)
 
 # ==== 設定 ====
-YOLP_APP_ID = os.getenv("YOLP_APP_ID")
-
-# チェーン除外（必要に応じて拡張）
-_CHAIN = r"(すき家|マクドナルド|吉野家|ガスト|コメダ|スタバ|ドトール|セブンイレブン|ローソン|ファミリーマート|サイゼリヤ|丸亀製麺|びっくりドンキー|ココイチ|はま寿司|スシロー|ユニクロ)"
-def _is_chain(name: str) -> bool:
-    return bool(re.search(_CHAIN, name or ""))
-
-# 既存の上の方（_CHAIN のすぐ下あたり）に追加
-_CORP = re.compile(
-    r"(株式会社|有限会社|合同会社|合名会社|合資会社"
-    r"|本社|支店|営業所|センター|事務所|工場|ディーラー"
-    r"|（株）|\(株\)|㈱|㍿"      # ←「（株）」「(株)」「㈱」「㍿」をカバー
-    r"|（有）|\(有\)|㈲)"        # ← 有限会社の略記もついでに
-)
+YOLP_APP_ID = settings.yolp_app_id
+YOLP_LOCAL_SEARCH_URL = f"{settings.yolp_base_url.rstrip('/')}/search/local/V1/localSearch"
 
-# 小売ジャンルを弾く（衣料/アパレル/SCなど）
-_GENRE_DROP = re.compile(r"(衣料|服|アパレル|靴|鞄|百貨店|スーパー|ショッピングセンター|ショッピングモール|量販店|家電|ホームセンター|ドラッグストア)")
 # “フェス” は “フェスタ”に誤反応しないように (?!タ) を入れる
 
 _EVENT_PAT = re.compile(
@@ -94,14 +82,14 @@ async def connpass_events(  # ← 既存の関数名を維持（中身はYOLP）
     local_only: bool = False,
     mode: Union[str, None] = None,   # ★追加
 
-) -> List[Dict]:
+) -> List[Candidate]:
     """
     近傍の“イベント系スポット/催事名のPOI”をYOLPで検索して返す。
     ※ 開催日時は取得できない前提（施設・催事名ベース）
-    戻り値: {id,name,description,lat,lng,url,address,categories,source="yolp"} の配列
+    戻り値: Candidate（id,name,description,lat,lng,url,address,categories,source="yolp"）の配列
     """
     if not YOLP_APP_ID:
-        print("[YOLP] APP_ID missing -> return []")  # ★ログ
+        logger.warning("YOLP_APP_ID missing -> return []")
 
     # ★徒歩/車で半径を切替（modeが未指定ならwalk扱い）
     mode_str = (mode.value if hasattr(mode, "value") else mode) or "walk"
@@ -111,152 +99,190 @@ async def connpass_events(  # ← 既存の関数名を維持（中身はYOLP）
         radius_km = minutes_to_radius_km(minutes, "walk")
 
     queries = _seed_keywords(keyword, categories)
-    print(f"[YOLP] queries={queries} radius_km={radius_km:.2f} lat={lat} lng={lng} mode={mode_str}")  # ★ログ
+    logger.debug("yolp search", extra={"queries": queries, "radius_km": round(radius_km, 2), "lat": lat, "lng": lng, "mode": mode_str})
+
+    base = YOLP_LOCAL_SEARCH_URL
+
+    async def _fetch(client: httpx.AsyncClient, q: str) -> List[YolpFeature]:
+        params = {
+            "appid": YOLP_APP_ID,
+            "lat": lat,
+            "lon": lng,
+            "dist": max(0.5, min(radius_km, 20.0)),  # km, 0.5〜20に丸め
+            "query": q,
+            "sort": "dist",
+            "results": 50,
+            "output": "json",          # ★ これが超重要（デフォはXML）
+        }
+
+        async def _get():
+            r = await client.get(base, params=params)
+            if r.status_code == 429:
+                rate_limit.backoff("yolp", YOLP_APP_ID or "")
+            r.raise_for_status()
+            return r
+
+        try:
+            await rate_limit.acquire("yolp", YOLP_APP_ID or "")
+            r = await resilience.call("yolp", _get)
+            # results=50 の Feature から使う項目だけ写し取る（Station や Detail の dict は持ち越さない）
+            return parse_yolp(r.content)
+        except resilience.CircuitOpenError:
+            return []  # 障害中は待たずに諦める
+        except Exception as ex:
+            logger.warning("yolp request error", extra={"q": q, "ex": repr(ex)})
+            return []
 
-    base = "https://map.yahooapis.jp/search/local/V1/localSearch"
-
-    items: List[Dict] = []
     async with httpx.AsyncClient(timeout=10) as client:
-        for q in queries:
-            params = {
-                "appid": YOLP_APP_ID,
-                "lat": lat,
-                "lon": lng,
-                "dist": max(0.5, min(radius_km, 20.0)),  # km, 0.5〜20に丸め
-                "query": q,
-                "sort": "dist",
-                "results": 50,
-                "output": "json",          # ★ これが超重要（デフォはXML）
-            }
-            try:
-                r = await client.get(base, params=params)
-                r.raise_for_status()
-                data = r.json()
-            except Exception as ex:
-                print(f"[YOLP] request error q={q} ex={ex!r}")
+        # シードは並行に投げる（直列だと 8 シード × タイムアウトで数十秒かかりうる）
+        fetched = await asyncio.gather(*(_fetch(client, q) for q in queries))
+
+    items: List[Candidate] = []
+    q, feats = None, []
+    for q, feats in zip(queries, fetched):
+        logger.debug("yolp query", extra={"q": q, "hits": len(feats)})
+
+        for f in feats:
+            # 置き換え：正規化してからフィルタ判定
+            name = normalize_name(f.name)  # ㈱/（ ）等を半角の(株)等に正規化
+            if not name:
                 continue
 
+            # 1) 会社・業務系ワード／チェーンを除外
+            cats = classify(f.name).categories
+            if cats & {"corp", "business", "chain"}:
+                continue
+
+            # 2) 距離（座標は parse_yolp で取り出し済み）
+            d_km = haversine_km(lat, lng, f.lat, f.lng)
+            if d_km > radius_km + 0.2:
+                continue
+
+            # 3) ジャンル名や説明文（CatchCopy/Lead）もイベント語判定に使う
+            # イベント語を “単語っぽく” 判定（フェスタは除外）
+            haystack = " ".join([name, " ".join(f.genres), f.catch, f.lead])
+            if not _EVENT_PAT.search(haystack):
+                continue
 
-            feats = data.get("Feature") or []
-            print(f"[YOLP] q={q} hits={len(feats)}")  # ログ
-
-            for f in feats:
-                # 置き換え：正規化してからフィルタ判定
-                name_raw = (f.get("Name") or "").strip()
-                name = unicodedata.normalize("NFKC", name_raw)  # ㈱/（ ）等を半角の(株)等に正規化
-                if not name:
-                    continue
-
-                # 1) 会社・業務系ワードを除外
-                if _CORP.search(name) or _is_chain(name):
-                    # print(f"[YOLP] drop(corp): {name}")
-                    continue
-                if local_only and _is_chain(name):
-                    # print(f"[YOLP] drop(chain): {name}")
-                    continue
-
-                # 2) 座標抽出
-                coords = (f.get("Geometry") or {}).get("Coordinates") or ""
-                if "," not in coords:
-                    continue
-                lng2_s, lat2_s = coords.split(",", 1)
-                try:
-                    lat2 = float(lat2_s)
-                    lng2 = float(lng2_s)
-                except ValueError:
-                    # 念のため
-                    parts = coords.split(",")
-                    if len(parts) != 2:
-                        continue
-                    lng2 = float(parts[0]); lat2 = float(parts[1])
-
-                d_km = haversine_km(lat, lng, lat2, lng2)
-                if d_km > radius_km + 0.2:
-                    continue
-
-                # 3) ジャンル名や説明文を抽出してイベント語判定に使う
-                prop = f.get("Property") or {}
-                genres_raw = prop.get("Genre") or []
-                genre_names: List[str] = []
-                if isinstance(genres_raw, list):
-                    for g in genres_raw:
-                        if isinstance(g, dict):
-                            n = (g.get("Name") or "").strip()
-                            if n: genre_names.append(n)
-                        else:
-                            n = str(g).strip()
-                            if n: genre_names.append(n)
-                elif isinstance(genres_raw, dict):
-                    n = (genres_raw.get("Name") or "").strip()
-                    if n: genre_names.append(n)
-
-                # CatchCopy/Lead などの短文もイベント語検出に使う
-                catch = (prop.get("CatchCopy") or "")
-                lead  = (prop.get("Lead") or "")
-
-                # イベント語を “単語っぽく” 判定（フェスタは除外）
-                haystack = " ".join([name, " ".join(genre_names), catch, lead])
-                if not _EVENT_PAT.search(haystack):
-                    continue
-
-
-                # 5) 合格：アイテム化
-                items.append({
-                    "id": f.get("Id") or f"{round(lat2,6)},{round(lng2,6)}:{name}",
-                    "name": name,
-                    "description": catch or "",
-                    "lat": lat2,
-                    "lng": lng2,
-                    "address": prop.get("Address"),
-                    "url": (prop.get("Detail") or {}).get("PcUrl"),
-                    "categories": [q] + (genre_names[:3] if genre_names else []),  # ← ジャンル名も混ぜる
-                    "source": "yolp",
-                })
+
+            # 5) 合格：アイテム化
+            items.append(Candidate(
+                id=f.id or f"{round(f.lat,6)},{round(f.lng,6)}:{name}",
+                name=name,
+                description=f.catch,
+                lat=f.lat,
+                lng=f.lng,
+                address=f.address,
+                url=f.url,
+                categories=[q] + list(f.genres[:3]),  # ← ジャンル名も混ぜる
+                source="yolp",
+            ))
 
     # 重複除去の直前あたりに追加
     if not items:
         # 救済：会社ワードだけ除外して、イベント語チェックは緩める
         for f in feats:
-            name = (f.get("Name") or "").strip()
-            if not name or _CORP.search(name) or (local_only and _is_chain(name)):
-                continue
-            coords = (f.get("Geometry") or {}).get("Coordinates") or ""
-            if "," not in coords:
+            name = f.name
+            if is_corporate(name) or (local_only and is_chain(name)):
                 continue
-            lng2_s, lat2_s = coords.split(",", 1)
-            try:
-                lat2 = float(lat2_s); lng2 = float(lng2_s)
-            except ValueError:
-                parts = coords.split(",")
-                if len(parts) != 2:
-                    continue
-                lng2 = float(parts[0]); lat2 = float(parts[1])
-
-            d_km = haversine_km(lat, lng, lat2, lng2)
+
+            d_km = haversine_km(lat, lng, f.lat, f.lng)
             if d_km > radius_km + 0.2:
                 continue
 
-            prop = f.get("Property") or {}
-            items.append({
-                "id": f.get("Id") or f"{round(lat2,6)},{round(lng2,6)}:{name}",
-                "name": name,
-                "description": (prop.get("CatchCopy") or ""),
-                "lat": lat2,
-                "lng": lng2,
-                "address": prop.get("Address"),
-                "url": (prop.get("Detail") or {}).get("PcUrl"),
-                "categories": [q],
-                "source": "yolp",
-            })
+            items.append(Candidate(
+                id=f.id or f"{round(f.lat,6)},{round(f.lng,6)}:{name}",
+                name=name,
+                description=f.catch,
+                lat=f.lat,
+                lng=f.lng,
+                address=f.address,
+                url=f.url,
+                categories=[q],
+                source="yolp",
+            ))
 
             
     # 重複除去（座標+名称）
     seen = set()
-    uniq: List[Dict] = []
-    for it in sorted(items, key=lambda x: (x["name"], x["lat"], x["lng"])):
-        k = (round(it["lat"], 6), round(it["lng"], 6), it["name"])
+    uniq: List[Candidate] = []
+    for it in sorted(items, key=lambda x: (x.name, x.lat, x.lng)):
+        k = (round(it.lat, 6), round(it.lng, 6), it.name)
         if k in seen:
             continue
         seen.add(k)
         uniq.append(it)
     return uniq[:50]
+
+
+# ==== 寄り道（food/spot/souvenir）向け: YOLP ローカルサーチ ====
+# detour_type ごとの検索語（categories 指定があればそちらを優先）
+_YOLP_TYPE_QUERIES = {
+    "food": ["レストラン", "カフェ"],
+    "souvenir": ["土産"],
+    "spot": ["観光", "名所"],
+}
+
+
+async def yolp_places(
+    lat: float,
+    lng: float,
+    radius_km: float,
+    detour_type: str,
+    categories: Optional[List[str]] = None,
+) -> List[Candidate]:
+    """Google Nearby と同じ Candidate を YOLP ローカルサーチから返す（検索語ごとに並行）。"""
+    if not YOLP_APP_ID:
+        return []
+    queries = [c for c in (categories or []) if c] or _YOLP_TYPE_QUERIES.get(detour_type, [])
+    if not queries:
+        return []
+
+    async def _one(client: httpx.AsyncClient, q: str) -> List[YolpFeature]:
+        params = {
+            "appid": YOLP_APP_ID,
+            "lat": lat,
+            "lon": lng,
+            "dist": max(0.5, min(radius_km, 20.0)),
+            "query": q,
+            "sort": "dist",
+            "results": 20,
+            "output": "json",
+        }
+        async def _get():
+            r = await client.get(YOLP_LOCAL_SEARCH_URL, params=params)
+            if r.status_code == 429:
+                rate_limit.backoff("yolp", YOLP_APP_ID)
+            r.raise_for_status()
+            return r
+
+        try:
+            await rate_limit.acquire("yolp", YOLP_APP_ID)
+            r = await resilience.call("yolp", _get)
+            return parse_yolp(r.content)
+        except resilience.CircuitOpenError:
+            return []
+        except Exception as ex:
+            logger.warning("yolp places error", extra={"q": q, "ex": repr(ex)})
+            return []
+
+    async with httpx.AsyncClient(timeout=10) as client:
+        batches = await asyncio.gather(*(_one(client, q) for q in queries))
+
+    items: List[Candidate] = []
+    for q, feats in zip(queries, batches):
+        for f in feats:
+            if is_corporate(f.name):
+                continue
+            items.append(Candidate(
+                id=f.id or f"{round(f.lat,6)},{round(f.lng,6)}:{f.name}",
+                name=f.name,
+                description=f.catch,
+                lat=f.lat,
+                lng=f.lng,
+                address=f.address,
+                url=f.url,
+                categories=[q],
+                source="yolp",
+            ))
+    return items
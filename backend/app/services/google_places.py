@@ -1,50 +1,111 @@
 # app/services/places.py
-from dotenv import load_dotenv
-load_dotenv() # .env ファイルから環境変数を読み込む
-import os
+import time
+import asyncio
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
 import httpx
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from app.core import metrics
+from app.core.config import get_settings, settings
+from app.services import rate_limit
 
-USE = os.getenv("USE_GOOGLE_PLACES", "false").lower() == "true"
-KEY = os.getenv("GOOGLE_MAPS_API_KEY") or ""
-REGION = os.getenv("GOOGLE_PLACES_REGION", "jp")
-LANG = os.getenv("GOOGLE_PLACES_LANGUAGE", "ja")
+USE = settings.use_google_places
+KEY = settings.google_maps_api_key
+REGION = settings.google_places_region
+LANG = settings.google_places_language
+GOOGLE_BASE = settings.google_maps_base_url.rstrip("/")
 
 
 def _need_key():
     if not KEY:
         raise RuntimeError("GOOGLE_MAPS_API_KEY is not set")
 
-async def predictions(input: str, limit: int = 3):
-    if not USE:
-        return MOCK_PREDS[:limit]
+# ---- Autocomplete キャッシュ -------------------------------------------
+# キー: NFKC + 前後空白除去 + 連続空白圧縮 + 小文字化した入力
+# 値:   (期限, Google が返した予測の全件（最大5件）)。TTL は places_predictions_ttl_sec
+PREDICTIONS_CACHE_SIZE = 4096
+PREFIX_MIN_LEN = 2
 
-    _need_key()
-    url = "https://maps.googleapis.com/maps/api/place/autocomplete/json"
+_pred_cache: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+_pred_inflight: Dict[str, "asyncio.Task[List[dict]]"] = {}
+
+
+def _normalize_input(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def _pred_get(key: str) -> Optional[List[dict]]:
+    hit = _pred_cache.get(key)
+    if hit is None:
+        return None
+    expires, items = hit
+    if expires < time.monotonic():
+        _pred_cache.pop(key, None)
+        return None
+    _pred_cache.move_to_end(key)
+    return items
+
+
+def _pred_put(key: str, items: List[dict]) -> None:
+    _pred_cache[key] = (time.monotonic() + get_settings().places_predictions_ttl_sec, items)
+    _pred_cache.move_to_end(key)
+    while len(_pred_cache) > PREDICTIONS_CACHE_SIZE:
+        _pred_cache.popitem(last=False)
+
+
+def _from_prefix(key: str, need: int) -> Optional[List[dict]]:
+    """
+    短い接頭辞のキャッシュから絞り込んで返せるなら返す（絞り込み後に need 件以上残るときだけ）。
+    接頭辞の結果が少なくても「長い入力に他の候補は無い」とは言えない（例: 「とう」の 東京… は
+    「とうきょう」の部分一致で全部落ちる）ので、足りなければ Google に聞く。
+    """
+    need = max(need, 1)
+    tokens = key.split()
+    for i in range(len(key) - 1, PREFIX_MIN_LEN - 1, -1):
+        items = _pred_get(key[:i])
+        if items is None:
+            continue
+        hits = [
+            p for p in items
+            if all(t in _normalize_input(p.get("description") or "").lower() for t in tokens)
+        ]
+        if len(hits) >= need:
+            return hits
+        return None  # 一番長い接頭辞で判断できなければ、それより短いものも使えない
+    return None
+
+
+async def _fetch_predictions(text: str, session_token: Optional[str]) -> List[dict]:
+    url = f"{GOOGLE_BASE}/maps/api/place/autocomplete/json"
     params = {
-        "input": input,
+        "input": text,
         "key": KEY,
         "components": f"country:{REGION}",
         "language": LANG,
         # "types": "geocode",  # 施設に限定したい場合は有効化
     }
+    if session_token:
+        params["sessiontoken"] = session_token  # details と同じセッションで課金される
 
+    await rate_limit.acquire("google", KEY)
     async with httpx.AsyncClient(timeout=10) as cli:
-        r = await cli.get(url, params=params)
+        with metrics.span("outbound", "google_autocomplete"):
+            r = await cli.get(url, params=params)
         r.raise_for_status()
-        data = r.json()
+        data = orjson.loads(r.content)
         status = data.get("status")
 
         if status == "OK":
-            out = []
-            # 上限は念のため 3 に丸めておく
-            topn = max(0, min(limit, 3))
-            for p in data.get("predictions", [])[:topn]:
-                out.append({
+            return [
+                {
                     "description": p.get("description"),
                     "place_id": p.get("place_id"),
                     "structured_formatting": p.get("structured_formatting", {}),
-                })
-            return out
+                }
+                for p in data.get("predictions", [])
+            ]
 
         if status == "ZERO_RESULTS":
             return []
@@ -52,26 +113,155 @@ async def predictions(input: str, limit: int = 3):
         # それ以外はエラーメッセージを表に出す
         raise RuntimeError(f"Places Autocomplete error: {data.get('error_message', status)}")
 
-async def details(place_id: str):
+
+async def predictions(input: str, limit: int = 3, session_token: Optional[str] = None):
+    if not USE:
+        return MOCK_PREDS[:limit]
+
+    _need_key()
+    # 上限は念のため 3 に丸めておく
+    topn = max(0, min(limit, 3))
+    text = _normalize_input(input)
+    key = text.lower()
+
+    items = _pred_get(key)
+    if items is None:
+        items = _from_prefix(key, topn)
+    if items is not None:
+        return items[:topn]
+
+    # 同じ入力の同時リクエストは1本にまとめる（連打・複数タブ対策）
+    task = _pred_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_predictions(text, session_token))
+        _pred_inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: _pred_inflight.pop(k, None))
+    items = await asyncio.shield(task)
+    _pred_put(key, items)
+    return items[:topn]
+
+# ---- Place Details キャッシュ（メモリ → destinations テーブル → Google）------
+# fields（フィールドマスク）ごとに課金単価が変わるので、キャッシュ済みのフィールドで
+# 足りるときだけローカルで返す。無効な place_id は短時間だけ覚えて再問い合わせしない。
+DETAILS_FIELDS = ("place_id", "name", "formatted_address", "geometry", "types")
+REGISTER_FIELDS = DETAILS_FIELDS  # destinations に保存する分（types が NULL の旧行は types 抜き）
+DETAILS_CACHE_SIZE = 4096
+# ネガティブキャッシュは place_id 単位なので NOT_FOUND だけ覚える。INVALID_REQUEST は
+# 呼び出し側の fields マスク不正でも返るため、覚えると正しい place_id まで 404 になる
+_NEGATIVE_STATUSES = {"NOT_FOUND"}
+_ERROR_STATUSES = {"NOT_FOUND", "INVALID_REQUEST"}
+
+_details_cache: "OrderedDict[str, Tuple[float, frozenset, dict]]" = OrderedDict()
+_details_missing: Dict[str, float] = {}
+
+
+class PlaceNotFoundError(RuntimeError):
+    """place_id が無効 / 存在しない（ネガティブキャッシュ対象）。"""
+
+
+def _details_get(place_id: str, fields: frozenset) -> Optional[dict]:
+    hit = _details_cache.get(place_id)
+    if hit is None:
+        return None
+    expires, have, result = hit
+    if expires < time.monotonic():
+        _details_cache.pop(place_id, None)
+        return None
+    if not fields <= have:
+        return None
+    _details_cache.move_to_end(place_id)
+    return result
+
+
+def _details_put(place_id: str, fields: frozenset, result: dict) -> None:
+    hit = _details_cache.get(place_id)
+    if hit is not None and hit[0] >= time.monotonic():
+        # 別マスクで取った分とマージして、広い方のフィールドを持っておく
+        fields = fields | hit[1]
+        result = {**hit[2], **result}
+    _details_cache[place_id] = (time.monotonic() + get_settings().places_details_ttl_sec, fields, result)
+    _details_cache.move_to_end(place_id)
+    while len(_details_cache) > DETAILS_CACHE_SIZE:
+        _details_cache.popitem(last=False)
+
+
+def _is_missing(place_id: str) -> bool:
+    expires = _details_missing.get(place_id)
+    if expires is None:
+        return False
+    if expires < time.monotonic():
+        _details_missing.pop(place_id, None)
+        return False
+    return True
+
+
+def _details_from_db(db, place_id: str) -> Optional[Tuple[frozenset, dict]]:
+    """destinations の行 → (持っているフィールド, details と同じ形の dict)。"""
+    from app.db import models  # services → db の循環 import を避ける
+
+    row = db.query(models.Destination).filter_by(place_id=place_id).first()
+    if row is None:
+        return None
+    result = {
+        "place_id": row.place_id,
+        "name": row.name,
+        "formatted_address": row.address,
+        "geometry": {"location": {"lat": row.lat, "lng": row.lng}},
+    }
+    if row.types is not None:
+        result["types"] = [t for t in row.types.split(",") if t]
+    return frozenset(result), result
+
+
+async def details(place_id: str, session_token: Optional[str] = None,
+                  fields: Optional[Sequence[str]] = None, db=None):
+    """
+    fields: 取得するフィールド（既定は DETAILS_FIELDS）。
+    db:     渡されたら destinations テーブルも参照する（行にあるフィールドで足りる場合のみ）。
+    """
     if not USE:
         return MOCK_DETAIL
 
+    want = frozenset(fields or DETAILS_FIELDS)
+    cached = _details_get(place_id, want)
+    if cached is not None:
+        return cached
+    if _is_missing(place_id):
+        raise PlaceNotFoundError(f"Places Details error: NOT_FOUND (cached) {place_id}")
+
+    if db is not None and want <= frozenset(REGISTER_FIELDS):
+        hit = await run_in_threadpool(_details_from_db, db, place_id)
+        if hit is not None and want <= hit[0]:
+            _details_put(place_id, hit[0], hit[1])
+            return hit[1]
+
     _need_key()
-    url = "https://maps.googleapis.com/maps/api/place/details/json"
+    url = f"{GOOGLE_BASE}/maps/api/place/details/json"
     params = {
         "place_id": place_id,
         "key": KEY,
         "language": LANG,
-        "fields": "place_id,name,formatted_address,geometry,types",
+        "fields": ",".join(sorted(want)),
     }
+    if session_token:
+        params["sessiontoken"] = session_token  # Autocomplete のセッションを閉じる
 
+    await rate_limit.acquire("google", KEY)
     async with httpx.AsyncClient(timeout=10) as cli:
-        r = await cli.get(url, params=params)
+        with metrics.span("outbound", "google_details"):
+            r = await cli.get(url, params=params)
         r.raise_for_status()
-        data = r.json()
+        data = orjson.loads(r.content)
         status = data.get("status")
 
         if status == "OK":
-            return data.get("result")
+            result = data.get("result") or {}
+            _details_put(place_id, want, result)
+            return result
+
+        if status in _ERROR_STATUSES:
+            if status in _NEGATIVE_STATUSES:
+                _details_missing[place_id] = time.monotonic() + get_settings().places_details_negative_ttl_sec
+            raise PlaceNotFoundError(f"Places Details error: {data.get('error_message', status)}")
 
         raise RuntimeError(f"Places Details error: {data.get('error_message', status)}")
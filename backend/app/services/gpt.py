@@ -1,17 +1,29 @@
 # app/services/gpt.py
-import os
+import logging
 from typing import Optional, Dict, Any
-from openai import OpenAI
 from anyio import to_thread  # 同期APIを非ブロッキングで呼ぶため
+from app.core import metrics
+from app.core.config import settings
+from app.services import rate_limit
+
+logger = logging.getLogger(__name__)
 
 # ---- 設定 ----
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY が設定されていません。.env を確認してください。")
+OPENAI_API_KEY = settings.openai_api_key
+
+MODEL_TEXT = settings.openai_text_model  # 必要なら .env（OPENAI_TEXT_MODEL）で上書き可
 
-MODEL_TEXT = os.getenv("OPENAI_TEXT_MODEL", "gpt-4o-mini")  # 必要なら .env で上書き可
+# openai SDK は import が重いので、最初に使うときに読み込む（キー未設定でも起動はできる）
+_client = None
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+def _get_client():
+    global _client
+    if _client is None:
+        if not OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY が設定されていません。.env を確認してください。")
+        from openai import OpenAI
+        _client = OpenAI(api_key=OPENAI_API_KEY, base_url=settings.openai_base_url)
+    return _client
 
 def _compose_prompt(
     name: str,
@@ -54,9 +66,10 @@ async def generate_guide_text(
 ) -> str:
     prompt = _compose_prompt(name=name, address=address, lat=lat, lng=lng, style=style, user=user)
 
-    # デバッグ: 実際のプロンプトが使われているかを確認（必要なら削除OK）
-    print("GPT: generate_guide_text CALLED")
-    print("GPT PROMPT >>", prompt[:300].replace("\n", " "))
+    # デバッグ: 実際のプロンプトが使われているかを確認（LOG_LEVEL=DEBUG のときだけ）
+    logger.debug("guide prompt", extra={"prompt": prompt[:300].replace("\n", " ")})
+
+    client = _get_client()
 
     def _call_openai():
         return client.chat.completions.create(
@@ -83,8 +96,10 @@ async def generate_guide_text(
         )
 
     # 同期APIをスレッドで実行してイベントループを塞がない
-    resp = await to_thread.run_sync(_call_openai)
+    await rate_limit.acquire("openai", OPENAI_API_KEY)
+    with metrics.span("outbound", "openai"):
+        resp = await to_thread.run_sync(_call_openai)
 
     text = (resp.choices[0].message.content or "").strip()
-    print("GPT OK len=", len(text))
+    logger.info("guide text generated", extra={"chars": len(text)})
     return text
\ No newline at end of file
@@ -0,0 +1,203 @@
+# app/services/history_buffer.py
+"""
+寄り道履歴（detour_history）の write-behind バッファ。
+
+choose_detour / detour-guide は1件ごとに INSERT + commit していたが、
+履歴はその場で読み返さないので、メモリにためてまとめて書く。
+
+- HISTORY_FLUSH_INTERVAL_MS ごと、または HISTORY_FLUSH_MAX_ROWS 件たまったら
+  1トランザクション・1回の executemany で INSERT する（月次集計 detour_history_monthly もまとめて加算）
+- 書き込みは専用スレッドで行うので、リクエスト側は DB を待たない
+- シャットダウン時（main の shutdown フック）に残りを書き切る
+- 接続エラー（DB 停止など）は次回に再試行。HISTORY_BUFFER_MAX_ROWS を超えたら古いものから捨ててログを出す
+- それ以外でまとめての INSERT が失敗したら1行ずつやり直し、それでも失敗する行（長すぎる note など）
+  だけ捨ててログを出す（1行のせいで後続の履歴がずっと書けなくなるのを防ぐ）
+- 耐久性: HISTORY_WRITE_MODE=sync なら従来どおりリクエスト内で commit してから返す
+  （buffer ではプロセスが落ちると最大 1 間隔分の履歴を失う）
+
+    history_buffer.add(history_buffer.event(user_id, "food", name, lat, lng, note))
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from app.core.config import get_settings
+from app.db import crud
+from app.db.database import SessionLocal
+from app.models.detour_history import DetourHistory
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Condition()
+_pending: List[dict] = []
+_thread: Optional[threading.Thread] = None
+_stopping = False
+_stats = {"queued": 0, "written": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+
+def event(user_id: Optional[int], detour_type: str, name: str, lat: float, lng: float,
+          note: Optional[str] = None, chosen_at: Optional[dt.datetime] = None) -> dict:
+    """detour_history の1行分（chosen_at は受け付けた時刻。書き込み時刻ではない）。"""
+    return {
+        "user_id": user_id,
+        "detour_type": detour_type,
+        "name": name,
+        "lat": lat,
+        "lng": lng,
+        "note": note,
+        "chosen_at": chosen_at or dt.datetime.utcnow(),
+    }
+
+
+def buffered() -> bool:
+    return get_settings().history_write_mode != "sync"
+
+
+def write(db, rows: List[dict]) -> None:
+    """rows を1回の executemany で INSERT し、月次集計も加算する（commit は呼び出し側）。"""
+    if not rows:
+        return
+    db.execute(insert(DetourHistory), rows)
+    bumps = Counter(
+        (r["user_id"], crud.month_key(r["chosen_at"])) for r in rows if r["user_id"] is not None
+    )
+    for (user_id, month), n in bumps.items():
+        crud.bump_detour_monthly(db, user_id, month, detours=n)
+
+
+def add(rows: Iterable[dict]) -> None:
+    """履歴をバッファに積む。sync モードでは呼ばずに write() を使う。"""
+    rows = list(rows)
+    if not rows:
+        return
+    _ensure_thread()
+    cfg = get_settings()
+    with _lock:
+        _pending.extend(rows)
+        _stats["queued"] += len(rows)
+        overflow = len(_pending) - cfg.history_buffer_max_rows
+        if overflow > 0:
+            del _pending[:overflow]
+            _stats["dropped"] += overflow
+            logger.error("history buffer full, dropped rows", extra={"dropped": overflow})
+        if len(_pending) >= cfg.history_flush_max_rows:
+            _lock.notify()
+
+
+def _retryable(ex: Exception) -> bool:
+    """DB に届かなかった（行の中身のせいではない）エラーか。"""
+    if isinstance(ex, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(ex, DBAPIError) and ex.connection_invalidated
+
+
+def _write_one_by_one(db, batch: List[dict]) -> Tuple[int, List[dict]]:
+    """1行ずつ書く。(書けた件数, 接続エラーで残った行)。失敗する行は捨てる。"""
+    written = 0
+    for i, row in enumerate(batch):
+        try:
+            write(db, [row])
+            db.commit()
+        except Exception as ex:
+            db.rollback()
+            if _retryable(ex):
+                return written, batch[i:]
+            with _lock:
+                _stats["dropped"] += 1
+            logger.error("history row dropped", extra={
+                "user_id": row.get("user_id"), "detour_type": row.get("detour_type"), "ex": repr(ex),
+            })
+            continue
+        written += 1
+    return written, []
+
+
+def flush() -> int:
+    """たまっている分を今すぐ書く。書いた件数を返す（接続エラーなら戻して 0）。"""
+    with _lock:
+        batch = _pending[:]
+        _pending.clear()
+    if not batch:
+        return 0
+    db = SessionLocal()
+    rest: List[dict] = []
+    try:
+        write(db, batch)
+        db.commit()
+        written = len(batch)
+    except Exception as ex:
+        db.rollback()
+        with _lock:
+            _stats["errors"] += 1
+        logger.warning("history flush failed", extra={"rows": len(batch), "ex": repr(ex)})
+        if _retryable(ex):
+            written, rest = 0, batch
+        else:
+            written, rest = _write_one_by_one(db, batch)
+    finally:
+        db.close()
+    with _lock:
+        if rest:
+            _pending[:0] = rest  # 順序を保って先頭に戻す
+        _stats["written"] += written
+        if written:
+            _stats["flushes"] += 1
+    return written
+
+
+def _run() -> None:
+    while True:
+        with _lock:
+            interval = get_settings().history_flush_interval_ms / 1000
+            deadline = time.monotonic() + interval
+            # 間隔が来るか、件数がたまって notify されるまで待つ
+            while not _stopping and len(_pending) < get_settings().history_flush_max_rows:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                _lock.wait(left)
+            if _stopping:
+                return
+        if flush() == 0 and _pending:
+            time.sleep(interval)  # DB が落ちているときに空回りしない
+
+
+def _ensure_thread() -> None:
+    global _thread, _stopping
+    if _thread is not None and _thread.is_alive():
+        return
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _stopping = False
+        _thread = threading.Thread(target=_run, name="history-buffer", daemon=True)
+        _thread.start()
+
+
+def shutdown() -> None:
+    """書き込みスレッドを止めて残りを書き切る（main の shutdown フックから呼ぶ）。"""
+    global _stopping, _thread
+    with _lock:
+        _stopping = True
+        _lock.notify_all()
+    if _thread is not None:
+        _thread.join(timeout=5)
+        _thread = None
+    n = flush()
+    if n:
+        logger.info("history flushed on shutdown", extra={"rows": n})
+    if _pending:
+        logger.error("history rows lost on shutdown", extra={"rows": len(_pending)})
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "pending": len(_pending), "mode": get_settings().history_write_mode}
@@ -0,0 +1,225 @@
+# app/services/isochrone.py
+"""
+到達圏（アイソクローン）による候補フィルタ。
+
+- ローカル道路グラフ（ISOCHRONE_GRAPH_PATH の JSON）があれば、Dijkstra で
+  「minutes 以内に到達できるノード」を求め、方位セクタごとの最遠点を結んだ
+  星形ポリゴンを作る。川や線路の向こう側は道のりが伸びるので自然に削られる。
+- ポリゴンは緯度バンドごとに辺を振り分けた PreparedPolygon にして
+  point-in-polygon を定数時間に近づける。
+- 原点は実際の検索地点から最寄りのグラフノードにスナップし、ポリゴンもそのノードを中心に作る。
+  (node, スナップ距離 50m 刻み, mode, minutes) 単位でキャッシュするので、同じ交差点付近からの
+  検索は使い回せる（タイル中心に丸めると最大 350m ずれ、徒歩15分の3割が狂う）。
+- グラフが無い環境では従来通り「半径×1.5 以内」の距離判定にフォールバック。
+
+グラフ JSON の形式:
+    {"nodes": {"<id>": [lat, lng], ...},
+     "edges": [["<a>", "<b>", length_m, "walk|drive|both"], ...]}
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import os
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from .geo import DRIVE_KMPH, WALK_KMPH, haversine_km
+
+logger = logging.getLogger(__name__)
+
+ISOCHRONE_GRAPH_PATH = settings.isochrone_graph_path
+
+SNAP_STEP_M = 50          # キャッシュキー用のスナップ距離の刻み（切り捨て＝予算は少し甘め）
+NODE_CELL_DEG = 0.01      # 最寄りノード探索用グリッド
+SECTORS = 36              # 星形ポリゴンの方位分割数（10度刻み）
+EDGE_PADDING_KM = 0.1     # 道路から少し外れた POI を取りこぼさない余白
+MAX_SNAP_KM = 0.5         # これ以上離れていればグラフ外とみなす
+BANDS = 32                # PreparedPolygon の緯度バンド数
+
+
+# =========================
+# Point-in-polygon（事前計算済み）
+# =========================
+class PreparedPolygon:
+    """緯度バンドごとに辺をまとめておき、判定時は該当バンドの辺だけを走査する。"""
+
+    __slots__ = ("min_lat", "max_lat", "min_lng", "max_lng", "_band_h", "_bands")
+
+    def __init__(self, ring: List[Tuple[float, float]]):
+        lats = [p[0] for p in ring]
+        lngs = [p[1] for p in ring]
+        self.min_lat, self.max_lat = min(lats), max(lats)
+        self.min_lng, self.max_lng = min(lngs), max(lngs)
+        self._band_h = (self.max_lat - self.min_lat) / BANDS or 1e-9
+        self._bands: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(BANDS)]
+
+        n = len(ring)
+        for i in range(n):
+            a_lat, a_lng = ring[i]
+            b_lat, b_lng = ring[(i + 1) % n]
+            if a_lat == b_lat:
+                continue  # 水平辺はレイキャストに影響しない
+            lo, hi = (a_lat, b_lat) if a_lat < b_lat else (b_lat, a_lat)
+            for band in range(self._band_of(lo), self._band_of(hi) + 1):
+                self._bands[band].append((a_lat, a_lng, b_lat, b_lng))
+
+    def _band_of(self, lat: float) -> int:
+        return min(BANDS - 1, max(0, int((lat - self.min_lat) / self._band_h)))
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if not (self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng):
+            return False
+        inside = False
+        for a_lat, a_lng, b_lat, b_lng in self._bands[self._band_of(lat)]:
+            if (a_lat > lat) != (b_lat > lat):
+                x = a_lng + (lat - a_lat) * (b_lng - a_lng) / (b_lat - a_lat)
+                if lng < x:
+                    inside = not inside
+        return inside
+
+
+# =========================
+# ローカル道路グラフ
+# =========================
+class _Graph:
+    def __init__(self, nodes: Dict[str, Tuple[float, float]],
+                 adj: Dict[str, Dict[str, List[Tuple[str, float]]]]):
+        self.nodes = nodes
+        self.adj = adj  # mode -> node -> [(neighbor, meters)]
+        self.cells: Dict[Tuple[int, int], List[str]] = {}
+        for nid, (lat, lng) in nodes.items():
+            self.cells.setdefault(self._cell(lat, lng), []).append(nid)
+
+    @staticmethod
+    def _cell(lat: float, lng: float) -> Tuple[int, int]:
+        return (int(math.floor(lat / NODE_CELL_DEG)), int(math.floor(lng / NODE_CELL_DEG)))
+
+    def nearest(self, lat: float, lng: float) -> Tuple[Optional[str], float]:
+        ci, cj = self._cell(lat, lng)
+        best, best_d = None, float("inf")
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for nid in self.cells.get((ci + di, cj + dj), ()):
+                    n_lat, n_lng = self.nodes[nid]
+                    d = haversine_km(lat, lng, n_lat, n_lng)
+                    if d < best_d:
+                        best, best_d = nid, d
+        return best, best_d
+
+    def reachable(self, start: str, mode: str, budget_m: float) -> List[str]:
+        adj = self.adj.get(mode, {})
+        dist = {start: 0.0}
+        heap = [(0.0, start)]
+        out: List[str] = []
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist.get(u, float("inf")):
+                continue
+            out.append(u)
+            for v, w in adj.get(u, ()):
+                nd = d + w
+                if nd <= budget_m and nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return out
+
+
+@lru_cache(maxsize=1)
+def _load_graph() -> Optional[_Graph]:
+    if not ISOCHRONE_GRAPH_PATH or not os.path.isfile(ISOCHRONE_GRAPH_PATH):
+        return None
+    try:
+        with open(ISOCHRONE_GRAPH_PATH, encoding="utf-8") as f:
+            raw = json.load(f)
+    except Exception as ex:
+        logger.warning("isochrone graph load error", extra={"path": ISOCHRONE_GRAPH_PATH, "ex": repr(ex)})
+        return None
+
+    nodes = {str(k): (float(v[0]), float(v[1])) for k, v in (raw.get("nodes") or {}).items()}
+    adj: Dict[str, Dict[str, List[Tuple[str, float]]]] = {"walk": {}, "drive": {}}
+    for e in raw.get("edges") or []:
+        a, b, meters = str(e[0]), str(e[1]), float(e[2])
+        modes = e[3] if len(e) > 3 else "both"
+        if a not in nodes or b not in nodes:
+            continue
+        for m in ("walk", "drive"):
+            if modes in (m, "both"):
+                adj[m].setdefault(a, []).append((b, meters))
+                adj[m].setdefault(b, []).append((a, meters))
+    return _Graph(nodes, adj)
+
+
+def _offset(lat: float, lng: float, bearing: float, km: float) -> Tuple[float, float]:
+    # 数km規模なので正距円筒近似で十分
+    d_lat = (km / 111.32) * math.cos(bearing)
+    d_lng = (km / (111.32 * math.cos(math.radians(lat)))) * math.sin(bearing)
+    return lat + d_lat, lng + d_lng
+
+
+@lru_cache(maxsize=512)
+def _isochrone_for_node(start: str, snap_m: int, mode: str, minutes: int) -> Optional[PreparedPolygon]:
+    """start ノードから（原点→ノードの snap_m を差し引いた）minutes 以内の範囲。"""
+    graph = _load_graph()
+    if graph is None:
+        return None
+    o_lat, o_lng = graph.nodes[start]
+
+    speed = WALK_KMPH if mode == "walk" else DRIVE_KMPH
+    budget_m = max(0.0, speed * minutes / 60.0 * 1000.0 - snap_m)
+    reached = graph.reachable(start, mode, budget_m)
+
+    # 方位セクタごとの最遠到達点
+    far = [EDGE_PADDING_KM] * SECTORS
+    for nid in reached:
+        n_lat, n_lng = graph.nodes[nid]
+        d = haversine_km(o_lat, o_lng, n_lat, n_lng)
+        bearing = math.atan2(
+            (n_lng - o_lng) * math.cos(math.radians(o_lat)), n_lat - o_lat
+        ) % (2 * math.pi)
+        s = int(bearing / (2 * math.pi) * SECTORS) % SECTORS
+        far[s] = max(far[s], d + EDGE_PADDING_KM)
+
+    ring = []
+    for s in range(SECTORS):
+        # セクタの両端に頂点を置くと扇形の近似になる
+        for edge in (s, s + 1):
+            ring.append(_offset(o_lat, o_lng, 2 * math.pi * edge / SECTORS, far[s]))
+    return PreparedPolygon(ring)
+
+
+class ReachabilityFilter:
+    """search_detours_core から使う判定器。ポリゴンが無ければ距離判定。"""
+
+    __slots__ = ("lat", "lng", "fallback_km", "polygon")
+
+    def __init__(self, lat: float, lng: float, fallback_km: float, polygon: Optional[PreparedPolygon]):
+        self.lat = lat
+        self.lng = lng
+        self.fallback_km = fallback_km
+        self.polygon = polygon
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if self.polygon is not None:
+            return self.polygon.contains(lat, lng)
+        if self.fallback_km <= 0:
+            return True
+        return haversine_km(self.lat, self.lng, lat, lng) <= self.fallback_km
+
+
+def reachability_filter(lat: float, lng: float, mode: str, minutes: int, fallback_km: float) -> ReachabilityFilter:
+    """
+    (lat, lng) から minutes 以内に到達できる範囲の判定器を返す。
+    fallback_km: グラフが無い/グラフ外のときに使う直線距離の上限。
+    """
+    polygon = None
+    graph = _load_graph()
+    if graph is not None:
+        start, snap_km = graph.nearest(lat, lng)
+        if start is not None and snap_km <= MAX_SNAP_KM:
+            snap_m = int(snap_km * 1000) // SNAP_STEP_M * SNAP_STEP_M
+            polygon = _isochrone_for_node(start, snap_m, mode, int(minutes))
+    return ReachabilityFilter(lat, lng, fallback_km, polygon)
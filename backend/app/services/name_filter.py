@@ -0,0 +1,164 @@
+# app/services/name_filter.py
+"""
+店舗名・施設名の分類（チェーン判定 / 法人表記除去 / 業務系判定）。
+
+routes/detours.py と services/events.py でばらばらに持っていた正規表現を
+app/data/name_patterns.txt の辞書に集約し、Aho-Corasick で 1 パス照合する。
+同じ名前は何度も来るので、正規化と分類結果は生の名前単位でメモ化する。
+"""
+from __future__ import annotations
+
+import os
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Tuple
+
+from app.core.config import settings
+
+_DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "name_patterns.txt")
+NAME_PATTERNS_PATH = settings.name_patterns_path or _DEFAULT_PATH
+
+# 長さを変えない小文字化（span をそのまま元文字列に当てるため str.lower は使わない）
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+_SPACES = re.compile(r"\s{2,}")
+
+
+def _fold(s: str) -> str:
+    return unicodedata.normalize("NFKC", s).translate(_ASCII_LOWER)
+
+
+# =========================
+# Aho-Corasick
+# =========================
+class _Automaton:
+    def __init__(self, patterns: List[Tuple[str, str, bool]]):
+        # goto[state] = {char: next_state}, out[state] = [(pattern_len, category, anchored)]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str, bool]]] = [[]]
+
+        for word, category, anchored in patterns:
+            state = 0
+            for ch in word:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append((len(word), category, anchored))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """(start, end, category) を出現順に返す。anchored の語は先頭一致のときだけ。"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, category, anchored in out[state]:
+                start = i + 1 - length
+                if anchored and start:
+                    continue
+                yield start, i + 1, category
+
+
+def _load_patterns(path: str) -> List[Tuple[str, str, bool]]:
+    patterns: List[Tuple[str, str, bool]] = []
+    category = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                category = line[1:-1].strip()
+                continue
+            if category:
+                anchored = line.startswith("^")  # ^語 は名前の先頭にあるときだけ一致
+                patterns.append((_fold(line.lstrip("^")), category, anchored))
+    return patterns
+
+
+@lru_cache(maxsize=1)
+def _automaton() -> _Automaton:
+    return _Automaton(_load_patterns(NAME_PATTERNS_PATH))
+
+
+# =========================
+# 公開API
+# =========================
+class NameInfo(NamedTuple):
+    normalized: str                 # NFKC 正規化済みの名前
+    display: str                    # 法人表記を除いた表示名
+    categories: FrozenSet[str]      # 該当カテゴリ（chain / corp / business）
+
+
+@lru_cache(maxsize=16384)
+def normalize_name(name: str) -> str:
+    """全角/半角・㈱ などの表記ゆれを NFKC で揃える。"""
+    return unicodedata.normalize("NFKC", name)
+
+
+@lru_cache(maxsize=16384)
+def classify(name: str) -> NameInfo:
+    if not name:
+        return NameInfo(name or "", name or "", frozenset())
+
+    normalized = normalize_name(name)
+    folded = normalized.translate(_ASCII_LOWER)
+
+    categories = set()
+    corp_spans: List[Tuple[int, int]] = []
+    for start, end, category in _automaton().finditer(folded):
+        categories.add(category)
+        if category == "corp":
+            corp_spans.append((start, end))
+
+    display = normalized
+    if corp_spans:
+        # 左から重ならないように除去（同じ開始位置なら長い方を優先）
+        corp_spans.sort(key=lambda s: (s[0], -s[1]))
+        parts, pos = [], 0
+        for start, end in corp_spans:
+            if start < pos:
+                continue
+            parts.append(normalized[pos:start])
+            pos = end
+        parts.append(normalized[pos:])
+        display = "".join(parts)
+    display = _SPACES.sub(" ", display).strip(" 　・,.-")
+
+    return NameInfo(normalized, display or name, frozenset(categories))
+
+
+def is_chain(name: str) -> bool:
+    return "chain" in classify(name or "").categories
+
+
+def is_corporate(name: str) -> bool:
+    """法人表記 or 会社・業務系の施設名か。"""
+    cats = classify(name or "").categories
+    return "corp" in cats or "business" in cats
+
+
+def clean_shop_name(name: str) -> str:
+    """表示用に正規化し、法人表記と余分な空白/記号を除く。"""
+    if not name:
+        return name
+    return classify(name).display
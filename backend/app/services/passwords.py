@@ -0,0 +1,98 @@
+# app/services/passwords.py
+"""
+パスワードのハッシュ化 / 照合（bcrypt）を専用のプロセスプールで行う。
+
+bcrypt は1回 100〜300ms の CPU 処理で、FastAPI の共有スレッドプールで回すと
+ログインが集中したときに他の threadpool 処理（DB 等）が詰まる。別プロセスなら GIL も取り合わない。
+
+- ワーカー数は PASSWORD_HASH_WORKERS、同時に投げる数の上限は PASSWORD_HASH_MAX_PENDING
+- コストは BCRYPT_ROUNDS（実行時に変更可）。ログイン成功時に保存済みハッシュのコストが
+  違っていれば needs_rehash() で検知して新しいコストで作り直す
+- 既存の passlib(bcrypt) で作ったハッシュ（$2b$ / $2a$）はそのまま照合できる
+"""
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from app.core.config import get_settings, settings
+
+BCRYPT_MAX_BYTES = 72  # bcrypt が見るのは先頭 72 バイトまで
+
+_pool: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+# ---- 子プロセスで実行される関数（pickle できるようにモジュール直下に置く）----
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8")[:BCRYPT_MAX_BYTES], bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode("utf-8")[:BCRYPT_MAX_BYTES], hashed.encode("ascii"))
+    except ValueError:
+        return False  # 壊れたハッシュ / bcrypt 以外の形式
+
+
+def _noop() -> None:
+    return None
+
+
+# ---- 親プロセス側 ----
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # uvicorn/gunicorn のワーカーはスレッドを抱えているので fork ではなく spawn で起動する
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.password_hash_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _run(fn, *args):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.password_hash_max_pending)
+    async with _slots:  # 溢れた分はここで待たせ、プールのキューを無制限に伸ばさない
+        return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+
+
+def rounds_of(hashed: str) -> Optional[int]:
+    """'$2b$12$...' → 12。bcrypt 形式でなければ None。"""
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed: str) -> bool:
+    return rounds_of(hashed) != get_settings().bcrypt_rounds
+
+
+async def hash_password(password: str) -> str:
+    return await _run(_hash, password, get_settings().bcrypt_rounds)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    if not hashed:
+        return False
+    return await _run(_verify, password, hashed)
+
+
+def start() -> None:
+    """起動時に子プロセスを立ち上げておく（最初のログインで spawn 待ちをしない）。"""
+    for _ in range(settings.password_hash_workers):
+        _executor().submit(_noop)
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
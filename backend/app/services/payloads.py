@@ -0,0 +1,119 @@
+# app/services/payloads.py
+"""
+プロバイダ応答（YOLP localSearch / Google Nearby）から必要な項目だけを抜き出す。
+
+YOLP の Feature は Genre / Station / Detail など入れ子が深く、Nearby の result も
+viewport・plus_code・types など使わない項目が大半。受け取った直後（fetch の中）で
+__slots__ の小さいレコードに写し取り、元の dict ツリーはその場で捨てる。
+シードを並行に投げても gather が抱えるのは軽いレコードだけになる。
+
+    feats = payloads.parse_yolp(r.content)      # List[YolpFeature]
+    status, places = payloads.parse_nearby(resp.content)
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import orjson
+
+
+@dataclass(slots=True)
+class YolpFeature:
+    id: Optional[str]
+    name: str              # 生の名称（strip 済み・正規化前）
+    lat: float
+    lng: float
+    genres: Tuple[str, ...]
+    catch: str             # Property.CatchCopy
+    lead: str              # Property.Lead
+    address: Optional[str]
+    url: Optional[str]     # Property.Detail.PcUrl
+
+
+@dataclass(slots=True)
+class NearbyPlace:
+    name: Optional[str]
+    lat: float
+    lng: float
+    place_id: Optional[str]
+    rating: Optional[float]
+    reviews_count: Optional[int]
+    open_now: Optional[bool]
+    photo_ref: Optional[str]
+    vicinity: Optional[str]
+    address: Optional[str]  # formatted_address（Nearby では通常付かない）
+
+
+def _yolp_coords(coords: str) -> Optional[Tuple[float, float]]:
+    parts = coords.split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        return float(parts[1]), float(parts[0])  # YOLP は "lng,lat"
+    except ValueError:
+        return None
+
+
+def _genre_names(raw) -> Tuple[str, ...]:
+    if isinstance(raw, dict):
+        raw = [raw]
+    elif not isinstance(raw, list):
+        return ()
+    out = []
+    for g in raw:
+        n = ((g.get("Name") or "") if isinstance(g, dict) else str(g)).strip()
+        if n:
+            out.append(n)
+    return tuple(out)
+
+
+def parse_yolp(body: bytes) -> List[YolpFeature]:
+    """localSearch の JSON 本文 → YolpFeature の配列（名称か座標が無いものは落とす）。"""
+    out: List[YolpFeature] = []
+    for f in orjson.loads(body).get("Feature") or ():
+        name = (f.get("Name") or "").strip()
+        ll = _yolp_coords((f.get("Geometry") or {}).get("Coordinates") or "")
+        if not name or ll is None:
+            continue
+        prop = f.get("Property") or {}
+        # 件数が多いので位置引数で作る（キーワード引数より速い。順序はクラス定義どおり）
+        out.append(YolpFeature(
+            f.get("Id"),
+            name,
+            ll[0],
+            ll[1],
+            _genre_names(prop.get("Genre") or []),
+            prop.get("CatchCopy") or "",
+            prop.get("Lead") or "",
+            prop.get("Address"),
+            (prop.get("Detail") or {}).get("PcUrl"),
+        ))
+    return out
+
+
+def parse_nearby(body: bytes) -> Tuple[Optional[str], List[NearbyPlace]]:
+    """Nearby Search の JSON 本文 → (status, NearbyPlace の配列)。座標が無いものは落とす。"""
+    data = orjson.loads(body)
+    out: List[NearbyPlace] = []
+    for r in data.get("results") or ():
+        try:
+            loc = r["geometry"]["location"]
+            lat, lng = float(loc["lat"]), float(loc["lng"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        photos = r.get("photos") or ()
+        hours = r.get("opening_hours")
+        out.append(NearbyPlace(
+            r.get("name"),
+            lat,
+            lng,
+            r.get("place_id"),
+            r.get("rating"),
+            r.get("user_ratings_total"),
+            hours.get("open_now") if hours else None,
+            (photos[0] or {}).get("photo_reference") if photos else None,
+            r.get("vicinity"),
+            r.get("formatted_address"),
+        ))
+    return data.get("status"), out
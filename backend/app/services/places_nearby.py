@@ -1,16 +1,21 @@
 # 寄り道ガイド専用の Nearby 検索モジュール（既存 places.py は触らない）
-from dotenv import load_dotenv
-load_dotenv()
-
-import os
+import asyncio
 import httpx
+import logging
 from typing import List, Optional
+from app.core.config import settings
+from . import rate_limit, resilience
+from .candidates import Candidate
 from .geo import haversine_km
+from .payloads import NearbyPlace, parse_nearby
+
+logger = logging.getLogger(__name__)
 
 # 既存の env 名に合わせる（GOOGLE_MAPS_API_KEY を使う）
-GOOGLE_API = os.getenv("GOOGLE_MAPS_API_KEY") or ""
-REGION = os.getenv("GOOGLE_PLACES_REGION", "jp")
-LANG = os.getenv("GOOGLE_PLACES_LANGUAGE", "ja")
+GOOGLE_API = settings.google_maps_api_key
+REGION = settings.google_places_region
+LANG = settings.google_places_language
+NEARBY_URL = f"{settings.google_maps_base_url.rstrip('/')}/maps/api/place/nearbysearch/json"
 
 def _photo_url(ref: str, maxw: int = 800) -> str:
     return (f"https://maps.googleapis.com/maps/api/place/photo"
@@ -27,7 +32,9 @@ TYPE_MAP = {
             "church","place_of_worship"
         ],
         "keyword": None
-    }
+    },
+    # イベント会場/催事（YOLP と並行で引く。type 指定なしのキーワード検索）
+    "event": {"types": [None], "keyword": "イベント 祭り"},
 }
 
 async def google_nearby(
@@ -36,7 +43,7 @@ async def google_nearby(
     radius_m: int,
     detour_type: str,
     categories: Optional[List[str]] = None,
-) -> List[dict]:
+) -> List[Candidate]:
     """Google Places Nearby Search（寄り道ガイド用）。"""
     if not GOOGLE_API:
         return []
@@ -50,55 +57,69 @@ async def google_nearby(
     }
 
     conf = TYPE_MAP.get(detour_type, {})
-    results: List[dict] = []
+    results: List[Candidate] = []
+
+    async def _nearby(client: httpx.AsyncClient, params: dict) -> List[NearbyPlace]:
+        async def _get():
+            r = await client.get(NEARBY_URL, params=params)
+            if r.status_code == 429:
+                rate_limit.backoff("google", GOOGLE_API)
+            r.raise_for_status()  # 5xx もブレーカーに失敗として数えさせる
+            return r
+
+        await rate_limit.acquire("google", GOOGLE_API)
+        # 遅いときは p95 経過で同じリクエストをもう1本投げる（hedged request）
+        resp = await resilience.hedged(
+            "google_nearby",
+            _get,
+            gate=lambda: rate_limit.try_acquire("google", GOOGLE_API),
+        )
+        # 使う項目だけ写し取る（viewport / plus_code などの dict はここで捨てる）
+        status, places = parse_nearby(resp.content)
+        if status == "OVER_QUERY_LIMIT":
+            rate_limit.backoff("google", GOOGLE_API)
+        return places
+
+    if categories or conf.get("keyword"):  # キーワード優先
+        param_sets = [dict(base_params, keyword=" ".join(categories) if categories else conf["keyword"])]
+    else:
+        param_sets = [dict(base_params, type=t) if t else dict(base_params) for t in conf.get("types", [None])]
 
     async with httpx.AsyncClient(timeout=10) as client:
-        if categories:  # キーワード優先
-            params = dict(base_params)
-            params["keyword"] = " ".join(categories)
-            resp = await client.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params)
-            data = resp.json()
-            batches = [data.get("results", [])]
-        else:
-            batches = []
-            for t in conf.get("types", [None]):
-                params = dict(base_params)
-                if t:
-                    params["type"] = t
-                resp = await client.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params)
-                data = resp.json()
-                batches.append(data.get("results", []))
+        # type ごとのリクエストは並行に投げる（1つ失敗しても残りは使う）
+        fetched = await asyncio.gather(*(_nearby(client, p) for p in param_sets), return_exceptions=True)
+    batches = []
+    for b in fetched:
+        if isinstance(b, BaseException):
+            if len(fetched) == 1:
+                raise b
+            logger.warning("nearby request error", extra={"ex": repr(b)})
+            continue
+        batches.append(b)
 
     for batch in batches:
         for r in batch:
-            try:
-                plat = float(r["geometry"]["location"]["lat"])
-                plng = float(r["geometry"]["location"]["lng"])
-            except Exception:
-                continue  # 座標が無ければ捨てる
-            
-            results.append({
-                "name": r.get("name"),
-                "lat": plat,
-                "lng": plng,
-                "rating": r.get("rating"),
-                "open_now": r.get("opening_hours", {}).get("open_now") if r.get("opening_hours") else None,
-                "opening_hours": None,  # 詳細までは取らない（必要時に details 追撃）
-                "parking": None,
-                "url": f"https://www.google.com/maps/place/?q=place_id:{r.get('place_id')}",
-                "photo_url": _photo_url(r["photos"][0]["photo_reference"]) if r.get("photos") else None,
-                "source": "google",
-            })
+            # opening_hours / parking は詳細までは取らない（必要時に details 追撃）
+            results.append(Candidate(
+                name=r.name or "",
+                lat=r.lat,
+                lng=r.lng,
+                source="google",
+                rating=r.rating,
+                open_now=r.open_now,
+                url=f"https://www.google.com/maps/place/?q=place_id:{r.place_id}",
+                photo_url=_photo_url(r.photo_ref) if r.photo_ref else None,
+            ))
 
     # 重複除去＋距離付与＋ソート
     uniq, seen = [], set()
     for x in results:
-        key = (x["name"], round(x["lat"], 5), round(x["lng"], 5))
+        key = (x.name, round(x.lat, 5), round(x.lng, 5))
         if key in seen:
             continue
         seen.add(key)
-        x["distance_km"] = haversine_km(lat, lng, x["lat"], x["lng"])
+        x.distance_km = haversine_km(lat, lng, x.lat, x.lng)
         uniq.append(x)
 
-    uniq.sort(key=lambda x: (x["distance_km"], -(x.get("rating") or 0)))
+    uniq.sort(key=lambda x: (x.distance_km, -(x.rating or 0)))
     return uniq
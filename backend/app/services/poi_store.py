@@ -0,0 +1,192 @@
+# app/services/poi_store.py
+"""
+寄り道候補のローカル POI ストア（プロセス内）。
+
+- Google / YOLP から取得済みの結果と、一括インポート（JSONL）した POI を
+  約1km 格子のセルに入れておき、(facet, セル) 単位で引く。
+  facet は detour_type と検索語（categories / keyword）を合わせたキー。
+- 「どこを検索済みか」は facet ごとの検索円（中心・半径・取得時刻）で持ち、
+  クエリ円を丸ごと覆う新しい検索円があれば fresh とみなす。
+- search_detours_core は fresh かつ件数が足りるときだけローカルで返し、
+  それ以外（stale / sparse）はネットワークへフォールスルーして結果を取り込む。
+  検索円を検索済みにするのは、その facet の全ソースが締め切りまでに返ってきたときだけ。
+- 検索円は facet ごとに MAX_COVERAGE_PER_FACET 件、facet 数は MAX_COVERAGE_FACETS までの LRU。
+
+一括インポートの JSONL 形式（1 行 1 件）:
+    {"detour_type": "food", "name": "...", "lat": 35.0, "lng": 139.0, ...}
+    {"type": "coverage", "facet": "food", "lat": 35.0, "lng": 139.0, "radius_km": 3.0, "ttl_sec": null}
+"""
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.core.config import get_settings, settings
+from .candidates import Candidate, as_candidates
+from .geo import haversine_km
+
+logger = logging.getLogger(__name__)
+
+# TTL / 最小件数は実行時に変えられるので get_settings() から都度読む
+POI_STORE_MAX_CELLS = settings.poi_store_max_cells
+POI_IMPORT_PATH = settings.poi_import_path
+
+CELL_DEG = 0.01           # 約1km
+MAX_PER_CELL = 200
+MAX_COVERAGE_PER_FACET = 256
+MAX_COVERAGE_FACETS = 4096  # facet は検索語を含むので上限を付ける（古いものから捨てる）
+
+
+class _Coverage(NamedTuple):
+    lat: float
+    lng: float
+    radius_km: float
+    fetched_at: float
+    ttl_sec: Optional[float]
+
+
+class LocalResult(NamedTuple):
+    items: List[Candidate]
+    fresh: bool
+
+
+def facet_key(detour_type: str, categories: Optional[Sequence[str]] = None, keyword: Optional[str] = None) -> str:
+    terms = sorted({t.strip() for t in (categories or []) if t and t.strip()})
+    if keyword and keyword.strip():
+        terms.append("kw:" + keyword.strip())
+    return "|".join([detour_type] + terms)
+
+
+def _cell(lat: float, lng: float) -> Tuple[int, int]:
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+def _poi_key(x: Candidate) -> str:
+    if x.id:
+        return x.id
+    return f"{x.name}@{round(x.lat, 5)},{round(x.lng, 5)}"
+
+
+class PoiStore:
+    def __init__(self, ttl_sec: Optional[int] = None, max_cells: int = POI_STORE_MAX_CELLS):
+        self._ttl_sec = ttl_sec  # None なら settings.poi_store_ttl_sec
+        self.max_cells = max_cells
+        # (facet, i, j) -> {poi_key: poi}
+        self._cells: "OrderedDict[Tuple[str, int, int], Dict[str, Candidate]]" = OrderedDict()
+        self._coverage: "OrderedDict[str, Deque[_Coverage]]" = OrderedDict()
+
+    @property
+    def ttl_sec(self) -> int:
+        return self._ttl_sec if self._ttl_sec is not None else get_settings().poi_store_ttl_sec
+
+    # ---- 書き込み ----
+    def add(self, facet: str, items: Iterable[Candidate]) -> int:
+        n = 0
+        for x in items:
+            key = (facet,) + _cell(x.lat, x.lng)
+            bucket = self._cells.get(key)
+            if bucket is None:
+                bucket = self._cells[key] = {}
+                if len(self._cells) > self.max_cells:
+                    self._cells.popitem(last=False)
+            else:
+                self._cells.move_to_end(key)
+            if len(bucket) >= MAX_PER_CELL:
+                continue
+            # 検索地点に依存する値はストアに入れない（取り出し側で再計算する）
+            bucket[_poi_key(x)] = x.detached()
+            n += 1
+        return n
+
+    def mark_covered(self, facet: str, lat: float, lng: float, radius_km: float,
+                     fetched_at: Optional[float] = None, ttl_sec: Optional[float] = -1) -> None:
+        ttl = self.ttl_sec if ttl_sec == -1 else ttl_sec
+        cov = self._coverage.get(facet)
+        if cov is None:
+            cov = self._coverage[facet] = deque(maxlen=MAX_COVERAGE_PER_FACET)
+            while len(self._coverage) > MAX_COVERAGE_FACETS:
+                self._coverage.popitem(last=False)
+        else:
+            self._coverage.move_to_end(facet)
+        cov.append(_Coverage(lat, lng, radius_km, fetched_at or time.time(), ttl))
+
+    def ingest(self, facet: str, items: Iterable[Candidate], lat: float, lng: float, radius_km: float) -> None:
+        """プロバイダの検索結果を取り込み、その検索円を検索済みとして記録する。"""
+        self.add(facet, items)
+        self.mark_covered(facet, lat, lng, radius_km)
+
+    # ---- 読み出し ----
+    def is_fresh(self, facet: str, lat: float, lng: float, radius_km: float, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        cov = self._coverage.get(facet)
+        if not cov:
+            return False
+        live = False
+        for c in cov:
+            if c.ttl_sec is not None and now - c.fetched_at > c.ttl_sec:
+                continue
+            live = True
+            if haversine_km(lat, lng, c.lat, c.lng) + radius_km <= c.radius_km:
+                return True
+        if not live:
+            del self._coverage[facet]  # 全部期限切れの facet は掃除する
+        return False
+
+    def query(self, facet: str, lat: float, lng: float, radius_km: float) -> LocalResult:
+        d_lat = radius_km / 111.32
+        d_lng = radius_km / (111.32 * max(0.01, math.cos(math.radians(lat))))
+        i0, j0 = _cell(lat - d_lat, lng - d_lng)
+        i1, j1 = _cell(lat + d_lat, lng + d_lng)
+
+        out: List[Candidate] = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                bucket = self._cells.get((facet, i, j))
+                if not bucket:
+                    continue
+                for x in bucket.values():
+                    if haversine_km(lat, lng, x.lat, x.lng) <= radius_km:
+                        out.append(dataclasses.replace(x))  # 呼び出し側で書き換えるのでコピー
+        return LocalResult(out, self.is_fresh(facet, lat, lng, radius_km))
+
+    # ---- 一括インポート ----
+    def import_jsonl(self, path: str) -> int:
+        n = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                rec = json.loads(line)
+                if rec.get("type") == "coverage":
+                    self.mark_covered(
+                        rec["facet"], float(rec["lat"]), float(rec["lng"]), float(rec["radius_km"]),
+                        ttl_sec=rec.get("ttl_sec", -1),
+                    )
+                    continue
+                facet = rec.pop("facet", None) or facet_key(rec.get("detour_type") or "spot")
+                n += self.add(facet, as_candidates([rec]))
+        return n
+
+
+_store: Optional[PoiStore] = None
+
+
+def get_poi_store() -> PoiStore:
+    """プロセス共通のストア。POI_IMPORT_PATH があれば初回に読み込む。"""
+    global _store
+    if _store is None:
+        _store = PoiStore()
+        if POI_IMPORT_PATH and os.path.isfile(POI_IMPORT_PATH):
+            try:
+                n = _store.import_jsonl(POI_IMPORT_PATH)
+                logger.info("imported pois", extra={"count": n, "path": POI_IMPORT_PATH})
+            except Exception as ex:
+                logger.warning("poi import error", extra={"path": POI_IMPORT_PATH, "ex": repr(ex)})
+    return _store
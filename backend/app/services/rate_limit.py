@@ -0,0 +1,193 @@
+# app/services/rate_limit.py
+"""
+外部API（Google / YOLP / Gemini / OpenAI）向けのクライアント側レート制限。
+
+- プロバイダ × APIキーごとのトークンバケット（QPS / バースト）
+- 1日あたりのクォータ予算（UTC 日付で日替わり）
+- 優先レーン: interactive（ユーザー検索）> background（事前計算など）
+  background はバケットの一部と日次予算の一部を interactive 用に残して使う
+- 429 / OVER_QUERY_LIMIT を受けたら backoff() でしばらく送らない
+- 待たされた/断った回数は stats() で見られる
+
+設定は環境変数 RATE_LIMIT_<PROVIDER>_{QPS,BURST,DAILY}（DAILY=0 は無制限）。
+settings の実行時リロードで値が変わったら、既存のバケットにもすぐ反映する。
+
+    await rate_limit.acquire("google", KEY)
+    with rate_limit.lane("background"):
+        ...  # この中の acquire は background 扱い
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import datetime as dt
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from app.core.config import Settings, get_settings, on_reload
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+BACKGROUND_TOKEN_RESERVE = 0.3   # バースト枠のうち interactive 専用に残す割合
+BACKGROUND_DAILY_SHARE = 0.8     # 日次予算のうち background が使える割合
+MAX_WAIT_SEC = {INTERACTIVE: 2.0, BACKGROUND: 30.0}
+
+# provider -> (qps, burst, daily)
+_DEFAULTS: Dict[str, Tuple[float, float, int]] = {
+    "google": (10.0, 20.0, 0),
+    "yolp": (5.0, 10.0, 0),
+    "gemini": (2.0, 5.0, 0),
+    "openai": (3.0, 5.0, 0),
+}
+
+_lane: contextvars.ContextVar[str] = contextvars.ContextVar("rate_limit_lane", default=INTERACTIVE)
+
+
+class RateLimitedError(RuntimeError):
+    """待ち時間の上限を超えた / 日次予算を使い切ったため送信しなかった。"""
+
+
+def _conf(provider: str) -> Tuple[float, float, int]:
+    qps, burst, daily = _DEFAULTS.get(provider, (5.0, 10.0, 0))
+    s = get_settings()
+    p = provider.lower()
+
+    def _pick(kind: str, default):
+        v = getattr(s, f"rate_limit_{p}_{kind}", None)
+        return default if v is None else v
+
+    return float(_pick("qps", qps)), float(_pick("burst", burst)), int(_pick("daily", daily))
+
+
+class TokenBucket:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.qps, self.burst, self.daily = _conf(provider)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.day = dt.datetime.utcnow().date()
+        self.used_today = 0
+
+    def reconfigure(self) -> None:
+        self.qps, self.burst, self.daily = _conf(self.provider)
+        self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.qps)
+        self.updated = now
+        today = dt.datetime.utcnow().date()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+
+    def _floor(self, lane: str) -> float:
+        return self.burst * BACKGROUND_TOKEN_RESERVE if lane == BACKGROUND else 0.0
+
+    def _budget_left(self, lane: str) -> bool:
+        if self.daily <= 0:
+            return True
+        limit = self.daily * (BACKGROUND_DAILY_SHARE if lane == BACKGROUND else 1.0)
+        return self.used_today < limit
+
+    def try_take(self, lane: str) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.blocked_until or not self._budget_left(lane):
+            return False
+        if self.tokens - 1 < self._floor(lane):
+            return False
+        self.tokens -= 1
+        self.used_today += 1
+        return True
+
+    def wait_hint(self, lane: str) -> float:
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        need = self._floor(lane) + 1 - self.tokens
+        return max(0.005, need / self.qps if self.qps > 0 else 1.0)
+
+
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _bucket(provider: str, key: str) -> TokenBucket:
+    b = _buckets.get((provider, key))
+    if b is None:
+        b = _buckets[(provider, key)] = TokenBucket(provider)
+    return b
+
+
+def _count(provider: str, field: str) -> None:
+    s = _stats.setdefault(provider, {"acquired": 0, "throttled": 0, "rejected": 0, "backoffs": 0})
+    s[field] += 1
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    """with lane("background"): の中の acquire を指定レーンで行う。"""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+async def acquire(provider: str, key: str = "") -> None:
+    """トークンが取れるまで待つ。待ち時間上限 or 日次予算切れで RateLimitedError。"""
+    b = _bucket(provider, key)
+    ln = _lane.get()
+    deadline = time.monotonic() + MAX_WAIT_SEC.get(ln, 2.0)
+    throttled = False
+    # ロックは取らない: トークンが少ないときは floor の低い interactive が先に取れる
+    while not b.try_take(ln):
+        if not b._budget_left(ln):
+            _count(provider, "rejected")
+            raise RateLimitedError(f"{provider} daily budget exhausted ({b.used_today}/{b.daily})")
+        wait = b.wait_hint(ln)
+        if time.monotonic() + wait > deadline:
+            _count(provider, "rejected")
+            raise RateLimitedError(f"{provider} rate limited (lane={ln})")
+        throttled = True
+        await asyncio.sleep(wait)
+    if throttled:
+        _count(provider, "throttled")
+    _count(provider, "acquired")
+
+
+def try_acquire(provider: str, key: str = "") -> bool:
+    """待たずに取れるときだけ取る（hedged request の2本目など）。"""
+    ok = _bucket(provider, key).try_take(_lane.get())
+    if ok:
+        _count(provider, "acquired")
+    return ok
+
+
+def backoff(provider: str, key: str = "", seconds: float = 5.0) -> None:
+    """上流から 429 / OVER_QUERY_LIMIT を受けたとき、しばらく送信を止める。"""
+    b = _bucket(provider, key)
+    b.blocked_until = max(b.blocked_until, time.monotonic() + seconds)
+    b.tokens = 0
+    _count(provider, "backoffs")
+    logger.warning("backoff", extra={"provider": provider, "seconds": round(seconds, 1)})
+
+
+@on_reload
+def _reconfigure(_settings: Settings) -> None:
+    for b in _buckets.values():
+        b.reconfigure()
+
+
+def stats() -> Dict[str, dict]:
+    out: Dict[str, dict] = {p: dict(s) for p, s in _stats.items()}
+    for (provider, _), b in _buckets.items():
+        s = out.setdefault(provider, {})
+        s["used_today"] = s.get("used_today", 0) + b.used_today
+        s["daily_budget"] = b.daily
+    return out
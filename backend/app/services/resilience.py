@@ -0,0 +1,185 @@
+# app/services/resilience.py
+"""
+上流プロバイダ（Google / YOLP / Gemini など）ごとの耐障害レイヤ。
+
+- 直近のレイテンシ/成否をローリングウィンドウで保持
+- タイムアウトは観測 p99 × 係数から動的に決める（min〜max にクリップ）
+- 失敗が続いたらサーキットを開き、クールダウン中はそのプロバイダを呼ばない
+- hedged(): 一定時間（観測 p95）で返らなければ同じリクエストをもう1本投げ、早い方を使う
+
+使い方:
+    data = await resilience.call("yolp", lambda: client.get(url, params=params))
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from app.core import metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+WINDOW_SIZE = 100
+MIN_SAMPLES = 10
+TIMEOUT_FACTOR = 1.5
+FAILURE_STREAK = 5          # 連続失敗でオープン
+FAILURE_RATE = 0.5          # もしくは直近ウィンドウの失敗率
+
+
+class CircuitOpenError(RuntimeError):
+    """サーキットが開いているため呼び出しをスキップした。"""
+
+
+class ProviderHealth:
+    def __init__(self, name: str, default_timeout: float, min_timeout: float, max_timeout: float):
+        self.name = name
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._window: Deque[Tuple[float, bool]] = deque(maxlen=WINDOW_SIZE)  # (latency_sec, ok)
+        self._streak = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    # ---- 統計 ----
+    def percentile(self, q: float) -> Optional[float]:
+        lat = sorted(l for l, ok in self._window if ok)
+        if len(lat) < MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(q * len(lat)))]
+
+    def timeout(self) -> float:
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * TIMEOUT_FACTOR))
+
+    def hedge_delay(self) -> float:
+        p95 = self.percentile(0.95)
+        return p95 if p95 is not None else self.default_timeout / 2
+
+    def error_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return sum(1 for _, ok in self._window if not ok) / len(self._window)
+
+    # ---- サーキット ----
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < get_settings().resilience_cooldown_sec:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True  # 試しに1本だけ通す
+            return True
+        return False
+
+    def record(self, latency: float, ok: bool) -> None:
+        self._window.append((latency, ok))
+        self._probing = False
+        if ok:
+            self._streak = 0
+            self._opened_at = None
+            return
+        self._streak += 1
+        tripped = self._streak >= FAILURE_STREAK or (
+            len(self._window) >= MIN_SAMPLES and self.error_rate() >= FAILURE_RATE
+        )
+        if tripped or self.state == "half_open":
+            if self._opened_at is None or self.state == "half_open":
+                logger.warning("circuit open", extra={"provider": self.name, "streak": self._streak, "error_rate": round(self.error_rate(), 2)})
+            self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "timeout_sec": round(self.timeout(), 3),
+            "p95_sec": self.percentile(0.95),
+            "p99_sec": self.percentile(0.99),
+            "error_rate": round(self.error_rate(), 3),
+            "samples": len(self._window),
+        }
+
+
+# プロバイダ名 -> (既定, 最小, 最大) タイムアウト秒
+_DEFAULTS: Dict[str, Tuple[float, float, float]] = {
+    "google_nearby": (10.0, 1.0, 10.0),
+    "google_places": (10.0, 1.0, 10.0),
+    "yolp": (10.0, 1.0, 10.0),
+    "gemini": (30.0, 3.0, 30.0),
+    "openai": (60.0, 10.0, 60.0),
+}
+_providers: Dict[str, ProviderHealth] = {}
+
+
+def provider(name: str) -> ProviderHealth:
+    p = _providers.get(name)
+    if p is None:
+        default, lo, hi = _DEFAULTS.get(name, (10.0, 1.0, 10.0))
+        p = _providers[name] = ProviderHealth(name, default, lo, hi)
+    return p
+
+
+def snapshot() -> Dict[str, dict]:
+    return {name: p.snapshot() for name, p in _providers.items()}
+
+
+async def call(name: str, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+    """サーキット判定 + 動的タイムアウト付きで fn() を実行する。"""
+    p = provider(name)
+    if not p.allow():
+        raise CircuitOpenError(f"{name} circuit open")
+    t0 = time.perf_counter()
+    try:
+        with metrics.span("outbound", name):
+            result = await asyncio.wait_for(fn(), timeout=timeout or p.timeout())
+    except asyncio.CancelledError:
+        p._probing = False  # 締め切りで打ち切られただけなので失敗にはしない
+        raise
+    except BaseException:
+        p.record(time.perf_counter() - t0, ok=False)
+        raise
+    p.record(time.perf_counter() - t0, ok=True)
+    return result
+
+
+async def hedged(name: str, fn: Callable[[], Awaitable[T]], gate: Optional[Callable[[], bool]] = None) -> T:
+    """
+    hedge_delay 経っても返らなければ2本目を投げ、先に成功した方を返す。
+    gate: 2本目を投げてよいか（レート制限のトークンが取れたか等）。False なら1本目を待つ。
+    """
+    p = provider(name)
+    first = asyncio.ensure_future(call(name, fn))
+    done, _ = await asyncio.wait({first}, timeout=p.hedge_delay())
+    if done:
+        return first.result()
+    if gate is not None and not gate():
+        return await first
+
+    second = asyncio.ensure_future(call(name, fn))
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = t.exception()
+        raise error  # 両方失敗
+    finally:
+        for t in pending:
+            t.cancel()
@@ -1,13 +1,125 @@
 # app/services/security.py
-from fastapi import Depends
-from typing import Optional
+"""
+JWT による認証（/login で発行、各 API で検証）。
+
+- トークンにはパーソナライズに使うプロフィール（name / gender / age_group）も入れておき、
+  認証済みのリクエストでは DB を引かずに本人とプロフィールが分かるようにする
+- 署名鍵（HS256）はプロセスで1回だけ組み立てて使い回す。JWT_SECRET_KEY が無ければ起動時に止める
+  （ワーカーごとの乱数鍵は JWT_ALLOW_RANDOM_KEY=true のときだけ。1プロセスのローカル開発用）
+- 検証済みトークン → claims も小さな LRU に持つ（同じトークンの連続リクエストで署名検証を省く）
+
+    current_user = Depends(get_current_user)    # 未ログインは 401
+    current_user = Depends(get_optional_user)   # 未ログインは None
+"""
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwk, jwt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_SIZE = 4096
+_PROFILE_CLAIMS = ("email", "name", "gender", "age_group")
+
+_bearer = HTTPBearer(auto_error=False)
+_claims_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
 
 class CurrentUser:
-    def __init__(self, user_id: int):
+    def __init__(self, user_id: int, email: Optional[str] = None, name: Optional[str] = None,
+                 gender: Optional[str] = None, age_group: Optional[str] = None):
         self.id = user_id
+        self.email = email
+        self.name = name
+        self.gender = gender
+        self.age_group = age_group
+
+    def profile(self) -> dict:
+        """gpt.generate_guide_text(user=...) に渡すパーソナライズ情報。"""
+        return {"gender": self.gender, "age_group": self.age_group}
+
+
+@lru_cache(maxsize=1)
+def _key():
+    secret = settings.jwt_secret_key
+    if not secret:
+        # 乱数鍵はワーカーごと・再起動ごとに変わり、他のワーカーが発行したトークンが 401 になる
+        if not settings.jwt_allow_random_key:
+            raise RuntimeError("JWT_SECRET_KEY is not set (JWT_ALLOW_RANDOM_KEY=true for single-process dev only)")
+        logger.warning("JWT_SECRET_KEY is not set; using a random per-process key")
+        secret = secrets.token_urlsafe(32)
+    return jwk.construct(secret, settings.jwt_algorithm)
+
+
+def init() -> None:
+    """起動時に署名鍵を組み立てる（未設定ならリクエストを受ける前にここで落ちる）。"""
+    _key()
+
+
+def create_access_token(user) -> str:
+    """models.User からトークンを作る。"""
+    now = dt.datetime.now(dt.timezone.utc)
+    claims = {
+        "sub": str(user.id),
+        "iat": int(now.timestamp()),
+        "exp": int((now + dt.timedelta(minutes=settings.jwt_expire_minutes)).timestamp()),
+    }
+    for k in _PROFILE_CLAIMS:
+        claims[k] = getattr(user, k, None)
+    return jwt.encode(claims, _key(), algorithm=settings.jwt_algorithm)
+
+
+def decode_token(token: str) -> dict:
+    """署名と期限を検証して claims を返す。不正なら JWTError。"""
+    hit = _claims_cache.get(token)
+    if hit is not None:
+        exp, claims = hit
+        if exp > time.time():
+            _claims_cache.move_to_end(token)
+            return claims
+        _claims_cache.pop(token, None)
+
+    claims = jwt.decode(token, _key(), algorithms=[settings.jwt_algorithm])
+    _claims_cache[token] = (float(claims.get("exp", 0)), claims)
+    while len(_claims_cache) > TOKEN_CACHE_SIZE:
+        _claims_cache.popitem(last=False)
+    return claims
+
+
+def _user_from_claims(claims: dict) -> CurrentUser:
+    try:
+        user_id = int(claims["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise JWTError("invalid sub")
+    return CurrentUser(user_id, **{k: claims.get(k) for k in _PROFILE_CLAIMS})
+
 
-# 本来はJWT検証など。暫定で常に user_id=1 を返す。
-async def get_current_user() -> CurrentUser:
-    return CurrentUser(user_id=1)
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+) -> Optional[CurrentUser]:
+    if credentials is None:
+        return None
+    try:
+        return _user_from_claims(decode_token(credentials.credentials))
+    except JWTError:
+        # トークンが付いているのに不正なら、未ログイン扱いにせず 401
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
 
 
+async def get_current_user(user: Optional[CurrentUser] = Depends(get_optional_user)) -> CurrentUser:
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
@@ -0,0 +1,142 @@
+# app/services/spot_summaries.py
+"""
+寄り道候補の短い説明文（spot_summaries キャッシュ + Gemini 要約）。
+routes/detours.py から切り出し、検索パイプラインの enrich ステージで使う。
+"""
+import json
+import re
+import httpx
+import orjson
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.detour_suggestion import SpotSummary
+from app.services import rate_limit, resilience
+
+# --- summaries helper ---------------------------------------------------
+def summary_get(db: Session, source: str, source_id: str):
+    return db.execute(
+        select(SpotSummary).where(
+            SpotSummary.source == source,
+            SpotSummary.source_id == source_id
+        )
+    ).scalar_one_or_none()
+
+def summary_upsert(
+    db: Session, *, source: str, source_id: str, name: str, lat: float, lng: float,
+    short_text: str | None, long_text: str | None, provider: str = "gemini-1.5-flash", lang: str = "ja",
+    tokens: int | None = None
+):
+    row = summary_get(db, source, source_id)
+    if row is None:
+        row = SpotSummary(
+            source=source, source_id=source_id, name=name, lat=lat, lng=lng,
+            short_text_ja=short_text, long_text_ja=long_text, provider=provider, lang=lang, tokens=tokens
+        )
+        db.add(row)
+    else:
+        # 既存が空なら更新（上書きしすぎない運用）
+        row.short_text_ja = short_text or row.short_text_ja
+        row.long_text_ja  = long_text  or row.long_text_ja
+        row.provider = provider
+        row.lang = lang
+        row.tokens = tokens if tokens is not None else row.tokens
+    db.commit()
+    return row
+
+# --- Gemini mini summarizer (hardened) -----------------------------
+GEMINI_API_KEY = settings.gemini_api_key
+GEMINI_MODEL = settings.gemini_model
+GEMINI_BASE = settings.gemini_base_url.rstrip("/")
+
+_GEMINI_SYSTEM = (
+    "あなたは観光&グルメ案内のプロ編集者です。"
+    "以下の店舗の魅力を日本語で簡潔に要約してください。誇張は避け、事実ベースで。"
+    "出力は必ずJSONのみ。コードブロックや```は使わない。前置きの文章も不要。\n"
+    "{\n"
+    '  "short": "50文字以内の短い説明",\n'
+    '  "long": "120〜200文字の詳しい説明"\n'
+    "}\n"
+)
+
+def _gemini_place_prompt(name: str, address: str | None, category: str | None) -> str:
+    return (
+        f"店舗名: {name}\n"
+        f"住所: {address or '不明'}\n"
+        f"カテゴリ: {category or '不明'}\n\n"
+        "注意:\n"
+        "- 「〜です。」調で。\n"
+        "- 固有名詞の誤りを避ける。\n"
+        "- 営業時間や価格は推測で断言しない。\n"
+        "- 宣伝過多の表現や記号装飾は避ける。\n"
+        "- 出力はJSON本文のみ。コードフェンスや語りは一切不要。\n"
+    )
+
+def _extract_json_block(text: str) -> str | None:
+    # ```json 〜 ``` を剥がす／先頭末尾のゴミを除いて { ... } を抽出
+    text = text.strip()
+    # コードフェンス除去
+    if text.startswith("```"):
+        text = re.sub(r"^```[a-zA-Z]*\s*", "", text)
+        text = re.sub(r"\s*```$", "", text)
+    # 最初の { から最後の } までを貪欲に取得
+    m = re.search(r"\{.*\}", text, re.DOTALL)
+    return m.group(0) if m else None
+
+def _truncate(s: str, n: int) -> str:
+    s = s.replace("\n", " ").strip()
+    return s[:n]
+
+async def gemini_summarize_place(name: str, address: str | None = None, category: str | None = None) -> dict:
+    if not GEMINI_API_KEY:
+        return {"short": None, "long": None, "tokens": None, "error": "GEMINI_API_KEY not set"}
+
+    url = f"{GEMINI_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    payload = {
+        "contents": [{
+            "role": "user",
+            "parts": [{"text": _GEMINI_SYSTEM + "\n\n" + _gemini_place_prompt(name, address, category)}]
+        }],
+        "generationConfig": {"temperature": 0.5, "maxOutputTokens": 256}
+    }
+
+    try:
+        async with httpx.AsyncClient(timeout=30) as client:
+            async def _post():
+                r = await client.post(url, json=payload)
+                if r.status_code == 429:
+                    rate_limit.backoff("gemini", GEMINI_API_KEY)
+                r.raise_for_status()
+                return r
+
+            await rate_limit.acquire("gemini", GEMINI_API_KEY)
+
+            # 観測 p99 から決めたタイムアウトで打ち切り、障害中はサーキットで即スキップ
+            r = await resilience.call("gemini", _post)
+            data = orjson.loads(r.content)
+
+        raw = data["candidates"][0]["content"]["parts"][0]["text"]
+        raw = raw.strip()
+
+        # JSON抽出を頑強に
+        json_str = _extract_json_block(raw) or raw
+        short = long_ = None
+        try:
+            obj = json.loads(json_str)
+            short = (obj.get("short") or "").strip() or None
+            long_ = (obj.get("long") or "").strip() or None
+        except Exception:
+            # JSONパースできない場合はヒューリスティックで短文作成
+            short = _truncate(raw, 50) or None
+            long_  = _truncate(raw, 200) or None
+
+        tokens = (data.get("usageMetadata") or {}).get("totalTokenCount")
+        # カード用 short は念のため50字に丸める
+        if short:
+            short = _truncate(short, 50)
+        return {"short": short, "long": long_, "tokens": tokens, "error": None}
+
+    except httpx.HTTPError as e:
+        return {"short": None, "long": None, "tokens": None, "error": f"HTTPError: {e}"}
+    except Exception as e:
+        return {"short": None, "long": None, "tokens": None, "error": f"Error: {e}"}
@@ -1,6 +1,4 @@
-from dotenv import load_dotenv
-load_dotenv()
-
+import logging
 import os
 import uuid
 import pathlib
@@ -8,22 +6,24 @@ import re
 from typing import Tuple
 
 from anyio import to_thread  # ← 追加（非同期で同期APIを呼ぶ）
-from google.cloud import texttospeech  # ← 追加
-
-# GOOGLE_APPLICATION_CREDENTIALS を環境変数に設定（パス補正付き）
-cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
-# 🔽 ここを追加！
-print("★ cred_path (raw) >>", cred_path)
+from app.core import metrics
+from app.core.config import settings
 
-if cred_path and not os.path.isabs(cred_path):
-    cred_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", cred_path))
+logger = logging.getLogger(__name__)
 
-# 🔽 絶対パスに変換後の確認も追加！
-print("★ cred_path (absolute) >>", cred_path)
-print("★ os.path.exists(cred_path) >>", os.path.exists(cred_path))
+# google-cloud-texttospeech は import もクライアント生成も重いので、最初の合成時に1回だけ作る。
+# GOOGLE_APPLICATION_CREDENTIALS の相対→絶対の解決は main.py（ensure_adc の後）で済ませている。
+_tts = None
+_tts_client = None
 
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = cred_path
+def _get_tts():
+    global _tts, _tts_client
+    if _tts_client is None:
+        from google.cloud import texttospeech
+        _tts = texttospeech
+        _tts_client = texttospeech.TextToSpeechClient()
+    return _tts, _tts_client
 
 def clean_guide_text_for_tts(text: str) -> str:
     """
@@ -46,7 +46,7 @@ def clean_guide_text_for_tts(text: str) -> str:
 
 
 
-MEDIA_DIR = os.getenv("MEDIA_ROOT", "./media")
+MEDIA_DIR = settings.media_root
 GUIDE_DIR = pathlib.Path(MEDIA_DIR) / "guides"
 GUIDE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -90,6 +90,9 @@ async def synthesize_to_mp3(text: str, voice: str | None = None) -> Tuple[str, s
     戻り値: (local_file_path, public_url)
     - 失敗時は .txt を保存して必ずURLを返す（既存互換）
     """
+    if not settings.tts_enabled:
+        return _save_text_fallback(text)  # TTS_ENABLED=false（ローカル / ベンチマーク）
+
     filename = f"{uuid.uuid4()}.mp3"
     out_path = GUIDE_DIR / filename
     url = f"/media/guides/{filename}"
@@ -97,7 +100,7 @@ async def synthesize_to_mp3(text: str, voice: str | None = None) -> Tuple[str, s
     cleaned_text = clean_guide_text_for_tts(text)
 
     def _call_gcp_tts():
-        client = texttospeech.TextToSpeechClient()
+        texttospeech, client = _get_tts()
 
         # SSMLで渡す（自然さ向上・調整しやすい）
         input_ = texttospeech.SynthesisInput(ssml=_build_ssml_from_text(cleaned_text))
@@ -125,19 +128,24 @@ async def synthesize_to_mp3(text: str, voice: str | None = None) -> Tuple[str, s
         return response.audio_content
 
     try:
-        audio_content = await to_thread.run_sync(_call_gcp_tts)
+        with metrics.span("outbound", "tts"):
+            audio_content = await to_thread.run_sync(_call_gcp_tts)
         with open(out_path, "wb") as f:
             f.write(audio_content)
         return str(out_path), url
 
     except Exception as e:
         # フォールバック：txt保存（既存挙動と同じ）
-        print("TTS ERROR (GCP):", repr(e))
-        fallback = f"{uuid.uuid4()}.txt"
-        out_txt = GUIDE_DIR / fallback
-        url_txt = f"/media/guides/{fallback}"
-        try:
-            out_txt.write_text(text, encoding="utf-8")
-        except Exception:
-            pass
-        return str(out_txt), url_txt
\ No newline at end of file
+        logger.warning("tts error (GCP), falling back to txt", extra={"ex": repr(e)})
+        return _save_text_fallback(text)
+
+
+def _save_text_fallback(text: str) -> Tuple[str, str]:
+    fallback = f"{uuid.uuid4()}.txt"
+    out_txt = GUIDE_DIR / fallback
+    url_txt = f"/media/guides/{fallback}"
+    try:
+        out_txt.write_text(text, encoding="utf-8")
+    except Exception:
+        pass
+    return str(out_txt), url_txt
\ No newline at end of file
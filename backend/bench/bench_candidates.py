@@ -0,0 +1,120 @@
+"""
+検索 1 回あたりの候補処理（normalize → dedupe → filter → rank → serialize）の CPU とメモリ。
+
+sources だけは bench/stub_server の fixtures から実際のプロバイダコード
+（google_nearby / yolp_places / connpass_events）で1回取り、その候補リストを複製して
+残りのステージを n 回まわす。enrich（DB / Gemini）は含めない。
+
+- retained: sources が返した候補リストの入れ物（候補オブジェクト・list・dict）の大きさ。
+            文字列や数値そのものは表現によらず同じなので数えない
+- peak:     ステージ実行中の追加メモリのピーク（DetourSuggestion を含む）
+- top-k=all の行は「全候補を pydantic にする」場合の比較用
+
+使い方（backend/ で実行）:
+    python -m bench.bench_candidates
+    python -m bench.bench_candidates -n 500 --types food,event
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import dataclasses
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+from bench.bench_endpoints import ORIGIN, _env_for
+from bench.stub_server import StubServer
+
+STAGE_NAMES = ("normalize", "dedupe", "filter", "rank", "serialize")
+
+
+def _kib(n: int) -> float:
+    return n / 1024
+
+
+def _struct_bytes(obj) -> int:
+    """入れ物だけの合計サイズ（dict / list / tuple / __slots__ のオブジェクトをたどる）。"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        children = obj.values()
+    elif isinstance(obj, (list, tuple)):
+        children = obj
+    elif dataclasses.is_dataclass(obj):
+        children = [getattr(obj, f.name) for f in dataclasses.fields(obj)]
+    else:
+        return 0 if isinstance(obj, (str, int, float, bool, type(None))) else size
+    return size + sum(_struct_bytes(c) for c in children)
+
+
+async def _bench_type(detour_type: str, n: int, top_ks: List[int]) -> None:
+    from app.schemas.detour import DetourSearchQuery
+    from app.services import detour_pipeline as P
+
+    lat, lng = ORIGIN
+    query = DetourSearchQuery(lat=lat, lng=lng, minutes=15, mode="walk", detour_type=detour_type)
+    ctx = P.SearchContext.build(query, db=None)
+    await P.stage_sources(ctx)
+    base = ctx.candidates
+
+    retained = _struct_bytes(base)
+
+    stages = [dict(P.STAGES)[s] for s in STAGE_NAMES]
+    for top_k in top_ks:
+        copies = [copy.deepcopy(base) for _ in range(n + 1)]
+
+        def one(cands) -> int:
+            c = dataclasses.replace(ctx, candidates=cands, results=[], timings={}, top_k=top_k)
+            for stage in stages:
+                stage(c)
+            return len(c.results)
+
+        one(copies.pop())  # 初回のスキーマ構築などは除く
+        t0 = time.process_time()
+        for cands in copies:
+            out = one(cands)
+        cpu_us = (time.process_time() - t0) / n * 1e6
+
+        cands = copy.deepcopy(base)
+        tracemalloc.start()
+        one(cands)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        label = "all" if top_k >= len(base) else str(top_k)
+        print(f"{detour_type:<9} cands={len(base):4d}  top-k={label:>3} (out={out:3d})  "
+              f"cpu={cpu_us:8.1f}us/search  retained={_kib(retained):7.1f}KiB  peak={_kib(peak):7.1f}KiB")
+
+
+async def run(args) -> None:
+    from app.services.poi_store import get_poi_store
+
+    get_poi_store()  # POI_IMPORT_PATH の読み込みを計測から外す
+    for t in [t.strip() for t in args.types.split(",") if t.strip()]:
+        await _bench_type(t, args.n, [args.top_k, 1 << 30] if args.compare_all else [args.top_k])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200, help="繰り返し回数")
+    ap.add_argument("--types", default="food,spot,event")
+    ap.add_argument("--top-k", type=int, default=3)
+    ap.add_argument("--no-compare-all", dest="compare_all", action="store_false",
+                    help="全候補を pydantic にする比較行を出さない")
+    ap.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubServer(args.port, latency={p: "fixed:0" for p in ("google", "yolp", "gemini", "openai")}) as stub:
+        os.environ.update(_env_for(stub.url, workdir))
+        print(f"n={args.n} (enrich は含まない)")
+        asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+主要エンドポイントの負荷ベンチマーク（外部APIは bench/stub_server の記録済みレスポンスで置き換える）。
+
+/detour/search・/visits/・/places/predictions を同時 c 本で n 回ずつ叩き、
+スループットと p50/p95/p99 をエンドポイントごとに出す。実 API・実 DB には触らない
+（一時 SQLite、GCP TTS は TTS_ENABLED=false で txt フォールバック）。
+
+使い方（backend/ で実行）:
+    python -m bench.bench_endpoints                              # 各 200 回 / 同時 20
+    python -m bench.bench_endpoints -n 500 -c 50 --endpoints search,predictions
+    python -m bench.bench_endpoints --latency openai=fixed:200 --latency google=lognormal:150,0.6
+    python -m bench.bench_endpoints --json bench.json            # 結果を保存
+    python -m bench.bench_endpoints --baseline bench.json        # p95 が 25% 以上悪化したら exit 1
+    python -m bench.bench_endpoints --target http://127.0.0.1:8000   # 起動済みのサーバを叩く
+                                                                 # （サーバ側の *_BASE_URL はスタブに向けておく）
+
+既定ではアプリを ASGI のまま同じプロセスで動かす（uvicorn / ネットワークの分は含まない）。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import httpx
+
+from bench.stub_server import StubServer, latency_args
+
+ORIGIN = (35.681236, 139.767125)  # fixtures を記録した地点（東京駅）
+SEED_PLACE_ID = "ChIJbench0000pred"
+PREDICTION_INPUTS = [
+    "東京", "東京駅", "東京タワー", "丸の内", "八重洲", "日本橋", "京橋", "有楽町", "銀座", "大手町",
+    "神田", "秋葉原", "皇居", "国際フォーラム", "KITTE", "丸ビル", "新丸ビル", "東京ミッドタウン", "日比谷", "築地",
+    "とうきょう", "まるのうち", "やえす", "にほんばし", "ぎんざ", "Tokyo", "Tokyo Station", "Marunouchi", "Ginza", "Nihonbashi",
+]
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+def _env_for(stub_url: str, workdir: str) -> Dict[str, str]:
+    """アプリを import する前に入れる環境変数（外部はすべてスタブ、DB は一時 SQLite）。"""
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "MIGRATION_MODE": "upgrade",
+        "MEDIA_ROOT": os.path.join(workdir, "media"),
+        "RUNTIME_SETTINGS_PATH": os.path.join(workdir, "runtime_settings.json"),
+        "LOG_LEVEL": "WARNING",
+        "USE_GOOGLE_PLACES": "true",
+        "GOOGLE_MAPS_API_KEY": "bench",
+        "YOLP_APP_ID": "bench",
+        "GEMINI_API_KEY": "bench",
+        "OPENAI_API_KEY": "bench",
+        "GOOGLE_MAPS_BASE_URL": stub_url,
+        "YOLP_BASE_URL": stub_url,
+        "GEMINI_BASE_URL": stub_url,
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "TTS_ENABLED": "false",
+        "JWT_SECRET_KEY": "bench",
+    }
+    # クライアント側レート制限で詰まらないようにする（測りたいのはアプリ自身）
+    for p in ("GOOGLE", "YOLP", "GEMINI", "OPENAI"):
+        env[f"RATE_LIMIT_{p}_QPS"] = "100000"
+        env[f"RATE_LIMIT_{p}_BURST"] = "100000"
+    return env
+
+
+# ---- エンドポイントごとのリクエスト ----------------------------------------
+def _search(client: httpx.AsyncClient, rng: random.Random):
+    lat, lng = ORIGIN
+    return client.get("/detour/search", params={
+        "lat": lat + rng.uniform(-0.001, 0.001),
+        "lng": lng + rng.uniform(-0.001, 0.001),
+        "mode": "walk",
+        "minutes": rng.choice([10, 15, 20]),
+        "detour_type": rng.choice(["food", "spot"]),
+    })
+
+
+def _visits(client: httpx.AsyncClient, rng: random.Random):
+    return client.post("/visits/", json={"destinationId": SEED_PLACE_ID})
+
+
+def _predictions(client: httpx.AsyncClient, rng: random.Random):
+    return client.get("/places/predictions", params={
+        "input": rng.choice(PREDICTION_INPUTS),
+        "session_token": f"bench-{rng.randrange(1 << 30)}",
+    })
+
+
+ENDPOINTS: Dict[str, tuple] = {
+    "search": ("GET /detour/search", _search),
+    "visits": ("POST /visits/", _visits),
+    "predictions": ("GET /places/predictions", _predictions),
+}
+
+
+async def _drive(client: httpx.AsyncClient, make: Callable, n: int, concurrency: int,
+                 warmup: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    for _ in range(warmup):
+        await make(client, rng)
+
+    sem = asyncio.Semaphore(concurrency)
+    lat: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                r = await make(client, rng)
+                ok = r.status_code < 400
+                key = str(r.status_code)
+            except Exception as ex:
+                ok, key = False, type(ex).__name__
+            lat.append((time.perf_counter() - t0) * 1000)
+            if not ok:
+                errors[key] = errors.get(key, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "n": n,
+        "errors": errors,
+        "rps": round(n / elapsed, 1),
+        "p50_ms": round(_pct(lat, 0.50), 1),
+        "p95_ms": round(_pct(lat, 0.95), 1),
+        "p99_ms": round(_pct(lat, 0.99), 1),
+        "max_ms": round(max(lat), 1) if lat else 0.0,
+    }
+
+
+async def _seed(client: httpx.AsyncClient) -> None:
+    """/visits/ 用の destination を1件登録しておく（details はスタブから返る）。"""
+    r = await client.post("/destinations/register", params={"place_id": SEED_PLACE_ID})
+    if r.status_code >= 400:
+        raise RuntimeError(f"seed failed: {r.status_code} {r.text}")
+
+
+async def run(args, stub_url: str) -> Dict[str, dict]:
+    names = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(names) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"unknown endpoints: {sorted(unknown)}")
+
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=60)
+        app = None
+    else:
+        from app.main import app
+
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results: Dict[str, dict] = {}
+    try:
+        if "visits" in names:
+            await _seed(client)
+        for name in names:
+            label, make = ENDPOINTS[name]
+            results[name] = await _drive(client, make, args.n, args.concurrency, args.warmup, args.seed)
+            r = results[name]
+            err = sum(r["errors"].values())
+            print(f"{label:<26} {r['rps']:8.1f} req/s  p50={r['p50_ms']:8.1f}ms  p95={r['p95_ms']:8.1f}ms  "
+                  f"p99={r['p99_ms']:8.1f}ms  max={r['max_ms']:8.1f}ms  errors={err}"
+                  + (f" {r['errors']}" if err else ""))
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], max_regression: float) -> List[str]:
+    """p95 と req/s が baseline から max_regression 以上悪化したエンドポイントを返す。"""
+    bad = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        if b["p95_ms"] > 0 and r["p95_ms"] > b["p95_ms"] * (1 + max_regression):
+            bad.append(f"{name}: p95 {b['p95_ms']}ms -> {r['p95_ms']}ms")
+        if b["rps"] > 0 and r["rps"] < b["rps"] * (1 - max_regression):
+            bad.append(f"{name}: rps {b['rps']} -> {r['rps']}")
+        if sum(r["errors"].values()) > sum(b["errors"].values()):
+            bad.append(f"{name}: errors {b['errors']} -> {r['errors']}")
+    return bad
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200, help="エンドポイントごとのリクエスト数")
+    ap.add_argument("-c", "--concurrency", type=int, default=20)
+    ap.add_argument("--warmup", type=int, default=5, help="計測前に捨てるリクエスト数")
+    ap.add_argument("--endpoints", default="search,visits,predictions")
+    ap.add_argument("--latency", action="append", help="スタブの遅延 provider=spec（bench/stub_server.py 参照）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="スタブが 503 を返す割合")
+    ap.add_argument("--port", type=int, default=8765, help="スタブサーバのポート")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--target", help="起動済みサーバの URL（省略時は同一プロセスで ASGI 実行）")
+    ap.add_argument("--json", help="結果を JSON で保存するパス")
+    ap.add_argument("--baseline", help="比較する過去の --json 出力")
+    ap.add_argument("--max-regression", type=float, default=0.25)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            StubServer(args.port, latency=latency_args(args.latency), seed=args.seed,
+                       error_rate=args.error_rate) as stub:
+        if not args.target:
+            os.environ.update(_env_for(stub.url, workdir))
+            os.makedirs(os.path.join(workdir, "media", "guides"), exist_ok=True)
+        print(f"n={args.n} concurrency={args.concurrency} stub={stub.url} target={args.target or 'in-process'}")
+        results = asyncio.run(run(args, stub.url))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            bad = compare(results, json.load(f), args.max_regression)
+        for line in bad:
+            print(f"REGRESSION {line}")
+        return 1 if bad else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+検索 1 リクエストあたりの JSON 処理 CPU（標準 json 経路 vs orjson / pydantic 直書き経路）。
+
+/detour/search 1 回で発生する JSON 処理を fixtures から再現して比べる:
+- デコード: YOLP localSearch（results=50）× シード数 + Google Nearby × type 数
+  旧: httpx の r.json()（text へのデコード + json.loads） / 新: orjson.loads(r.content)
+- エンコード: DetourSuggestion × top-k
+  旧: response_model 経由（検証 → jsonable_encoder → json.dumps）
+  新: TypeAdapter.dump_json（routes/detours.py と同じ）
+- 保持メモリ: 全レスポンスをデコードしたまま抱えた場合（gather が返す時点）の大きさ
+  dict ツリーのまま / payloads.parse_* で必要な項目だけ写し取った場合
+
+使い方（backend/ で実行）:
+    python -m bench.bench_json                     # 既定: YOLP 8 本 + Google 3 本、top-k 3
+    python -m bench.bench_json --yolp 2 --google 1 --top-k 50 -n 500
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+import httpx
+import orjson
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from app.schemas.detour import DetourSuggestion
+from app.services.payloads import parse_nearby, parse_yolp
+from bench.stub_server import FIXTURES
+
+
+def _body(name: str) -> bytes:
+    return (FIXTURES / f"{name}.json").read_bytes()
+
+
+def _suggestions(k: int) -> List[DetourSuggestion]:
+    nearby = json.loads(_body("google_nearby"))["results"]
+    out = []
+    for i in range(k):
+        r = nearby[i % len(nearby)]
+        loc = r["geometry"]["location"]
+        out.append(DetourSuggestion(
+            id=f"00000000-0000-0000-0000-{i:012d}",
+            name=r["name"],
+            description=f"{r['name']}は周辺で立ち寄りやすい場所です。",
+            lat=loc["lat"], lng=loc["lng"],
+            distance_km=0.42, duration_min=6, eta_text="徒歩約6分・420m",
+            source="google", detour_type="food",
+            url=f"https://www.google.com/maps/place/?q=place_id:{r['place_id']}",
+            rating=r.get("rating"), open_now=True,
+            photo_url="https://maps.googleapis.com/maps/api/place/photo?maxwidth=800&photo_reference=x",
+            created_at="2026-01-01T00:00:00",
+        ))
+    return out
+
+
+def _cpu_us(fn: Callable[[], object], n: int) -> float:
+    fn()  # 初回のスキーマ構築などは除く
+    t0 = time.process_time()
+    for _ in range(n):
+        fn()
+    return (time.process_time() - t0) / n * 1e6
+
+
+def _retained_kib(fn: Callable[[], object]) -> float:
+    """fn() の戻り値が抱えているメモリ（KiB）。"""
+    tracemalloc.start()
+    try:
+        kept = fn()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size / 1024
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=300, help="繰り返し回数")
+    ap.add_argument("--yolp", type=int, default=8, help="YOLP のシード数（1 リクエストあたりの本数）")
+    ap.add_argument("--google", type=int, default=3, help="Google Nearby の type 数")
+    ap.add_argument("--top-k", type=int, default=3)
+    args = ap.parse_args()
+
+    yolp, google = _body("yolp_local"), _body("google_nearby")
+    bodies = [yolp] * args.yolp + [google] * args.google
+    responses = [httpx.Response(200, content=b, headers={"content-type": "application/json"}) for b in bodies]
+
+    def decode_std():
+        for r in responses:
+            r._text = None  # r.text のキャッシュを消して毎回デコードさせる
+            r.json()
+
+    def decode_orjson():
+        for r in responses:
+            orjson.loads(r.content)
+
+    items = _suggestions(args.top_k)
+    field = create_response_field(name="Response_search", type_=List[DetourSuggestion])
+    adapter = TypeAdapter(List[DetourSuggestion])
+
+    def encode_std():
+        content = asyncio.run(serialize_response(field=field, response_content=items, is_coroutine=True))
+        json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def encode_pydantic():
+        adapter.dump_json(items, by_alias=True)
+
+    def project():
+        return [parse_yolp(b) for b in bodies[:args.yolp]] + [parse_nearby(b) for b in bodies[args.yolp:]]
+
+    def encode_noop():
+        asyncio.run(asyncio.sleep(0))  # asyncio.run 自体のコストを差し引く
+
+    kb = sum(len(b) for b in bodies) / 1024
+    print(f"decode: {args.yolp} yolp + {args.google} google bodies ({kb:.0f} KiB)  encode: top-k={args.top_k}  n={args.n}")
+    dec_old, dec_new = _cpu_us(decode_std, args.n), _cpu_us(decode_orjson, args.n)
+    enc_old = _cpu_us(encode_std, args.n) - _cpu_us(encode_noop, args.n)
+    enc_new = _cpu_us(encode_pydantic, args.n)
+    proj = _cpu_us(project, args.n)
+    rows = [("decode", dec_old, dec_new), ("encode", enc_old, enc_new),
+            ("total / request", dec_old + enc_old, dec_new + enc_new)]
+    for label, old, new in rows:
+        print(f"{label:<16} json={old:9.1f}us  fast={new:9.1f}us  saved={old - new:9.1f}us ({old / max(new, 1e-9):.1f}x)")
+    full = _retained_kib(lambda: [orjson.loads(b) for b in bodies])
+    slim = _retained_kib(project)
+    print(f"{'decode+project':<16} {proj:9.1f}us  retained: dicts={full:7.0f}KiB  records={slim:7.0f}KiB "
+          f"({full / max(slim, 1e-9):.1f}x smaller)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+ログイン（bcrypt 照合）のスループットと、同時に動く threadpool 処理への影響を測る。
+
+旧: passlib の verify を FastAPI の共有スレッドプール（anyio）で実行
+新: app.services.passwords（専用プロセスプール）
+
+使い方（backend/ で実行）:
+    python -m bench.bench_login                     # 200 ログイン / 同時 50 / rounds=12
+    python -m bench.bench_login -n 400 -c 100 -r 10
+    python -m bench.bench_login --workers 4          # PASSWORD_HASH_WORKERS 相当
+
+probe は「DB 呼び出し」を模した 1ms の threadpool 処理。ログイン中にこれがどれだけ待たされるかを見る。
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from anyio import to_thread
+
+from app.core.config import settings
+from app.services import passwords
+
+PASSWORD = "correct horse battery staple"
+
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+async def _probe(stop: asyncio.Event, out: List[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await to_thread.run_sync(time.sleep, 0.001)
+        out.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def _run(label: str, verify: Callable[[], Awaitable[bool]], n: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    lat: List[float] = []
+    probe: List[float] = []
+
+    async def one():
+        async with sem:
+            t0 = time.perf_counter()
+            assert await verify()
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(_probe(stop, probe))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    dt = time.perf_counter() - t0
+    stop.set()
+    await probe_task
+    print(
+        f"{label:<8} {n / dt:7.1f} logins/s  "
+        f"login p50={statistics.median(lat):7.1f}ms p99={_pct(lat, 0.99):7.1f}ms  "
+        f"probe p50={statistics.median(probe):6.1f}ms p99={_pct(probe, 0.99):7.1f}ms"
+    )
+
+
+async def main_async(args) -> None:
+    hashed = passwords._hash(PASSWORD, args.rounds)
+
+    from passlib.context import CryptContext
+
+    ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+    async def old():
+        return await to_thread.run_sync(ctx.verify, PASSWORD, hashed)
+
+    async def new():
+        return await passwords.verify_password(PASSWORD, hashed)
+
+    settings.password_hash_workers = args.workers
+    passwords.start()
+    await passwords.verify_password(PASSWORD, hashed)  # 子プロセスの起動は計測外
+
+    print(f"n={args.n} concurrency={args.concurrency} rounds={args.rounds} workers={args.workers}")
+    await _run("thread", old, args.n, args.concurrency)
+    await _run("process", new, args.n, args.concurrency)
+    passwords.shutdown()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=200, help="ログイン回数")
+    ap.add_argument("-c", "--concurrency", type=int, default=50)
+    ap.add_argument("-r", "--rounds", type=int, default=12)
+    ap.add_argument("--workers", type=int, default=settings.password_hash_workers)
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
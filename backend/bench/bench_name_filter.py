@@ -0,0 +1,114 @@
+"""
+店舗名分類のベンチマーク（旧: 正規表現を毎回評価 / 新: name_filter）。
+
+使い方（backend/ で実行）:
+    python -m bench.bench_name_filter                 # 合成コーパス
+    python -m bench.bench_name_filter names.txt       # 1 行 1 件の POI 名コーパス
+    python -m bench.bench_name_filter names.txt -r 5  # 同じコーパスを 5 周（キャッシュ効果込み）
+
+実 POI 名のコーパスは YOLP/Google の Name を 1 行ずつ書き出したものを想定。
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+import unicodedata
+from typing import List
+
+from app.services import name_filter
+
+# ---- 旧実装（routes/detours.py + services/events.py の正規表現）----
+_OLD_CHAIN_RE = re.compile(
+    r"(マクドナルド|吉野家|スターバックス|ドトール|すき家|CoCo壱|サイゼ|ガスト|松屋|ミスタードーナツ|ケンタッキー|"
+    r"セブン-?イレブン|ファミリーマート|ローソン|コメダ|モスバーガー|バーガーキング|はま寿司|スシロー|くら寿司|かっぱ寿司|"
+    r"リンガーハット|王将|ココス|ビックカメラ|ヤマダ電機|ケーズデンキ|イオン|ユニクロ|無印良品)"
+)
+_OLD_CORP_RE = re.compile(
+    r"(株式会社|（株）|\(株\)|㈱|有限会社|（有）|\(有\)|㈲|合同会社|合名会社|合資会社|"
+    r"一般社団法人|一般財団法人|公益社団法人|公益財団法人)"
+)
+_OLD_CHAIN = r"(すき家|マクドナルド|吉野家|ガスト|コメダ|スタバ|ドトール|セブンイレブン|ローソン|ファミリーマート|サイゼリヤ|丸亀製麺|びっくりドンキー|ココイチ|はま寿司|スシロー|ユニクロ)"
+_OLD_CORP = re.compile(
+    r"(株式会社|有限会社|合同会社|合名会社|合資会社"
+    r"|本社|支店|営業所|センター|事務所|工場|ディーラー"
+    r"|（株）|\(株\)|㈱|㍿"
+    r"|（有）|\(有\)|㈲)"
+)
+
+
+def _old_clean(name: str) -> str:
+    s = unicodedata.normalize("NFKC", name)
+    s = re.sub(_OLD_CORP_RE, "", s)
+    s = re.sub(r"\s{2,}", " ", s).strip(" 　・,.-")
+    return s or name
+
+
+def _old(name: str) -> bool:
+    # detours: 表示名整形 + チェーン判定 / events: NFKC + 法人・チェーン判定
+    cleaned = _old_clean(name)
+    chain = bool(_OLD_CHAIN_RE.search(cleaned))
+    n = unicodedata.normalize("NFKC", name)
+    drop = bool(_OLD_CORP.search(n)) or bool(re.search(_OLD_CHAIN, n))
+    return chain or drop
+
+
+def _new(name: str) -> bool:
+    info = name_filter.classify(name)
+    return bool(info.categories & {"chain", "corp", "business"})
+
+
+# ---- コーパス ----
+_BRANCHES = ["渋谷店", "新宿東口店", "池袋西口店", "浅草雷門前店", "横浜駅前店", "梅田店", "天神店", "札幌すすきの店"]
+_LOCAL = ["喫茶ひだまり", "そば処 みやこ", "手打ちうどん まるや", "ベーカリー こむぎ", "居酒屋 たぬき", "鮨 竹",
+          "浅草寺", "上野東照宮", "谷中銀座商店街", "隅田川花火大会", "みなとみらいマルシェ", "下町ビアガーデン"]
+_PREFIX = ["", "株式会社", "㈱", "（有）", "ＣｏＣｏ壱番屋 "]
+
+
+def _synthetic(n: int, seed: int = 0) -> List[str]:
+    rnd = random.Random(seed)
+    brands = [w for w, _ in name_filter._load_patterns(name_filter.NAME_PATTERNS_PATH)]
+    out = []
+    for _ in range(n):
+        base = rnd.choice(brands) if rnd.random() < 0.3 else rnd.choice(_LOCAL)
+        out.append(f"{rnd.choice(_PREFIX)}{base} {rnd.choice(_BRANCHES)}")
+    return out
+
+
+def _run(label: str, fn, corpus: List[str], rounds: int) -> float:
+    t0 = time.perf_counter()
+    hits = 0
+    for _ in range(rounds):
+        for name in corpus:
+            hits += fn(name)
+    dt = time.perf_counter() - t0
+    per = dt / (len(corpus) * rounds) * 1e6
+    print(f"{label:<6} total={dt*1000:8.1f}ms  per_name={per:6.2f}us  hits={hits}")
+    return dt
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("corpus", nargs="?", help="1 行 1 件の POI 名ファイル")
+    ap.add_argument("-n", type=int, default=100_000, help="合成コーパスの件数")
+    ap.add_argument("-r", "--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = _synthetic(args.n)
+    print(f"corpus={len(corpus)} unique={len(set(corpus))} rounds={args.rounds}")
+
+    name_filter._automaton()  # 辞書ロードは計測外
+    old = _run("regex", _old, corpus, args.rounds)
+    name_filter.classify.cache_clear()
+    name_filter.normalize_name.cache_clear()
+    new = _run("ac", _new, corpus, args.rounds)
+    print(f"speedup x{old / new:.2f}  cache={name_filter.classify.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
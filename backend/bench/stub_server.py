@@ -0,0 +1,176 @@
+"""
+外部API（Google Places / YOLP / Gemini / OpenAI）のスタブサーバ。bench/fixtures の記録済みレスポンスを返す。
+
+- プロバイダごとに遅延分布を指定できる（fixed / uniform / normal / lognormal）
+- --record なら本物の API に中継し、返ってきた JSON を fixtures に保存する（キーは .env のものがそのまま使われる）
+- アプリ側は GOOGLE_MAPS_BASE_URL / YOLP_BASE_URL / GEMINI_BASE_URL をこのサーバに、
+  OPENAI_BASE_URL を <このサーバ>/v1 に向ける
+
+使い方（backend/ で実行）:
+    python -m bench.stub_server --port 8765
+    python -m bench.stub_server --latency google=lognormal:80,0.5 --latency yolp=uniform:30,120
+    python -m bench.stub_server --record          # fixtures を取り直す（実 API を叩く）
+
+遅延の書式: fixed:MS / uniform:LO,HI / normal:MEAN,SD / lognormal:MEDIAN,SIGMA（単位 ms）
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import pathlib
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / "fixtures"
+
+# (パス, メソッド) -> (プロバイダ, fixture 名, 実 API のベース URL)
+ROUTES = {
+    ("/maps/api/place/nearbysearch/json", "GET"): ("google", "google_nearby", "https://maps.googleapis.com"),
+    ("/maps/api/place/autocomplete/json", "GET"): ("google", "google_autocomplete", "https://maps.googleapis.com"),
+    ("/maps/api/place/details/json", "GET"): ("google", "google_details", "https://maps.googleapis.com"),
+    ("/search/local/V1/localSearch", "GET"): ("yolp", "yolp_local", "https://map.yahooapis.jp"),
+    ("/v1beta/models/{model}:generateContent", "POST"): ("gemini", "gemini_generate", "https://generativelanguage.googleapis.com"),
+    ("/v1/chat/completions", "POST"): ("openai", "openai_chat", "https://api.openai.com"),
+}
+
+# 実測に近い既定値（東京・平日昼の目安）
+DEFAULT_LATENCY = {
+    "google": "lognormal:90,0.35",
+    "yolp": "lognormal:60,0.4",
+    "gemini": "lognormal:900,0.3",
+    "openai": "lognormal:2500,0.25",
+}
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """"lognormal:80,0.5" → 遅延秒を返す関数。"""
+    kind, _, args = spec.partition(":")
+    nums = [float(x) for x in args.split(",") if x]
+    if kind == "fixed":
+        return lambda rng: nums[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(nums[0], nums[1]) / 1000
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(nums[0], nums[1])) / 1000
+    if kind == "lognormal":
+        mu = math.log(nums[0])
+        return lambda rng: rng.lognormvariate(mu, nums[1]) / 1000
+    raise ValueError(f"unknown latency spec: {spec!r}")
+
+
+def _load(name: str) -> dict:
+    return json.loads((FIXTURES / f"{name}.json").read_text(encoding="utf-8"))
+
+
+def build_app(latency: Optional[Dict[str, str]] = None, seed: int = 0, record: bool = False,
+              error_rate: float = 0.0) -> FastAPI:
+    specs = {**DEFAULT_LATENCY, **(latency or {})}
+    delays = {p: parse_latency(s) for p, s in specs.items()}
+    rng = random.Random(seed)
+    cache: Dict[str, dict] = {}
+    stats: Dict[str, int] = {}
+    app = FastAPI(title="provider stub")
+
+    def fixture(name: str) -> dict:
+        if name not in cache:
+            cache[name] = _load(name)
+        return cache[name]
+
+    async def _record(request: Request, base: str, name: str) -> dict:
+        url = base + request.url.path
+        async with httpx.AsyncClient(timeout=60) as cli:
+            r = await cli.request(request.method, url, params=request.query_params,
+                                  content=await request.body(),
+                                  headers={k: v for k, v in request.headers.items()
+                                           if k.lower() in ("authorization", "content-type")})
+        data = r.json()
+        (FIXTURES / f"{name}.json").write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        cache[name] = data
+        return data
+
+    def _handler(provider: str, name: str, base: str):
+        async def handle(request: Request):
+            stats[name] = stats.get(name, 0) + 1
+            if record:
+                return JSONResponse(await _record(request, base, name))
+            await asyncio.sleep(delays[provider](rng))
+            if error_rate and rng.random() < error_rate:
+                return JSONResponse({"error": "stub injected failure"}, status_code=503)
+            data = fixture(name)
+            if name == "google_details" and request.query_params.get("place_id"):
+                # 要求された place_id をそのまま返す（details キャッシュのキーがばらけるように）
+                data = {**data, "result": {**data["result"], "place_id": request.query_params["place_id"]}}
+            return JSONResponse(data)
+
+        return handle
+
+    for (path, method), (provider, name, base) in ROUTES.items():
+        app.add_api_route(path, _handler(provider, name, base), methods=[method])
+
+    @app.get("/__stats")
+    def get_stats():
+        return stats
+
+    return app
+
+
+class StubServer:
+    """uvicorn を別スレッドで動かす（ベンチから with で使う）。"""
+
+    def __init__(self, port: int = 8765, **kwargs):
+        import uvicorn
+
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        config = uvicorn.Config(build_app(**kwargs), host="127.0.0.1", port=port, log_level="warning",
+                                access_log=False, lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="provider-stub", daemon=True)
+
+    def __enter__(self) -> "StubServer":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def latency_args(values) -> Dict[str, str]:
+    out = {}
+    for v in values or []:
+        provider, _, spec = v.partition("=")
+        parse_latency(spec)  # 書式チェック
+        out[provider] = spec
+    return out
+
+
+def main() -> None:
+    import uvicorn
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", action="append", help="provider=spec（複数可）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="503 を返す割合")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--record", action="store_true", help="実 API に中継して fixtures を保存する")
+    args = ap.parse_args()
+    app = build_app(latency_args(args.latency), seed=args.seed, record=args.record, error_rate=args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""baseline: 既存テーブル一式
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-10-19
+
+これまで init_db()（create_all）で作っていたテーブルをそのまま定義する。
+create_all 済みの既存 DB でもそのまま upgrade できるよう、既にあるテーブルは作らない。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(name: str) -> bool:
+    return name not in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade() -> None:
+    if _missing("destinations"):
+        op.create_table(
+            "destinations",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("place_id", sa.String(128), nullable=False),
+            sa.Column("name", sa.String(256), nullable=False),
+            sa.Column("address", sa.String(512), nullable=False),
+            sa.Column("lat", sa.Float(), nullable=False),
+            sa.Column("lng", sa.Float(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+            sa.UniqueConstraint("place_id", name="uq_dest_place_id"),
+        )
+        op.create_index("ix_destinations_place_id", "destinations", ["place_id"])
+
+    if _missing("visit_histories"):
+        op.create_table(
+            "visit_histories",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("user_id", sa.String(36), nullable=True),
+            sa.Column("destination_id", sa.String(36), sa.ForeignKey("destinations.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_visit_histories_user_id", "visit_histories", ["user_id"])
+        op.create_index("ix_visit_histories_destination_id", "visit_histories", ["destination_id"])
+
+    if _missing("guides"):
+        op.create_table(
+            "guides",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("destination_id", sa.String(36), sa.ForeignKey("destinations.id"), nullable=False),
+            sa.Column("visit_id", sa.String(36), sa.ForeignKey("visit_histories.id"), nullable=True),
+            sa.Column("guide_text", sa.Text(), nullable=False),
+            sa.Column("voice", sa.String(64), nullable=True),
+            sa.Column("style", sa.String(64), nullable=True),
+            sa.Column("audio_url", sa.String(512), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        )
+        op.create_index("ix_guides_destination_id", "guides", ["destination_id"])
+        op.create_index("ix_guides_visit_id", "guides", ["visit_id"])
+
+    if _missing("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("email", sa.String(255), nullable=False, unique=True),
+            sa.Column("hashed_password", sa.String(255), nullable=False),
+            sa.Column("name", sa.String(255), nullable=True),
+            sa.Column("gender", sa.String(10), nullable=True),
+            sa.Column("age_group", sa.String(50), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+
+    if _missing("detour_history"):
+        op.create_table(
+            "detour_history",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("detour_type", sa.String(20), nullable=False),
+            sa.Column("name", sa.String(200), nullable=False),
+            sa.Column("lat", sa.Float(), nullable=False),
+            sa.Column("lng", sa.Float(), nullable=False),
+            sa.Column("chosen_at", sa.DateTime(), nullable=False),
+            sa.Column("note", sa.String(300), nullable=True),
+        )
+        op.create_index("ix_detour_history_detour_type", "detour_history", ["detour_type"])
+
+    if _missing("detour_suggestions"):
+        op.create_table(
+            "detour_suggestions",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("detour_type", sa.String(20), nullable=False),
+            sa.Column("name", sa.String(256), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("lat", sa.Float(), nullable=False),
+            sa.Column("lng", sa.Float(), nullable=False),
+            sa.Column("distance_km", sa.Float(), nullable=False),
+            sa.Column("duration_min", sa.Integer(), nullable=False),
+            sa.Column("rating", sa.Float(), nullable=True),
+            sa.Column("open_now", sa.Boolean(), nullable=True),
+            sa.Column("opening_hours", sa.Text(), nullable=True),
+            sa.Column("parking", sa.String(64), nullable=True),
+            sa.Column("source", sa.String(32), nullable=False),
+            sa.Column("url", sa.String(512), nullable=True),
+            sa.Column("photo_url", sa.String(512), nullable=True),
+            sa.Column("chosen_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("note", sa.Text(), nullable=True),
+        )
+        op.create_index("ix_detour_suggestions_id", "detour_suggestions", ["id"])
+
+    if _missing("spot_summaries"):
+        op.create_table(
+            "spot_summaries",
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("source", sa.String(32), nullable=True),
+            sa.Column("source_id", sa.String(128), nullable=True),
+            sa.Column("name", sa.String(256), nullable=True),
+            sa.Column("lat", sa.Float(), nullable=True),
+            sa.Column("lng", sa.Float(), nullable=True),
+            sa.Column("short_text_ja", sa.String(120), nullable=True),
+            sa.Column("long_text_ja", sa.Text(), nullable=True),
+            sa.Column("provider", sa.String(64), nullable=True),
+            sa.Column("lang", sa.String(8), nullable=True),
+            sa.Column("tokens", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.UniqueConstraint("source", "source_id", name="uq_source_source_id"),
+        )
+        op.create_index("ix_spot_summaries_source", "spot_summaries", ["source"])
+        op.create_index("ix_spot_summaries_source_id", "spot_summaries", ["source_id"])
+
+
+def downgrade() -> None:
+    for name in (
+        "spot_summaries",
+        "detour_suggestions",
+        "detour_history",
+        "users",
+        "guides",
+        "visit_histories",
+        "destinations",
+    ):
+        op.drop_table(name)
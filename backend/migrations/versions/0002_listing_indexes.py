@@ -0,0 +1,35 @@
+"""一覧・最近の訪問先用の複合インデックス
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-10-19
+
+- destinations (created_at, id): /destinations/ のキーセットページング
+- visit_histories (user_id, created_at, destination_id): /visits/recent
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table: str, name: str) -> bool:
+    return any(ix["name"] == name for ix in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade() -> None:
+    # create_all で新規作成した DB には既にあるので、無いときだけ作る
+    if not _has_index("destinations", "ix_dest_created_id"):
+        op.create_index("ix_dest_created_id", "destinations", ["created_at", "id"])
+    if not _has_index("visit_histories", "ix_visit_user_created_dest"):
+        op.create_index(
+            "ix_visit_user_created_dest", "visit_histories", ["user_id", "created_at", "destination_id"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_visit_user_created_dest", table_name="visit_histories")
+    op.drop_index("ix_dest_created_id", table_name="destinations")
@@ -0,0 +1,94 @@
+"""detour_history にユーザーと月次集計を追加
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-10-19
+
+- detour_history.user_id + (user_id, chosen_at) インデックス
+- detour_history_monthly: ユーザー × 月の件数（choose_detour で加算）。
+  既存の履歴から GROUP BY で埋めておく（空のときだけ。行があると月次サマリは COUNT しないため）
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_column(table: str, name: str) -> bool:
+    return any(c["name"] == name for c in _inspector().get_columns(table))
+
+
+def _has_index(table: str, name: str) -> bool:
+    return any(ix["name"] == name for ix in _inspector().get_indexes(table))
+
+
+def _has_table(name: str) -> bool:
+    return _inspector().has_table(name)
+
+
+def _month_expr(col):
+    dialect = op.get_bind().dialect.name
+    if dialect == "mysql":
+        return sa.func.date_format(col, "%Y-%m")
+    if dialect == "postgresql":
+        return sa.func.to_char(col, "YYYY-MM")
+    return sa.func.strftime("%Y-%m", col)
+
+
+def _backfill_monthly() -> None:
+    monthly = sa.table(
+        "detour_history_monthly",
+        sa.column("user_id"), sa.column("month"), sa.column("detours"),
+        sa.column("minutes"), sa.column("updated_at"),
+    )
+    bind = op.get_bind()
+    if bind.execute(sa.select(sa.func.count()).select_from(monthly)).scalar():
+        return  # 既に加算が始まっている（create_all で作った DB など）
+    history = sa.table("detour_history", sa.column("user_id"), sa.column("chosen_at"))
+    month = _month_expr(history.c.chosen_at)
+    rows = (
+        sa.select(history.c.user_id, month, sa.func.count(), sa.literal(0), sa.func.current_timestamp())
+        .where(history.c.user_id.is_not(None))
+        .group_by(history.c.user_id, month)
+    )
+    bind.execute(monthly.insert().from_select(
+        ["user_id", "month", "detours", "minutes", "updated_at"], rows,
+    ))
+
+
+def upgrade() -> None:
+    # create_all で作った DB には既にあるので、無いものだけ作る（0001 / 0002 と同じ）
+    has_col = _has_column("detour_history", "user_id")
+    has_ix = _has_index("detour_history", "ix_detour_history_user_chosen")
+    if not (has_col and has_ix):
+        with op.batch_alter_table("detour_history") as batch:
+            if not has_col:
+                batch.add_column(sa.Column("user_id", sa.Integer(), nullable=True))
+            if not has_ix:
+                batch.create_index("ix_detour_history_user_chosen", ["user_id", "chosen_at"])
+
+    if not _has_table("detour_history_monthly"):
+        op.create_table(
+            "detour_history_monthly",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("month", sa.String(7), nullable=False),
+            sa.Column("detours", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("minutes", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("user_id", "month", name="pk_detour_history_monthly"),
+        )
+    _backfill_monthly()
+
+
+def downgrade() -> None:
+    op.drop_table("detour_history_monthly")
+    with op.batch_alter_table("detour_history") as batch:
+        batch.drop_index("ix_detour_history_user_chosen")
+        batch.drop_column("user_id")
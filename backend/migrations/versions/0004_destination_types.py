@@ -0,0 +1,31 @@
+"""destinations に Places の types を保存する
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-10-19
+
+- destinations.types: Places Details の types をカンマ区切りで保存（NULL は未取得の旧行）。
+  既定マスク（DETAILS_FIELDS）にも types が入るので、これが無いと DB から details を返せない
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table: str, name: str) -> bool:
+    return any(c["name"] == name for c in sa.inspect(op.get_bind()).get_columns(table))
+
+
+def upgrade() -> None:
+    if not _has_column("destinations", "types"):  # create_all で作った DB には既にある
+        with op.batch_alter_table("destinations") as batch:
+            batch.add_column(sa.Column("types", sa.String(512), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("destinations") as batch:
+        batch.drop_column("types")
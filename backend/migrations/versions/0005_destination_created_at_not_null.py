@@ -0,0 +1,44 @@
+"""destinations.created_at を NOT NULL にする
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-10-19
+
+- server_default より前の旧行には created_at が NULL のものがあり、一覧のキーセットカーソル
+  （crud.encode_cursor）が作れない。NULL は 2000-01-01 に埋め（新しい順の一覧では最後に並ぶ）、
+  以後 NULL を入れられないようにする
+"""
+import datetime as dt
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+LEGACY_CREATED_AT = dt.datetime(2000, 1, 1)
+
+
+def _nullable(table: str, name: str) -> bool:
+    cols = sa.inspect(op.get_bind()).get_columns(table)
+    return next(c["nullable"] for c in cols if c["name"] == name)
+
+
+def upgrade() -> None:
+    dest = sa.table("destinations", sa.column("created_at", sa.DateTime(timezone=True)))
+    op.execute(dest.update().where(dest.c.created_at.is_(None)).values(created_at=LEGACY_CREATED_AT))
+    if _nullable("destinations", "created_at"):  # 0001 / create_all で作った DB は元から NOT NULL
+        with op.batch_alter_table("destinations") as batch:
+            batch.alter_column(
+                "created_at",
+                existing_type=sa.DateTime(timezone=True),
+                existing_server_default=sa.func.now(),
+                nullable=False,
+            )
+
+
+def downgrade() -> None:
+    # 元のスキーマ（0001）も NOT NULL なので戻すものは無い
+    pass
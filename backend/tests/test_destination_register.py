@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.db import crud, models  # noqa: F401
+from app.db.database import Base, get_db
+from app.routes import destination_api
+from app.services import google_places as gp
+
+
+def _detail(pid):
+    return {
+        "place_id": pid,
+        "name": f"場所{pid}",
+        "formatted_address": "東京都千代田区",
+        "geometry": {"location": {"lat": 35.68, "lng": 139.76}},
+        "types": ["point_of_interest"],
+    }
+
+
+@pytest.fixture
+def env(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    calls = []
+
+    async def fake_details(pid, session_token=None, fields=None, db=None):
+        calls.append((pid, db is not None))
+        if db is not None:
+            row = db.query(models.Destination).filter_by(place_id=pid).first()
+            if row is not None:
+                return {**_detail(pid), "name": row.name}
+        return _detail(pid)
+
+    monkeypatch.setattr(gp, "details", fake_details)
+    app = FastAPI()
+    app.include_router(destination_api.router)
+    app.dependency_overrides[get_db] = lambda: db
+
+    def post(url, **kw):
+        async def go():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+                return await c.post(url, **kw)
+        return asyncio.run(go())
+
+    yield db, post, statements, calls
+    db.close()
+
+
+def test_bulk_does_not_reload_existing_rows_after_commit(env):
+    db, post, statements, _ = env
+    crud.upsert_destinations(db, [crud.destination_values(_detail(p)) for p in ("a", "b", "c")])
+    statements.clear()
+
+    r = post("/destinations/register/bulk", json={"placeIds": ["a", "b", "c", "d"]})
+
+    assert r.status_code == 201
+    assert [x["placeId"] for x in r.json()["items"]] == ["a", "b", "c", "d"]
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 2  # 既存の一括 SELECT + upsert 後の取り直し
+
+
+def test_register_uses_details_db_layer(env):
+    _, post, _, calls = env
+    r = post("/destinations/register", params={"place_id": "x"})
+    assert r.status_code == 201 and r.json()["placeId"] == "x"
+    assert calls == [("x", True)]
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.db import crud, models  # noqa: F401
+from app.db.database import Base
+from app.services import google_places as gp
+
+DETAIL = {
+    "place_id": "p1",
+    "name": "東京駅",
+    "formatted_address": "東京都千代田区丸の内1丁目",
+    "geometry": {"location": {"lat": 35.681236, "lng": 139.767125}},
+    "types": ["train_station", "transit_station"],
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(gp, "USE", True)
+    monkeypatch.setattr(gp, "KEY", "")  # Google に行こうとしたら RuntimeError
+    gp._details_cache.clear()
+    with Session(engine) as s:
+        yield s
+    gp._details_cache.clear()
+
+
+def test_default_mask_is_served_from_destinations(db):
+    crud.upsert_destinations(db, [crud.destination_values(DETAIL)])
+    assert asyncio.run(gp.details("p1", db=db)) == DETAIL
+
+
+def test_row_without_types_does_not_serve_default_mask(db):
+    crud.upsert_destinations(db, [{**crud.destination_values(DETAIL), "types": None}])
+    with pytest.raises(RuntimeError, match="GOOGLE_MAPS_API_KEY"):
+        asyncio.run(gp.details("p1", db=db))
+    fields = ("place_id", "name", "formatted_address", "geometry")
+    assert asyncio.run(gp.details("p1", fields=fields, db=db))["name"] == "東京駅"
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db import models  # noqa: F401
+from app.db.database import Base
+from app.models.detour_history import DetourHistory, DetourHistoryMonthly
+from app.services import history_buffer as hb
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(hb, "SessionLocal", factory)
+    monkeypatch.setattr(hb, "_pending", [])
+    monkeypatch.setattr(hb, "_stats", dict.fromkeys(hb._stats, 0))
+    return factory
+
+
+def _row(name, user_id=1):
+    return hb.event(user_id, "food", name, 35.68, 139.76)
+
+
+def test_bad_row_is_dropped_and_the_rest_written(session_factory):
+    hb._pending.extend([_row("a"), _row(None), _row("b")])  # name は NOT NULL
+
+    assert hb.flush() == 2
+    assert hb._pending == []
+    assert hb._stats["dropped"] == 1
+    with session_factory() as db:
+        assert sorted(db.scalars(select(DetourHistory.name))) == ["a", "b"]
+        assert db.scalar(select(func.sum(DetourHistoryMonthly.detours))) == 2
+
+
+def test_connection_error_keeps_the_batch(session_factory, monkeypatch):
+    def down(db, rows):
+        raise OperationalError("INSERT", {}, Exception("server has gone away"))
+
+    monkeypatch.setattr(hb, "write", down)
+    rows = [_row("a"), _row("b")]
+    hb._pending.extend(rows)
+
+    assert hb.flush() == 0
+    assert hb._pending == rows
+    assert hb._stats["dropped"] == 0
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from app.services import isochrone
+from app.services.geo import WALK_KMPH
+
+LAT0, LNG0 = 35.6732, 139.7505
+LAT_STEP, LNG_STEP, N = 0.0004, 0.0005, 41   # 約45m間隔の碁盤の目
+KM_PER_LAT_DEG = 111.32
+KM_PER_LNG_DEG = 111.32 * 0.8124             # cos(35.68°)
+
+
+@pytest.fixture
+def grid_graph(tmp_path, monkeypatch):
+    nodes = {f"{i},{j}": [LAT0 + i * LAT_STEP, LNG0 + j * LNG_STEP] for i in range(N) for j in range(N)}
+    edges = []
+    for i in range(N):
+        for j in range(N):
+            if i + 1 < N:
+                edges.append([f"{i},{j}", f"{i + 1},{j}", LAT_STEP * KM_PER_LAT_DEG * 1000, "both"])
+            if j + 1 < N:
+                edges.append([f"{i},{j}", f"{i},{j + 1}", LNG_STEP * KM_PER_LNG_DEG * 1000, "both"])
+    path = tmp_path / "graph.json"
+    path.write_text(json.dumps({"nodes": nodes, "edges": edges}))
+    monkeypatch.setattr(isochrone, "ISOCHRONE_GRAPH_PATH", str(path))
+    isochrone._load_graph.cache_clear()
+    isochrone._isochrone_for_node.cache_clear()
+    yield
+    isochrone._load_graph.cache_clear()
+    isochrone._isochrone_for_node.cache_clear()
+
+
+def test_polygon_is_centred_on_the_real_origin(grid_graph):
+    # 原点は約500m格子の中心（139.7625）から 150m 以上西のノード上
+    lat, lng = LAT0 + 20 * LAT_STEP, LNG0 + 20 * LNG_STEP
+    reach = WALK_KMPH * 5 / 60 / KM_PER_LNG_DEG
+    f = isochrone.reachability_filter(lat, lng, "walk", 5, fallback_km=0)
+    assert f.polygon is not None
+    y = lat + LAT_STEP / 4  # セクタ境界の真上を避ける
+    assert f.contains(y, lng - reach * 0.9)
+    assert f.contains(y, lng + reach * 0.9)
+    assert not f.contains(y, lng + reach * 1.5)
+    assert not f.contains(y, lng - reach * 1.5)
@@ -0,0 +1,58 @@
+from app.db import migrate
+
+
+def test_selftest_round_trips_on_sqlite():
+    assert migrate.selftest() == 0
+
+
+def test_0003_backfills_monthly_from_existing_history(tmp_path):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'bf.db'}")
+    with engine.begin() as conn:
+        migrate.upgrade("0002", conn)
+        # create_all で user_id 列だけ先にできていた DB
+        conn.execute(text("ALTER TABLE detour_history ADD COLUMN user_id INTEGER"))
+        for uid, ts in [(1, "2026-10-01 10:00:00"), (1, "2026-10-05 10:00:00"),
+                        (1, "2026-09-30 23:00:00"), (2, "2026-10-02 00:00:00"), (None, "2026-10-02 00:00:00")]:
+            conn.execute(text(
+                "INSERT INTO detour_history (user_id, detour_type, name, lat, lng, chosen_at)"
+                " VALUES (:u, 'food', 'x', 0, 0, :t)"
+            ), {"u": uid, "t": ts})
+    with engine.begin() as conn:
+        migrate.upgrade("head", conn)
+        rows = conn.execute(text(
+            "SELECT user_id, month, detours FROM detour_history_monthly ORDER BY user_id, month"
+        )).all()
+    engine.dispose()
+    assert [tuple(r) for r in rows] == [(1, "2026-09", 1), (1, "2026-10", 2), (2, "2026-10", 1)]
+
+
+def test_0005_fills_null_created_at_so_pages_advance(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from sqlalchemy.orm import Session
+
+    from app.db import crud
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # server_default が付く前に作られた destinations（created_at が NULL 可）
+        conn.execute(text(
+            "CREATE TABLE destinations (id VARCHAR(36) PRIMARY KEY, place_id VARCHAR(128) NOT NULL,"
+            " name VARCHAR(256) NOT NULL, address VARCHAR(512) NOT NULL, lat FLOAT NOT NULL,"
+            " lng FLOAT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP,"
+            " CONSTRAINT uq_dest_place_id UNIQUE (place_id))"
+        ))
+        conn.execute(text("INSERT INTO destinations VALUES ('a', 'p1', 'n', 'ad', 0, 0, NULL)"))
+        conn.execute(text("INSERT INTO destinations (id, place_id, name, address, lat, lng)"
+                          " VALUES ('b', 'p2', 'n', 'ad', 0, 0)"))
+    with engine.begin() as conn:
+        migrate.upgrade("head", conn)
+        col = next(c for c in inspect(conn).get_columns("destinations") if c["name"] == "created_at")
+        assert not col["nullable"]
+
+    with Session(engine) as db:
+        first, cursor = crud.list_destination_rows(db, 1)
+        second, end = crud.list_destination_rows(db, 1, cursor=cursor)
+    engine.dispose()
+    assert [r.id for r in first] == ["b"] and [r.id for r in second] == ["a"] and end is None
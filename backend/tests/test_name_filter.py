@@ -0,0 +1,13 @@
+from app.services.name_filter import classify, is_chain
+
+
+def test_short_brand_is_anchored_to_name_start():
+    assert is_chain("イオンモール幕張新都心")
+    assert is_chain("ｲｵﾝ 品川シーサイド店")
+    assert not is_chain("ライオン像前 もくもく会")
+    assert "chain" not in classify("カフェ ライオン").categories
+
+
+def test_unanchored_patterns_still_match_anywhere():
+    assert is_chain("マクドナルド 東京駅店")
+    assert is_chain("東京駅 マクドナルド")
@@ -0,0 +1,40 @@
+import asyncio
+import types
+
+import httpx
+import pytest
+
+from app.services import places_nearby, rate_limit, resilience
+
+
+@pytest.fixture
+def nearby(monkeypatch):
+    def serve(status, body=b"<html>error</html>"):
+        transport = httpx.MockTransport(lambda req: httpx.Response(status, content=body))
+        monkeypatch.setattr(places_nearby, "httpx", types.SimpleNamespace(
+            AsyncClient=lambda **kw: httpx.AsyncClient(transport=transport, **kw),
+        ))
+
+    async def no_wait(*a, **kw):
+        return None
+
+    monkeypatch.setattr(places_nearby, "GOOGLE_API", "k")
+    monkeypatch.setattr(rate_limit, "acquire", no_wait)
+    monkeypatch.setattr(resilience, "_providers", {})
+    return serve
+
+
+def test_server_error_counts_as_breaker_failure(nearby):
+    nearby(503)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(places_nearby.google_nearby(35.68, 139.76, 500, "event"))
+    assert resilience.provider("google_nearby").error_rate() == 1.0
+
+
+def test_rate_limited_response_backs_off(nearby, monkeypatch):
+    backed_off = []
+    monkeypatch.setattr(rate_limit, "backoff", lambda *a: backed_off.append(a))
+    nearby(429)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(places_nearby.google_nearby(35.68, 139.76, 500, "event"))
+    assert backed_off
@@ -0,0 +1,61 @@
+import asyncio
+
+from app.schemas.detour import DetourSearchQuery
+from app.services import detour_pipeline as P
+from app.services import poi_store
+from app.services.candidates import Candidate
+from app.services.poi_store import PoiStore, facet_key
+
+LAT, LNG = 35.681236, 139.767125
+
+
+async def _ok(ctx):
+    return [Candidate(name=f"店{i}", lat=LAT + i * 1e-4, lng=LNG) for i in range(5)]
+
+
+async def _boom(ctx):
+    raise RuntimeError("provider down")
+
+
+def _search(monkeypatch, sources):
+    store = PoiStore(ttl_sec=3600)
+    monkeypatch.setattr(P, "_SOURCES", sources)
+    monkeypatch.setattr(P, "get_poi_store", lambda: store)
+    q = DetourSearchQuery(lat=LAT, lng=LNG, minutes=10, mode="walk", detour_type="food")
+
+    async def go():
+        ctx = P.SearchContext.build(q, db=None)
+        await P.stage_sources(ctx)
+        return ctx
+
+    ctx = asyncio.run(go())
+    return store, ctx
+
+
+def test_partial_sources_do_not_mark_coverage(monkeypatch):
+    store, ctx = _search(monkeypatch, [
+        P.CandidateSource("a", ("food",), _ok),
+        P.CandidateSource("b", ("food",), _boom),
+    ])
+    assert len(ctx.candidates) == 5
+    local = store.query(facet_key("food"), LAT, LNG, 0.5)
+    assert len(local.items) == 5  # 取れた分は取り込む
+    assert not local.fresh        # が、検索済みにはしない
+
+
+def test_all_sources_mark_coverage(monkeypatch):
+    store, _ = _search(monkeypatch, [
+        P.CandidateSource("a", ("food",), _ok),
+        P.CandidateSource("b", ("food",), _ok),
+    ])
+    assert store.query(facet_key("food"), LAT, LNG, 0.5).fresh
+
+
+def test_coverage_facets_are_capped(monkeypatch):
+    monkeypatch.setattr(poi_store, "MAX_COVERAGE_FACETS", 3)
+    store = PoiStore(ttl_sec=3600)
+    for kw in "abcde":
+        store.mark_covered(facet_key("food", keyword=kw), LAT, LNG, 1.0)
+    assert not store.is_fresh(facet_key("food", keyword="a"), LAT, LNG, 0.5)
+    assert store.is_fresh(facet_key("food", keyword="e"), LAT, LNG, 0.5)
+    assert len(store._coverage) == 3
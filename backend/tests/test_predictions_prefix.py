@@ -0,0 +1,25 @@
+from app.services import google_places as gp
+
+
+def _pred(desc):
+    return {"description": desc, "place_id": desc, "structured_formatting": {}}
+
+
+def setup_function(_):
+    gp._pred_cache.clear()
+
+
+def test_short_prefix_list_is_not_treated_as_exhaustive():
+    gp._pred_put("とう", [_pred("東京駅"), _pred("東京タワー"), _pred("東京ドーム")])
+    assert gp._from_prefix("とうきょう", 3) is None
+
+
+def test_prefix_reused_when_enough_hits_remain():
+    gp._pred_put("tokyo", [_pred("Tokyo Station"), _pred("Tokyo Tower"), _pred("Tokyo Dome")])
+    hits = gp._from_prefix("tokyo tow", 1)
+    assert [p["description"] for p in hits] == ["Tokyo Tower"]
+
+
+def test_zero_limit_is_not_a_free_hit():
+    gp._pred_put("とう", [_pred("東京駅")])
+    assert gp._from_prefix("とうきょう", 0) is None
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import profiling
+from app.core.config import settings
+
+
+def _busy():
+    t = 0
+    for i in range(20000):
+        t += i * i
+    return t
+
+
+@profiling.profiled("demo")
+async def demo():
+    _busy()
+    await asyncio.sleep(0.02)
+    return "ok"
+
+
+def test_sampled_call_end_to_end(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(settings, "profile_sample_rate", 1.0)
+    monkeypatch.setattr(settings, "profile_output_dir", str(tmp_path))
+    caplog.set_level(logging.INFO, logger="app.core.profiling")
+
+    assert asyncio.run(demo()) == "ok"
+
+    rec = next(r for r in caplog.records if r.getMessage() == "profile captured")
+    assert rec.profile_name == "demo"
+    assert rec.trigger == "sampled"
+    assert profiling.recent()[0]["name"] == "demo"
+    assert list(tmp_path.glob("demo-*.collapsed"))
+
+
+def test_header_trigger_sets_profile_id(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(settings, "profile_sample_rate", 0.0)
+    monkeypatch.setattr(settings, "profile_output_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "admin_api_key", "secret")
+    caplog.set_level(logging.INFO, logger="app.core.profiling")
+
+    app = FastAPI()
+    app.add_middleware(profiling.ProfileTriggerMiddleware)
+
+    @app.get("/demo")
+    async def route():
+        return {"r": await demo()}
+
+    async def go():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            hit = await c.get("/demo", headers={"X-Profile": "1", "X-API-Key": "secret"})
+            bad_key = await c.get("/demo", headers={"X-Profile": "1", "X-API-Key": "nope"})
+        return hit, bad_key
+
+    hit, bad_key = asyncio.run(go())
+    assert hit.status_code == 200 and hit.json() == {"r": "ok"}
+    pid = hit.headers["x-profile-id"]
+    assert profiling.get(pid).trigger == "header"
+    assert bad_key.status_code == 200 and "x-profile-id" not in bad_key.headers
@@ -0,0 +1,24 @@
+import pytest
+
+from app.core.config import settings
+from app.services import security
+
+
+@pytest.fixture(autouse=True)
+def _fresh_key():
+    security._key.cache_clear()
+    yield
+    security._key.cache_clear()
+
+
+def test_missing_secret_fails_at_init(monkeypatch):
+    monkeypatch.setattr(settings, "jwt_secret_key", "")
+    monkeypatch.setattr(settings, "jwt_allow_random_key", False)
+    with pytest.raises(RuntimeError):
+        security.init()
+
+
+def test_random_key_only_when_allowed(monkeypatch):
+    monkeypatch.setattr(settings, "jwt_secret_key", "")
+    monkeypatch.setattr(settings, "jwt_allow_random_key", True)
+    security.init()